@@ -38,5 +38,6 @@ setup(
     ],
     extras_require={
         "test": test_deps,
+        "graph": ["scipy", "networkx"],
     }
 )
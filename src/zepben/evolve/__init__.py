@@ -69,7 +69,9 @@ from zepben.evolve.model.phasedirection import *
 from zepben.evolve.model.phases import *
 
 
+from zepben.evolve.services.network.tracing.trace_events import *
 from zepben.evolve.services.network.tracing.traversals.tracker import *
+from zepben.evolve.services.network.tracing.traversals.stats import *
 from zepben.evolve.services.network.tracing.traversals.tracing import *
 from zepben.evolve.services.network.tracing.traversals.queue import *
 from zepben.evolve.services.network.tracing.traversals.branch_recursive_tracing import *
@@ -77,7 +79,16 @@ from zepben.evolve.services.network.tracing.traversals.branch_recursive_tracing
 from zepben.evolve.services.network.tracing.phases.phase_step import *
 from zepben.evolve.services.network.tracing.phases.phase_status import *
 from zepben.evolve.services.network.tracing.phases.phasing import *
+from zepben.evolve.services.network.tracing.phases.phase_persistence import *
+from zepben.evolve.services.network.tracing.phases.remove_phases import *
 from zepben.evolve.services.network.tracing.util import *
+from zepben.evolve.services.network.tracing.downstream_tree import *
+from zepben.evolve.services.network.tracing.upstream_index import *
+from zepben.evolve.services.network.tracing.downstream_aggregates import *
+from zepben.evolve.services.network.tracing.topology import *
+from zepben.evolve.services.network.tracing.loop_detection import *
+from zepben.evolve.services.network.tracing.isolation import *
+from zepben.evolve.services.network.tracing.graph_export import *
 from zepben.evolve.services.network.tracing.find import *
 from zepben.evolve.services.network.tracing.traces import *
 from zepben.evolve.services.network.tracing.connectivity import *
@@ -40,6 +40,15 @@ class ConductingEquipment(Equipment):
             for term in terminals:
                 self.add_terminal(term)
 
+    def _state_changed(self):
+        # Bump the state version of each network this equipment is in, which is found through the phase stores its terminals are bound to.
+        stores = []
+        for term in self._terminals:
+            store = term.traced_phases.store
+            if store is not None and all(store is not it for it in stores):
+                stores.append(store)
+                store.mark_state_changed()
+
     def get_base_voltage(self, terminal: Terminal = None):
         """
         Get the `zepben.evolve.iec61970.base.core.base_voltage.BaseVoltage` of this `ConductingEquipment`.
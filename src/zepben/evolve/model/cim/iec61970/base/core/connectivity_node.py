@@ -6,7 +6,7 @@
 
 from __future__ import annotations
 
-from typing import Generator, List
+from typing import Generator, List, Dict, Tuple, Optional
 
 from dataclassy import dataclass
 
@@ -21,10 +21,11 @@ class ConnectivityNode(IdentifiedObject):
     """
     Connectivity nodes are points where terminals of AC conducting equipment are connected together with zero impedance.
     """
-    __slots__ = ["_terminals", "__weakref__"]
+    __slots__ = ["_terminals", "_connectivity_cache", "__weakref__"]
     _terminals: List[Terminal] = []
 
     def __init__(self, terminals: List[Terminal] = None):
+        self._connectivity_cache: Optional[Dict[Tuple[int, int], List]] = None
         if terminals:
             for term in terminals:
                 self.add_terminal(term)
@@ -68,6 +69,7 @@ class ConnectivityNode(IdentifiedObject):
             return self
 
         self._terminals.append(terminal)
+        self._connectivity_cache = None
         return self
 
     def remove_terminal(self, terminal: Terminal) -> ConnectivityNode:
@@ -79,6 +81,7 @@ class ConnectivityNode(IdentifiedObject):
         Raises `ValueError` if `terminal` was not associated with this `ConnectivityNode`.
         """
         self._terminals.remove(terminal)
+        self._connectivity_cache = None
         return self
 
     def clear_terminals(self) -> ConnectivityNode:
@@ -87,8 +90,16 @@ class ConnectivityNode(IdentifiedObject):
         Returns A reference to this `ConnectivityNode` to allow fluent use.
         """
         self._terminals.clear()
+        self._connectivity_cache = None
         return self
 
+    def invalidate_connectivity(self):
+        """
+        Discard the connectivity results cached by `get_connectivity` for the terminals of this `ConnectivityNode`. This is done automatically when
+        terminals are added or removed, or `Terminal.phases` is set on any of its terminals.
+        """
+        self._connectivity_cache = None
+
     def is_switched(self):
         return self.get_switch() is not None
 
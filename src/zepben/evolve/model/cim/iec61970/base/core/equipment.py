@@ -22,10 +22,8 @@ class Equipment(PowerSystemResource):
     Any part of a power system that is a physical device, electronic or mechanical.
     """
 
-    in_service: bool = True
-    """If True, the equipment is in service."""
-    normally_in_service: bool = True
-    """If True, the equipment is _normally_ in service."""
+    _in_service: bool = True
+    _normally_in_service: bool = True
 
     _usage_points: Optional[List[UsagePoint]] = None
     _equipment_containers: Optional[List[EquipmentContainer]] = None
@@ -47,6 +45,30 @@ class Equipment(PowerSystemResource):
             for cf in current_feeders:
                 self.add_current_feeder(cf)
 
+    @property
+    def in_service(self) -> bool:
+        """If True, the equipment is in service."""
+        return self._in_service
+
+    @in_service.setter
+    def in_service(self, in_service: bool):
+        self._in_service = in_service
+        self._state_changed()
+
+    @property
+    def normally_in_service(self) -> bool:
+        """If True, the equipment is _normally_ in service."""
+        return self._normally_in_service
+
+    @normally_in_service.setter
+    def normally_in_service(self, normally_in_service: bool):
+        self._normally_in_service = normally_in_service
+        self._state_changed()
+
+    def _state_changed(self):
+        """Called when the in service or open state of this equipment changes. Equipment without terminals isn't part of any network topology."""
+        pass
+
     @property
     def equipment_containers(self) -> Generator[Equipment, None, None]:
         """
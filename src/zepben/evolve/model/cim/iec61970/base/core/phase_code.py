@@ -6,7 +6,7 @@
 
 from enum import Enum, unique
 
-from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind, phase_mask
 
 __all__ = ["PhaseCode", "phasecode_by_id"]
 
@@ -94,17 +94,24 @@ class PhaseCode(Enum):
     YN = (SinglePhaseKind.Y, SinglePhaseKind.N)
     """Unknown non-neutral phase plus neutral"""
 
+    def __init__(self, *phases: SinglePhaseKind):
+        self.phase_set = frozenset(phases)
+        """The phases of this code as a precomputed frozenset."""
+
+        self.phase_mask = phase_mask(phases)
+        """The phases of this code as a precomputed mask of `SinglePhaseKind.phase_bit`s."""
+
     @property
     def short_name(self):
         return str(self)[10:]
 
     @property
     def single_phases(self):
-        return self.value[:1]
+        return self._value_
 
     @property
     def num_phases(self):
-        return len(self.value)
+        return len(self._value_)
 
 
 _phasecode_members = list(PhaseCode.__members__.values())
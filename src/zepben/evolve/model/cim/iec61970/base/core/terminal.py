@@ -33,7 +33,7 @@ class Terminal(AcDcTerminal):
     """The conducting equipment of the terminal. Conducting equipment have terminals that may be connected to other conducting equipment terminals via 
     connectivity nodes."""
 
-    phases: PhaseCode = PhaseCode.ABC
+    _phases: PhaseCode = PhaseCode.ABC
     """Represents the normal network phasing condition. If the attribute is missing three phases (ABC) shall be assumed."""
 
     sequence_number: int = 0
@@ -48,8 +48,10 @@ class Terminal(AcDcTerminal):
     """This is a weak reference to the connectivity node so if a Network object goes out of scope, holding a single conducting equipment
     reference does not cause everything connected to it in the network to stay in memory."""
 
-    def __init__(self, conducting_equipment: ConductingEquipment = None, connectivity_node: ConnectivityNode = None):
+    def __init__(self, conducting_equipment: ConductingEquipment = None, connectivity_node: ConnectivityNode = None, phases: PhaseCode = None):
         self.conducting_equipment = conducting_equipment
+        if phases is not None:
+            self._phases = phases
         if connectivity_node:
             self.connectivity_node = connectivity_node
 
@@ -68,6 +70,19 @@ class Terminal(AcDcTerminal):
         else:
             raise ValueError(f"conducting_equipment for {str(self)} has already been set to {self._conducting_equipment}, cannot reset this field to {ce}")
 
+    @property
+    def phases(self) -> PhaseCode:
+        """Represents the normal network phasing condition. If the attribute is missing three phases (ABC) shall be assumed."""
+        return self._phases
+
+    @phases.setter
+    def phases(self, phases: PhaseCode):
+        self._phases = phases
+        # The connectivity cached on the node depends on the phases of each of its terminals.
+        cn = self.connectivity_node
+        if cn is not None:
+            cn.invalidate_connectivity()
+
     @property
     def connectivity_node(self):
         try:
@@ -77,7 +92,7 @@ class Terminal(AcDcTerminal):
 
     @connectivity_node.setter
     def connectivity_node(self, cn):
-        self._cn = ref(cn)
+        self._cn = ref(cn) if cn is not None else None
 
     @property
     def connected(self) -> bool:
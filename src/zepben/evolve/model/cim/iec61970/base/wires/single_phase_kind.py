@@ -5,8 +5,9 @@
 #  file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 from enum import Enum
+from typing import Iterable, FrozenSet, Tuple
 
-__all__ = ["SinglePhaseKind", "phasekind_by_id", "SINGLE_PHASE_KIND_VALUES"]
+__all__ = ["SinglePhaseKind", "phasekind_by_id", "SINGLE_PHASE_KIND_VALUES", "phase_mask", "phases_from_mask", "ordered_phases_from_mask"]
 
 
 def phasekind_by_id(spk_id):
@@ -46,17 +47,24 @@ class SinglePhaseKind(Enum):
     INVALID = (7, -1)
     """Invalid phase. Caused by trying to energise with multiple phases simultaneously."""
 
+    def __init__(self, value: int, mask_index: int):
+        self.phase_bit = 1 << value
+        """
+        A bit unique to this phase, for holding sets of phases as int masks. Unlike `bit_mask`, which selects the core a phase is held in and is
+        shared by X and Y with A and B, every phase has its own bit.
+        """
+
     @property
     def bit_mask(self):
         return 1 << self.mask_index if self.mask_index >= 0 else 0
 
     @property
     def value(self):
-        return self.value[0]
+        return self._value_[0]
 
     @property
     def mask_index(self):
-        return self.value[1]
+        return self._value_[1]
 
     @property
     def short_name(self):
@@ -64,3 +72,35 @@ class SinglePhaseKind(Enum):
 
 
 SINGLE_PHASE_KIND_VALUES = list(SinglePhaseKind.__members__.values())
+
+# The phases in every possible mask, ordered by value, and as a frozenset.
+_MASK_PHASES: Tuple[Tuple[SinglePhaseKind, ...], ...] = tuple(tuple(phs for phs in SINGLE_PHASE_KIND_VALUES if mask & phs.phase_bit)
+                                                              for mask in range(1 << len(SINGLE_PHASE_KIND_VALUES)))
+_MASK_SETS: Tuple[FrozenSet[SinglePhaseKind], ...] = tuple(frozenset(phases) for phases in _MASK_PHASES)
+
+
+def phase_mask(phases: Iterable[SinglePhaseKind]) -> int:
+    """
+    `phases` The phases to include.
+    Returns an int mask with the `SinglePhaseKind.phase_bit` of each of `phases` set.
+    """
+    mask = 0
+    for phs in phases:
+        mask |= phs.phase_bit
+    return mask
+
+
+def phases_from_mask(mask: int) -> FrozenSet[SinglePhaseKind]:
+    """
+    `mask` A mask of `SinglePhaseKind.phase_bit`s, such as from `phase_mask`.
+    Returns the phases in `mask`. The sets are precomputed, so no set is created.
+    """
+    return _MASK_SETS[mask]
+
+
+def ordered_phases_from_mask(mask: int) -> Tuple[SinglePhaseKind, ...]:
+    """
+    `mask` A mask of `SinglePhaseKind.phase_bit`s, such as from `phase_mask`.
+    Returns the phases in `mask`, in the order they are defined. The tuples are precomputed, so nothing is created.
+    """
+    return _MASK_PHASES[mask]
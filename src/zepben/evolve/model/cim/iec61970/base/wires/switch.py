@@ -86,6 +86,7 @@ class Switch(ConductingEquipment):
         Returns This `Switch` to be used fluently.
         """
         self._normal_open = _calculate_open_state(self._normal_open, is_normally_open, phase)
+        self._state_changed()
         return self
 
     def set_open(self, is_open: bool, phase: SinglePhaseKind = None) -> Switch:
@@ -95,6 +96,7 @@ class Switch(ConductingEquipment):
         Returns This `Switch` to be used fluently.
         """
         self._open = _calculate_open_state(self._open, is_open, phase)
+        self._state_changed()
         return self
 
 
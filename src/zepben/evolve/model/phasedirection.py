@@ -27,18 +27,25 @@ class PhaseDirection(Enum):
             return self is other
 
     def __add__(self, other):
-        return PhaseDirection(self.value | other.value)
+        return _PHASE_DIRECTIONS[self._value_ | other._value_]
 
     def __sub__(self, other):
-        return PhaseDirection(self.value - (self.value and other.value))
+        return _PHASE_DIRECTIONS[self._value_ - (self._value_ and other._value_)]
 
     @property
     def short_name(self):
         return str(self)[10:]
 
 
+_PHASE_DIRECTIONS = tuple(PhaseDirection)
+
+
 def phasedirection_from_value(value: int) -> PhaseDirection:
+    """
+    `value` The value of a direction, between 0 and 3.
+    Returns the `PhaseDirection` with `value`.
+    Raises `ValueError` if there is no direction with `value`.
+    """
     if 0 <= value <= 3:
-        return PhaseDirection.NONE
-    else:
-        PhaseDirection(value)
+        return _PHASE_DIRECTIONS[value]
+    raise ValueError(f"{value} is not a valid PhaseDirection")
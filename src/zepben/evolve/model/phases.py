@@ -9,15 +9,19 @@
 #  file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 from __future__ import annotations
+import sys
+from array import array
 from collections import defaultdict
 from dataclassy import dataclass
+from typing import Optional, List, Any, Tuple, Iterable
 
 
 from zepben.evolve.exceptions import PhaseException
 from zepben.evolve.model.phasedirection import PhaseDirection
 from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind, SINGLE_PHASE_KIND_VALUES
 
-__all__ = ["phase", "direction", "pos_shift", "add", "setphs", "remove", "remove_all", "TracedPhases", "NominalPhasePath"]
+__all__ = ["phase", "direction", "pos_shift", "add", "setphs", "remove", "remove_all", "decode_phases", "decode_directions", "encode_phases",
+           "TracedPhases", "NominalPhasePath", "PhaseStatusStore"]
 CORE_MASKS = [0x000000ff, 0x0000ff00, 0x00ff0000, 0xff000000]
 DIR_MASK = 0b11
 
@@ -37,27 +41,36 @@ PHASE_DIR_MAP[0b10000000] = SinglePhaseKind.N
 PHASE_DIR_MAP[0b11000000] = SinglePhaseKind.N
 
 
+# The byte of a status holding each core has the phase and direction bits of A, B, C and N, but only ever has the bits of one of them set, so every
+# core byte can be decoded up front. Bytes with the bits of more than one phase set decode to no phase, with a direction from the bits of A.
+_PHASE_SHIFTS = tuple(2 * max(value - 1, 0) for value in range(len(SINGLE_PHASE_KIND_VALUES)))
+_DIRECTIONS = tuple(PhaseDirection)
+_CORE_PHASES = tuple(PHASE_DIR_MAP.get(core_val, SinglePhaseKind.NONE) for core_val in range(256))
+_CORE_DIRECTIONS = tuple(_DIRECTIONS[(core_val >> _PHASE_SHIFTS[_CORE_PHASES[core_val].value]) & DIR_MASK] for core_val in range(256))
+# The core byte for each phase that can be traced and direction, indexed by the value of each. No phase encodes as an empty core.
+_CORE_BYTES = tuple(tuple(0 if value == 0 else dir_value << _PHASE_SHIFTS[value] for dir_value in range(4)) for value in range(5))
+_VALID_NOMINAL_PHASES = tuple(SINGLE_PHASE_KIND_VALUES[1:7])
+
+
 def _valid_phase_check(nominal_phase):
-    if nominal_phase not in SINGLE_PHASE_KIND_VALUES[1:7]:
+    if nominal_phase not in _VALID_NOMINAL_PHASES:
         raise ValueError(f"INTERNAL ERROR: Phase {nominal_phase} is invalid. Must be one of {SINGLE_PHASE_KIND_VALUES[1:7]}.")
 
 
 def phase(status: int, nominal_phase: SinglePhaseKind):
-    core_val = (status >> (nominal_phase.mask_index * 8)) & 0xff
-    return PHASE_DIR_MAP[core_val]
+    return _CORE_PHASES[(status >> (nominal_phase._value_[1] << 3)) & 0xff]
 
 
 def direction(status: int, nominal_phase: SinglePhaseKind):
-    dir_val = (status >> pos_shift(phase(status, nominal_phase), nominal_phase)) & DIR_MASK
-    return PhaseDirection(dir_val)
+    return _CORE_DIRECTIONS[(status >> (nominal_phase._value_[1] << 3)) & 0xff]
 
 
 def pos_shift(phs: SinglePhaseKind, nominal_phase: SinglePhaseKind):
-    return (2 * max(phs.value - 1, 0)) + (nominal_phase.mask_index * 8)
+    return _PHASE_SHIFTS[phs._value_[0]] + (nominal_phase._value_[1] << 3)
 
 
 def setphs(status: int, phs: SinglePhaseKind, direction: PhaseDirection, nominal_phs: SinglePhaseKind) -> int:
-    return (status & ~CORE_MASKS[nominal_phs.mask_index]) | _shifted_value(direction, phs, nominal_phs)
+    return (status & ~CORE_MASKS[nominal_phs._value_[1]]) | _shifted_value(direction, phs, nominal_phs)
 
 
 def add(status: int, phs: SinglePhaseKind, direction: PhaseDirection, nominal_phs: SinglePhaseKind) -> int:
@@ -65,7 +78,7 @@ def add(status: int, phs: SinglePhaseKind, direction: PhaseDirection, nominal_ph
 
 
 def remove_all(status: int, nominal_phase: SinglePhaseKind) -> int:
-    return status & ~CORE_MASKS[nominal_phase.mask_index]
+    return status & ~CORE_MASKS[nominal_phase._value_[1]]
 
 
 def remove(status: int, phs: SinglePhaseKind, direction: PhaseDirection, nominal_phs: SinglePhaseKind) -> int:
@@ -73,14 +86,75 @@ def remove(status: int, phs: SinglePhaseKind, direction: PhaseDirection, nominal
 
 
 def _shifted_value(pd: PhaseDirection, spk: SinglePhaseKind, nom: SinglePhaseKind) -> int:
-    return pd.value << pos_shift(spk, nom)
+    return pd._value_ << (_PHASE_SHIFTS[spk._value_[0]] + (nom._value_[1] << 3))
+
+
+def _status_array(statuses: Iterable[int]) -> array:
+    if isinstance(statuses, array) and statuses.typecode == "I":
+        return statuses
+    return array("I", statuses)
+
+
+def decode_phases(statuses: Iterable[int], nominal_phase: SinglePhaseKind) -> List[SinglePhaseKind]:
+    """
+    Decode the traced phase of a core from many statuses in one call.
+    `statuses` The statuses to decode, such as `PhaseStatusStore.normal`. Any iterable of ints is accepted, but an `array.array` of unsigned 32 bit
+    ints avoids a copy.
+    `nominal_phase` The nominal phase of the core to decode.
+    Returns the traced phase of the core in each status, in order.
+    """
+    _valid_phase_check(nominal_phase)
+    core_values = memoryview(_status_array(statuses)).cast("B")[_core_offset(nominal_phase)::4].tobytes()
+    return list(map(_CORE_PHASES.__getitem__, core_values))
+
+
+def decode_directions(statuses: Iterable[int], nominal_phase: SinglePhaseKind) -> List[PhaseDirection]:
+    """
+    Decode the direction of a core from many statuses in one call.
+    `statuses` The statuses to decode, such as `PhaseStatusStore.normal`. Any iterable of ints is accepted, but an `array.array` of unsigned 32 bit
+    ints avoids a copy.
+    `nominal_phase` The nominal phase of the core to decode.
+    Returns the direction of the core in each status, in order.
+    """
+    _valid_phase_check(nominal_phase)
+    core_values = memoryview(_status_array(statuses)).cast("B")[_core_offset(nominal_phase)::4].tobytes()
+    return list(map(_CORE_DIRECTIONS.__getitem__, core_values))
+
+
+def encode_phases(statuses: Iterable[int],
+                  phases: Iterable[SinglePhaseKind],
+                  directions: Iterable[PhaseDirection],
+                  nominal_phase: SinglePhaseKind) -> array:
+    """
+    Set the traced phase and direction of a core in many statuses in one call, as `setphs` does for a single status.
+    `statuses` The statuses to update. They are not modified.
+    `phases` The traced phase to set in each status. Must be one of NONE, A, B, C or N, with NONE clearing the core.
+    `directions` The direction to set in each status.
+    `nominal_phase` The nominal phase of the core to set.
+    Returns a new `array.array` of unsigned 32 bit ints with the updated statuses.
+    Raises `ValueError` if there isn't a phase and direction for every status, or a phase can't be encoded.
+    """
+    _valid_phase_check(nominal_phase)
+    try:
+        core_values = bytes(_CORE_BYTES[phs._value_[0]][dir_._value_] for phs, dir_ in zip(phases, directions))
+    except IndexError:
+        raise ValueError(f"Only {', '.join(str(phs) for phs in SINGLE_PHASE_KIND_VALUES[:5])} can be encoded.")
+
+    encoded = array("I", _status_array(statuses))
+    if len(core_values) != len(encoded):
+        raise ValueError(f"Expected a phase and direction for each of the {len(encoded)} statuses, got {len(core_values)}.")
+    memoryview(encoded).cast("B")[_core_offset(nominal_phase)::4] = core_values
+    return encoded
 
 
-@dataclass(slots=True)
 class NominalPhasePath(object):
     """
-    Defines how a nominal phase is wired through a connectivity node between two terminals
+    Defines how a nominal phase is wired through a connectivity node between two terminals.
+
+    There is a single immutable instance for each pair of phases, which is returned each time one is created, so paths can be compared by identity
+    and cost nothing to create while tracing.
     """
+    __slots__ = ["from_phase", "to_phase", "_order", "_hash"]
 
     from_phase: SinglePhaseKind
     """The nominal phase where the path comes from."""
@@ -88,6 +162,193 @@ class NominalPhasePath(object):
     to_phase: SinglePhaseKind
     """The nominal phase where the path goes to."""
 
+    def __new__(cls, from_phase: SinglePhaseKind, to_phase: SinglePhaseKind):
+        return _NOMINAL_PHASE_PATHS[from_phase.value][to_phase.value]
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return NominalPhasePath, (self.from_phase, self.to_phase)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"NominalPhasePath(from_phase={self.from_phase!r}, to_phase={self.to_phase!r})"
+
+
+def _create_nominal_phase_path(from_phase: SinglePhaseKind, to_phase: SinglePhaseKind) -> NominalPhasePath:
+    path = object.__new__(NominalPhasePath)
+    object.__setattr__(path, "from_phase", from_phase)
+    object.__setattr__(path, "to_phase", to_phase)
+    # Paths are ordered by their from phase then their to phase.
+    object.__setattr__(path, "_order", from_phase.value * len(SINGLE_PHASE_KIND_VALUES) + to_phase.value)
+    object.__setattr__(path, "_hash", hash((from_phase.value, to_phase.value)))
+    return path
+
+
+# The path for each pair of phases, indexed by the value of the from phase and then the to phase.
+_NOMINAL_PHASE_PATHS: Tuple[Tuple[NominalPhasePath, ...], ...] = tuple(tuple(_create_nominal_phase_path(from_phase, to_phase)
+                                                                             for to_phase in SINGLE_PHASE_KIND_VALUES)
+                                                                       for from_phase in SINGLE_PHASE_KIND_VALUES)
+
+
+def _core_offset(nominal_phase: SinglePhaseKind) -> int:
+    # The offset of the byte holding the core for `nominal_phase` within each status in the native byte order of an array.
+    return nominal_phase.mask_index if sys.byteorder == "little" else 3 - nominal_phase.mask_index
+
+
+class PhaseStatusStore(object):
+    """
+    Array backed storage for the traced phase statuses of many terminals. The normal and current statuses are each held in an `array.array` of
+    unsigned 32 bit ints using the layout described in `TracedPhases`, indexed by a slot allocated to each terminal when its `TracedPhases` is bound
+    to the store. A bound `TracedPhases` is a thin view that reads and writes its slot, so the statuses of a whole network can be reset, exported
+    and queried in bulk.
+
+    `normal` and `current` support the buffer protocol, so they can be wrapped without a copy, e.g. `numpy.frombuffer(store.normal, dtype=numpy.uint32)`.
+    Such a wrapper must be recreated after `reset`, `load` or any new slots being allocated, as these replace or resize the arrays.
+    """
+    __slots__ = ["normal", "current", "version", "state_version", "_owners"]
+
+    def __init__(self):
+        self.normal = array("I")
+        """The normal status of each slot."""
+
+        self.current = array("I")
+        """The current status of each slot."""
+
+        self.version = 0
+        """Incremented by the bulk operations of this store and by `mark_changed`, so derived data can tell when it is stale. Statuses set through a
+        `TracedPhases` don't increment it themselves, so phasing bumps it once per run rather than once per write."""
+
+        self.state_version = 0
+        """Incremented by `mark_state_changed` when equipment with a terminal bound to this store is opened, closed, or taken in or out of service."""
+
+        self._owners: List[Any] = []
+
+    def __len__(self):
+        return len(self._owners)
+
+    def allocate(self, owner: Any, normal_status: int = 0, current_status: int = 0) -> int:
+        """
+        Allocate a slot.
+        `owner` The object the slot belongs to, normally a `zepben.evolve.iec61970.base.core.terminal.Terminal`.
+        `normal_status` The initial normal status of the slot.
+        `current_status` The initial current status of the slot.
+        Returns the index of the new slot.
+        """
+        self.normal.append(normal_status)
+        self.current.append(current_status)
+        self._owners.append(owner)
+        self.version += 1
+        return len(self._owners) - 1
+
+    def mark_changed(self):
+        """Increment `version` after changing statuses through `TracedPhases`, so derived data built from the old statuses is seen to be stale."""
+        self.version += 1
+
+    def mark_state_changed(self):
+        """Increment `state_version` after the open or in service state of equipment changes, so analysis of the switching state sees it is stale."""
+        self.state_version += 1
+
+    def release(self, slot: int):
+        """
+        Release a slot that is no longer used. The slot is cleared and is no longer returned by queries, but is not reused.
+        `slot` The index of the slot to release.
+        """
+        self.normal[slot] = 0
+        self.current[slot] = 0
+        self._owners[slot] = None
+        self.version += 1
+
+    def owner(self, slot: int) -> Any:
+        """
+        `slot` The index of a slot.
+        Returns the object the slot was allocated for, or None if it has been released.
+        """
+        return self._owners[slot]
+
+    def owners(self, slots: Iterable[int]) -> List[Any]:
+        """
+        `slots` The indexes of slots.
+        Returns the objects the slots were allocated for.
+        """
+        owners = self._owners
+        return [owners[slot] for slot in slots]
+
+    def reset(self, normal: bool = True, current: bool = True):
+        """
+        Clear the statuses of every slot, e.g. before re-running phasing.
+        `normal` Whether to clear the normal statuses.
+        `current` Whether to clear the current statuses.
+        """
+        zeros = bytes(4 * len(self._owners))
+        if normal:
+            self.normal = array("I", zeros)
+        if current:
+            self.current = array("I", zeros)
+        self.version += 1
+
+    def export(self) -> Tuple[bytes, bytes]:
+        """
+        Returns a copy of the normal and current statuses of every slot, as bytes in the native byte order.
+        """
+        return self.normal.tobytes(), self.current.tobytes()
+
+    def load(self, normal: Optional[bytes], current: Optional[bytes]):
+        """
+        Replace the statuses of every slot with those from a previous `export`.
+        `normal` The normal statuses, or None to keep the existing normal statuses.
+        `current` The current statuses, or None to keep the existing current statuses.
+        Raises `ValueError` if the statuses are not for the same number of slots as this store.
+        """
+        expected = 4 * len(self._owners)
+        for name, statuses in (("normal", normal), ("current", current)):
+            if statuses is not None and len(statuses) != expected:
+                raise ValueError(f"Expected {expected} bytes of {name} statuses for {len(self._owners)} slots, got {len(statuses)}.")
+        if normal is not None:
+            self.normal = array("I", normal)
+        if current is not None:
+            self.current = array("I", current)
+        self.version += 1
+
+    def core_values(self, nominal_phase: SinglePhaseKind, current: bool = False) -> bytes:
+        """
+        `nominal_phase` The nominal phase of the core to get.
+        `current` Whether to get the core from the current statuses rather than the normal statuses.
+        Returns the byte holding the core for `nominal_phase` from each slot, in slot order.
+        """
+        _valid_phase_check(nominal_phase)
+        statuses = self.current if current else self.normal
+        return memoryview(statuses).cast("B")[_core_offset(nominal_phase)::4].tobytes()
+
+    def slots_with_phase(self, nominal_phase: SinglePhaseKind, phs: SinglePhaseKind, current: bool = False) -> List[int]:
+        """
+        Find the slots where the traced phase of a core matches. Pass `SinglePhaseKind.NONE` as `phs` to find slots with no phase, e.g. every
+        terminal with no phase on B.
+        `nominal_phase` The nominal phase of the core to check.
+        `phs` The traced phase to look for.
+        `current` Whether to check the current statuses rather than the normal statuses.
+        Returns the indexes of the matching slots, in order.
+        """
+        matches = self.core_values(nominal_phase, current).translate(_PHASE_MATCH_TABLES[phs])
+        owners = self._owners
+        slots = []
+        find = matches.find
+        i = find(1)
+        while i >= 0:
+            if owners[i] is not None:
+                slots.append(i)
+            i = find(1, i + 1)
+        return slots
+
 
 @dataclass(slots=True)
 class TracedPhases(object):
@@ -105,13 +366,94 @@ class TracedPhases(object):
                      |  2bits  |  2bits  |  2bits  |  2bits  |
     Phase:           |    N    |    C    |    B    |    A    |
     Direction:       |OUT | IN |OUT | IN |OUT | IN |OUT | IN |
+
+    The statuses are only ever held in a `PhaseStatusStore`, with this holding the store and the index of its slot. Once bound to the store of a
+    network with `bind`, it is a view of its slot in that store. Until then, the statuses are held in a single slot store of its own, which isn't
+    created until a status is first set.
+
+    Writes don't change the `PhaseStatusStore.version` of the store, as that would cost every write made while tracing. `SetPhases`, `RemovePhases`
+    and the bulk operations of the store bump it instead. Call `PhaseStatusStore.mark_changed` after setting statuses by hand.
     """
-    _normal_status: int = 0
-    _current_status: int = 0
+    _store: Optional[PhaseStatusStore] = None
+    _slot: int = -1
 
     def __init__(self, normal_status: int = 0, current_status: int = 0):
-        self._normal_status = normal_status
-        self._current_status = current_status
+        if normal_status or current_status:
+            self._hold(normal_status, current_status)
+
+    @property
+    def normal_status(self) -> int:
+        """The normal status, using the layout above."""
+        store = self._store
+        return 0 if store is None else store.normal[self._slot]
+
+    @normal_status.setter
+    def normal_status(self, status: int):
+        if self._store is None:
+            if status:
+                self._hold(status, 0)
+        else:
+            self._store.normal[self._slot] = status
+
+    @property
+    def current_status(self) -> int:
+        """The current status, using the layout above."""
+        store = self._store
+        return 0 if store is None else store.current[self._slot]
+
+    @current_status.setter
+    def current_status(self, status: int):
+        if self._store is None:
+            if status:
+                self._hold(0, status)
+        else:
+            self._store.current[self._slot] = status
+
+    @property
+    def store(self) -> Optional[PhaseStatusStore]:
+        """The `PhaseStatusStore` this is bound to, or None if it holds its own statuses."""
+        store = self._store
+        return None if store is None or store.owner(self._slot) is self else store
+
+    @property
+    def slot(self) -> int:
+        """The index of the slot in `store` this is bound to, or -1 if it is not bound."""
+        return -1 if self.store is None else self._slot
+
+    def bind(self, store: PhaseStatusStore, owner: Any):
+        """
+        Move the statuses into a new slot of `store` and read and write them there from now on. Does nothing if already bound to `store`.
+        `store` The `PhaseStatusStore` to bind to.
+        `owner` The object that owns these phases, normally the `zepben.evolve.iec61970.base.core.terminal.Terminal`.
+        """
+        if store is self._store:
+            return
+        normal_status, current_status = self.normal_status, self.current_status
+        self._release()
+        self._slot = store.allocate(owner, normal_status, current_status)
+        self._store = store
+
+    def unbind(self):
+        """Copy the statuses out of the bound `PhaseStatusStore` and release the slot. Does nothing if not bound."""
+        if self.store is None:
+            return
+        normal_status, current_status = self.normal_status, self.current_status
+        self._release()
+        if normal_status or current_status:
+            self._hold(normal_status, current_status)
+
+    def _hold(self, normal_status: int, current_status: int):
+        # Give this its own single slot store, owned by itself so it can be told apart from the store of a network.
+        store = PhaseStatusStore()
+        self._slot = store.allocate(self, normal_status, current_status)
+        self._store = store
+
+    def _release(self):
+        store = self._store
+        if store is not None:
+            store.release(self._slot)
+            self._store = None
+            self._slot = -1
 
     def __str__(self):
         s = []
@@ -131,7 +473,7 @@ class TracedPhases(object):
         Raises `CoreException` if core is invalid.
         """
         _valid_phase_check(nominal_phase)
-        return phase(self._normal_status, nominal_phase)
+        return phase(self.normal_status, nominal_phase)
 
     def phase_current(self, nominal_phase: SinglePhaseKind):
         """
@@ -140,7 +482,7 @@ class TracedPhases(object):
         Returns `zepben.protobuf.cim.iec61970.base.wires.SinglePhaseKind` for the core
         """
         _valid_phase_check(nominal_phase)
-        return phase(self._current_status, nominal_phase)
+        return phase(self.current_status, nominal_phase)
 
     def direction_normal(self, nominal_phase: SinglePhaseKind):
         """
@@ -149,7 +491,7 @@ class TracedPhases(object):
         Returns `zepben.phases.direction.Direction` for the core
         """
         _valid_phase_check(nominal_phase)
-        return direction(self._normal_status, nominal_phase)
+        return direction(self.normal_status, nominal_phase)
 
     def direction_current(self, nominal_phase: SinglePhaseKind):
         """
@@ -158,7 +500,7 @@ class TracedPhases(object):
         Returns `zepben.phases.direction.Direction` for the core
         """
         _valid_phase_check(nominal_phase)
-        return direction(self._current_status, nominal_phase)
+        return direction(self.current_status, nominal_phase)
 
     def add_normal(self, phs: SinglePhaseKind, nominal_phase: SinglePhaseKind, dir_: PhaseDirection):
         """
@@ -173,12 +515,14 @@ class TracedPhases(object):
         _valid_phase_check(nominal_phase)
         if phs == SinglePhaseKind.NONE or dir_ == PhaseDirection.NONE:
             return False
-        if self.phase_normal(nominal_phase) != SinglePhaseKind.NONE and phs != self.phase_normal(nominal_phase):
+        status = self.normal_status
+        existing = phase(status, nominal_phase)
+        if existing != SinglePhaseKind.NONE and phs != existing:
             raise PhaseException("Crossing phases")
-        if self.direction_normal(nominal_phase).has(dir_):
+        if direction(status, nominal_phase).has(dir_):
             return False
 
-        self._normal_status = add(self._normal_status, phs, dir_, nominal_phase)
+        self.normal_status = add(status, phs, dir_, nominal_phase)
         return True
 
     def add_current(self, phs: SinglePhaseKind, nominal_phase: SinglePhaseKind, dir_: PhaseDirection):
@@ -193,12 +537,14 @@ class TracedPhases(object):
         _valid_phase_check(nominal_phase)
         if phs == SinglePhaseKind.NONE or dir_ == PhaseDirection.NONE:
             return False
-        if self.phase_current(nominal_phase) != SinglePhaseKind.NONE and phs != self.phase_current(nominal_phase):
+        status = self.current_status
+        existing = phase(status, nominal_phase)
+        if existing != SinglePhaseKind.NONE and phs != existing:
             raise PhaseException("Crossing phases")
-        if self.direction_current(nominal_phase).has(dir_):
+        if direction(status, nominal_phase).has(dir_):
             return False
 
-        self._current_status = add(self._current_status, phs, dir_, nominal_phase)
+        self.current_status = add(status, phs, dir_, nominal_phase)
         return True
 
     def set_normal(self, phs: SinglePhaseKind, nominal_phase: SinglePhaseKind, dir_: PhaseDirection):
@@ -216,10 +562,10 @@ class TracedPhases(object):
         if self.phase_normal(nominal_phase) == phs and self.direction_normal(nominal_phase) == dir_:
             return False
 
-        self._normal_status = setphs(self._normal_status, phs, dir_, nominal_phase)
+        self.normal_status = setphs(self.normal_status, phs, dir_, nominal_phase)
         return True
 
-    def set_current(self, phs: SinglePhaseKind, dir_: PhaseDirection, nominal_phase: SinglePhaseKind):
+    def set_current(self, phs: SinglePhaseKind, nominal_phase: SinglePhaseKind, dir_: PhaseDirection):
         """
         `phs` The `zepben.protobuf.cim.iec61970.base.wires.SinglePhaseKind` to add.
         `nominal_phase` The core number this phase should be applied to
@@ -234,7 +580,7 @@ class TracedPhases(object):
         if self.phase_current(nominal_phase) == phs and self.direction_current(nominal_phase) == dir_:
             return False
 
-        self._current_status = setphs(self._current_status, phs, dir_, nominal_phase)
+        self.current_status = setphs(self.current_status, phs, dir_, nominal_phase)
         return True
 
     def remove_normal(self, phs: SinglePhaseKind, nominal_phase: SinglePhaseKind, dir_: PhaseDirection = None):
@@ -251,10 +597,10 @@ class TracedPhases(object):
         if dir_ is not None:
             if not self.direction_normal(nominal_phase).has(dir_):
                 return False
-            self._normal_status = remove(self._normal_status, phs, dir_, nominal_phase)
+            self.normal_status = remove(self.normal_status, phs, dir_, nominal_phase)
         else:
-            self._normal_status = remove_all(self._normal_status, nominal_phase)
-            return True
+            self.normal_status = remove_all(self.normal_status, nominal_phase)
+        return True
 
     def remove_current(self, phs: SinglePhaseKind, nominal_phase: SinglePhaseKind, dir_: PhaseDirection = None):
         """
@@ -270,10 +616,13 @@ class TracedPhases(object):
         if dir_ is not None:
             if not self.direction_current(nominal_phase).has(dir_):
                 return False
-            self._current_status = remove(self._current_status, phs, dir_, nominal_phase)
+            self.current_status = remove(self.current_status, phs, dir_, nominal_phase)
         else:
-            self._current_status = remove_all(self._current_status, nominal_phase)
-            return True
+            self.current_status = remove_all(self.current_status, nominal_phase)
+        return True
 
     def copy(self):
         return TracedPhases()
+
+
+_PHASE_MATCH_TABLES = {phs: bytes(1 if _CORE_PHASES[core_val] is phs else 0 for core_val in range(256)) for phs in SINGLE_PHASE_KIND_VALUES}
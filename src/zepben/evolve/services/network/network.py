@@ -7,18 +7,23 @@
 from __future__ import annotations
 import logging
 from enum import Enum
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from zepben.evolve.model.cim.iec61970.base.meas.measurement import Measurement
 from zepben.evolve.services.common.base_service import BaseService
 from zepben.evolve.model.cim.iec61970.base.core.connectivity_node import ConnectivityNode
+from zepben.evolve.model.cim.iec61970.base.core.terminal import Terminal
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind
+from zepben.evolve.model.phases import PhaseStatusStore
 from zepben.evolve.model.cim.iec61970.base.wires.energy_source import EnergySource
-from zepben.evolve.services.network.tracing.phases.phasing import SetPhases
+from zepben.evolve.services.network.tracing.phases.phasing import SetPhases, PhaseConflict
+from zepben.evolve.services.network.tracing.phases.phase_persistence import save_phases, load_phases
+from zepben.evolve.services.network.tracing.upstream_index import UpstreamIndex
 from pathlib import Path
 
 __all__ = ["connect", "NetworkService"]
 logger = logging.getLogger(__name__)
-TRACED_NETWORK_FILE = str(Path.home().joinpath(Path("traced.json")))
+TRACED_NETWORK_FILE = str(Path.home().joinpath(Path("traced_phases.bin")))
 
 
 class ProcessStatus(Enum):
@@ -48,13 +53,12 @@ def _attempt_to_reuse_connection(terminal1: Terminal, terminal2: Terminal) -> Pr
 
     if cn1 is not None:
         if cn2 is not None:
-            if cn1 is cn2:
-                return ProcessStatus.PROCESSED
-            elif connect(terminal2, cn1.mrid):
-                return ProcessStatus.PROCESSED
-            return ProcessStatus.INVALID
+            return ProcessStatus.PROCESSED if cn1 is cn2 else ProcessStatus.INVALID
+        connect(terminal2, cn1)
+        return ProcessStatus.PROCESSED
     elif cn2 is not None:
-        return ProcessStatus.PROCESSED if connect(terminal1, cn2.mrid) else ProcessStatus.INVALID
+        connect(terminal1, cn2)
+        return ProcessStatus.PROCESSED
     return ProcessStatus.SKIPPED
 
 
@@ -72,9 +76,74 @@ class NetworkService(BaseService):
     _connectivity_nodes: Dict[str, ConnectivityNode] = dict()
     _auto_cn_index: int = 0
     _measurements: Dict[str, List[Measurement]] = []
+    _phase_statuses: Optional[PhaseStatusStore] = None
+    _normal_upstream_index: Optional[UpstreamIndex] = None
+    _current_upstream_index: Optional[UpstreamIndex] = None
 
     def __init__(self):
         self._objectsByType[ConnectivityNode] = self._connectivity_nodes
+        self._phase_statuses = PhaseStatusStore()
+
+    @property
+    def phase_statuses(self) -> PhaseStatusStore:
+        """
+        The `PhaseStatusStore` holding the traced phases of every `zepben.evolve.iec61970.base.core.terminal.Terminal` in this network. The
+        `TracedPhases` of each terminal is bound to it as the terminal is added, so the statuses of the network only live in the store.
+        """
+        return self._phase_statuses
+
+    @property
+    def state_version(self) -> int:
+        """
+        A counter that is incremented whenever equipment in this network is opened, closed, or taken in or out of service, so analysis of the
+        switching state of the network can tell when it is stale. Changes to connectivity don't increment it.
+        """
+        return self._phase_statuses.state_version
+
+    def upstream_index(self, current: bool = False) -> UpstreamIndex:
+        """
+        Get the `UpstreamIndex` of this network for path to source and upstream protection device queries. The index is created on first use and
+        rebuilt lazily whenever the traced phases change.
+        `current` Whether to get the index of the current state rather than the normal state.
+        """
+        if current:
+            if self._current_upstream_index is None:
+                self._current_upstream_index = UpstreamIndex(self, current=True)
+            return self._current_upstream_index
+        if self._normal_upstream_index is None:
+            self._normal_upstream_index = UpstreamIndex(self)
+        return self._normal_upstream_index
+
+    def add(self, identified_object: IdentifiedObject) -> bool:
+        added = BaseService.add(self, identified_object)
+        if added and isinstance(identified_object, Terminal):
+            identified_object.traced_phases.bind(self._phase_statuses, identified_object)
+        return added
+
+    def remove(self, identified_object: IdentifiedObject) -> bool:
+        removed = BaseService.remove(self, identified_object)
+        if removed and isinstance(identified_object, Terminal) and identified_object.traced_phases.store is self._phase_statuses:
+            identified_object.traced_phases.unbind()
+        return removed
+
+    def terminals_with_phase(self, nominal_phase: SinglePhaseKind, phs: SinglePhaseKind, current: bool = False) -> List[Terminal]:
+        """
+        Find the terminals whose traced phase for a nominal phase matches, using a bulk query of `phase_statuses`.
+        `nominal_phase` The nominal phase to check.
+        `phs` The traced phase to look for. Use `SinglePhaseKind.NONE` to find terminals with no phase, e.g. every terminal with no phase on B.
+        `current` Whether to check the current phases rather than the normal phases.
+        Returns the matching terminals. Note that terminals which don't have `nominal_phase` as one of their nominal phases never have it traced.
+        """
+        store = self.phase_statuses
+        return store.owners(store.slots_with_phase(nominal_phase, phs, current))
+
+    def reset_phases(self, normal: bool = True, current: bool = True):
+        """
+        Clear the traced phases of every terminal in the network in bulk, e.g. before re-running phasing.
+        `normal` Whether to clear the normal phases.
+        `current` Whether to clear the current phases.
+        """
+        self.phase_statuses.reset(normal, current)
 
     def get_measurements(self, mrid: str, t: type) -> List[Measurement]:
         """
@@ -197,9 +266,35 @@ class NetworkService(BaseService):
         else:
             return self._connectivity_nodes[mrid]
 
-    async def set_phases(self):
+    async def set_phases(self, parallel: bool = False, per_feeder: bool = False, max_workers: Optional[int] = None,
+                         collect_conflicts: bool = False) -> List[PhaseConflict]:
+        """
+        Trace the normal and current phases of this network from its energy sources.
+        `parallel` Whether to trace the normal and current phases in parallel worker processes. See `SetPhases.run_complete_parallel`.
+        `per_feeder` Whether to trace independent feeders in parallel worker processes. See `SetPhases.run_complete_per_feeder`.
+        `max_workers` The maximum number of worker processes to use when `per_feeder` is set. Defaults to the number of CPUs.
+        `collect_conflicts` Whether to report every phase conflict in the network rather than raising a `PhaseException` on the first one.
+        Returns the phase conflicts found, which is always empty unless `collect_conflicts` is set.
+        """
         set_phases = SetPhases()
-        await set_phases.run(self)
+        return await set_phases.run(self, parallel, per_feeder, max_workers, collect_conflicts)
+
+    def save_phases(self, path: str = TRACED_NETWORK_FILE):
+        """
+        Save the traced phases of this network so a later process can load them with `load_phases` rather than re-running phasing.
+        See `zepben.evolve.services.network.tracing.phases.phase_persistence.save_phases`.
+        `path` The file to write.
+        """
+        save_phases(self, path)
+
+    def load_phases(self, path: str = TRACED_NETWORK_FILE) -> bool:
+        """
+        Load traced phases saved by `save_phases`, refusing them if the topology, nominal phases or switch states of this network have changed since.
+        See `zepben.evolve.services.network.tracing.phases.phase_persistence.load_phases`.
+        `path` The file to read.
+        Returns True if the phases were loaded, or False if phasing needs to be run.
+        """
+        return load_phases(self, path)
 
     def _index_measurement(self, measurement: Measurement, mrid: str) -> bool:
         if not mrid:
@@ -6,13 +6,15 @@
 
 from __future__ import annotations
 
-from dataclassy import dataclass
 from operator import attrgetter
 
 from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.cim.iec61970.base.core.connectivity_node import ConnectivityNode
 from zepben.evolve.model.cim.iec61970.base.core.terminal import Terminal
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind, phase_mask, ordered_phases_from_mask, \
+    SINGLE_PHASE_KIND_VALUES
 from zepben.evolve.model.phases import NominalPhasePath
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, Set, Union, Iterable
 
 __all__ = ["ConnectivityResult", "get_connectivity", "terminal_compare", "get_connected_equipment"]
 
@@ -30,25 +32,46 @@ def terminal_compare(terminal: Terminal, other: Terminal):
 Terminal.__lt__ = terminal_compare
 
 
-def get_connectivity(terminal: Terminal, phases: Set[SinglePhaseKind] = None, exclude=None):
+def get_connectivity(terminal: Terminal, phases: Union[Set[SinglePhaseKind], int] = None, exclude=None):
     """
     Get the connectivity between this terminal and all other terminals in its `ConnectivityNode`.
-    `cores` Core paths to trace between the terminals. Defaults to all cores.
+
+    Results are cached on the `ConnectivityNode` for each terminal and phase mask, so repeated calls from traces return the same `ConnectivityResult`s
+    rather than recreating them. The cache of a node is discarded when terminals are connected to or disconnected from it, or the nominal phases of
+    any of its terminals change.
+    `phases` Phases to trace between the terminals, either as a set or a mask of `SinglePhaseKind.phase_bit`s. Defaults to all phases.
     `exclude` `zepben.evolve.iec61970.base.core.terminal.Terminal`'s to exclude from the result. Will be skipped if encountered.
     Returns List of `ConnectivityResult`'s for this terminal.
     """
+    cn = terminal.connectivity_node
+    if cn is None:
+        return []
+
+    trace_mask = terminal.phases.phase_mask
+    if phases is not None:
+        trace_mask &= phases if isinstance(phases, int) else phase_mask(phases)
+
+    cache = cn._connectivity_cache
+    if cache is None:
+        cache = cn._connectivity_cache = {}
+
+    key = (id(terminal), trace_mask)
+    results = cache.get(key)
+    if results is None:
+        results = cache[key] = _connectivity_results(terminal, cn, trace_mask)
+
     if exclude is None:
-        exclude = set()
-    if phases is None:
-        phases = terminal.phases.single_phases
-    trace_phases = phases.intersection(terminal.phases.single_phases)
-    cn = terminal.connectivity_node if terminal.connectivity_node else []
+        return list(results)
+    return [cr for cr in results if cr.to_terminal not in exclude]  # Skip those specifically excluded.
+
+
+def _connectivity_results(terminal: Terminal, cn: ConnectivityNode, trace_mask: int) -> List[ConnectivityResult]:
     results = []
     for term in cn:
-        if terminal is not term and term not in exclude:  # Don't include ourselves, or those specifically excluded.
-            cr = _terminal_connectivity(terminal, term, trace_phases)
-            if cr.nominal_phase_paths:
-                results.append(cr)
+        if terminal is not term:  # Don't include ourselves.
+            nominal_phase_paths = _nominal_phase_paths(terminal, term, trace_mask)
+            if nominal_phase_paths:
+                results.append(ConnectivityResult(from_terminal=terminal, to_terminal=term, nominal_phase_paths=nominal_phase_paths))
     return results
 
 
@@ -68,6 +91,8 @@ def get_connected_equipment(cond_equip, exclude: Set = None):
     connected_equip = []
     for terminal in cond_equip._terminals:
         conn_node = terminal.connectivity_node
+        if conn_node is None:
+            continue
         for term in conn_node:
             if term.conducting_equipment in exclude:
                 continue
@@ -79,41 +104,51 @@ def get_connected_equipment(cond_equip, exclude: Set = None):
 ConductingEquipment.connected_equipment = get_connected_equipment
 
 
-def _terminal_connectivity(terminal: Terminal, connected_terminal: Terminal, phases: Set[SinglePhaseKind]) -> ConnectivityResult:
-    nominal_phase_paths = [NominalPhasePath(phase, phase) for phase in phases if phase in connected_terminal.phases.single_phases]
-
-    if not nominal_phase_paths:
-        xy_phases = {phase for phase in phases if phase == SinglePhaseKind.X or phase == SinglePhaseKind.Y}
-        connected_xy_phases = {phase for phase in connected_terminal.phases.single_phases if phase == SinglePhaseKind.X or phase == SinglePhaseKind.Y}
-
-        _process_xy_phases(terminal, connected_terminal, phases, xy_phases, connected_xy_phases, nominal_phase_paths)
+def _nominal_phase_paths(terminal: Terminal, connected_terminal: Terminal, trace_mask: int) -> Tuple[NominalPhasePath, ...]:
+    connected_mask = connected_terminal.phases.phase_mask
+    common_mask = trace_mask & connected_mask
+    if common_mask:
+        return _SAME_PHASE_PATHS[common_mask]
+
+    # Unknown X and Y phases are only connected by position when one side has them and the other doesn't.
+    xy_mask = trace_mask & _XY_MASK
+    connected_xy_mask = connected_mask & _XY_MASK
+    if bool(xy_mask) == bool(connected_xy_mask):
+        return ()
+
+    nominal_phase_paths = []
+    terminal_phases = terminal.phases.single_phases
+    connected_phases = connected_terminal.phases.single_phases
+    for phase in ordered_phases_from_mask(xy_mask):
+        i = terminal_phases.index(phase)
+        if i < len(connected_phases):
+            nominal_phase_paths.append(NominalPhasePath(from_phase=phase, to_phase=connected_phases[i]))
+
+    for phase in ordered_phases_from_mask(connected_xy_mask):
+        i = connected_phases.index(phase)
+        if i < len(terminal_phases):
+            terminal_phase = terminal_phases[i]
+            if terminal_phase.phase_bit & trace_mask:
+                nominal_phase_paths.append(NominalPhasePath(from_phase=terminal_phase, to_phase=phase))
+    return tuple(nominal_phase_paths)
 
-    return ConnectivityResult(from_terminal=terminal, to_terminal=connected_terminal, nominal_phase_paths=nominal_phase_paths)
 
+_XY_MASK = SinglePhaseKind.X.phase_bit | SinglePhaseKind.Y.phase_bit
 
-def _process_xy_phases(terminal: Terminal, connected_terminal: Terminal, phases: Set[SinglePhaseKind], xy_phases: Set[SinglePhaseKind],
-                       connectied_xy_phases: Set[SinglePhaseKind], nominal_phase_paths: List[NominalPhasePath]):
-    if (not xy_phases and not connectied_xy_phases) or (xy_phases and connectied_xy_phases):
-        return
-    for phase in xy_phases:
-        i = terminal.phases.single_phases.index(phase)
-        if i < len(connected_terminal.phases.single_phases):
-            nominal_phase_paths.append(NominalPhasePath(from_phase=phase, to_phase=connected_terminal.phases.single_phases[i]))
+# The paths connecting each phase to itself for every phase mask.
+_SAME_PHASE_PATHS: Tuple[Tuple[NominalPhasePath, ...], ...] = tuple(tuple(NominalPhasePath(phase, phase) for phase in ordered_phases_from_mask(mask))
+                                                                    for mask in range(1 << len(SINGLE_PHASE_KIND_VALUES)))
 
-    for phase in connectied_xy_phases:
-        i = connected_terminal.phases.single_phases.index(phase)
-        if i < len(terminal.phases.single_phases):
-            terminal_phase = terminal.phases.single_phases[i]
-            if terminal_phase in phases:
-                nominal_phase_paths.append(NominalPhasePath(from_phase=terminal_phase, to_phase=phase))
+_path_order = attrgetter("_order")
 
 
-@dataclass(slots=True)
 class ConnectivityResult(object):
     """
     Stores the connectivity between two terminals, including the mapping between the nominal phases.
-    This class is intended to be used in an immutable way. You should avoid modifying it after it has been created.
+    This class is intended to be used in an immutable way. You should avoid modifying it after it has been created, as its hash and phase masks are
+    calculated when it is created.
     """
+    __slots__ = ["from_terminal", "to_terminal", "nominal_phase_paths", "from_phases_mask", "to_phases_mask", "_hash"]
 
     from_terminal: Terminal
     """The terminal from which the connectivity was requested."""
@@ -121,37 +156,53 @@ class ConnectivityResult(object):
     to_terminal: Terminal
     """The terminal which is connected to the requested terminal."""
 
-    nominal_phase_paths: Tuple[NominalPhasePath]
-    """The mapping of nominal phase paths between the from and to terminals."""
+    nominal_phase_paths: Tuple[NominalPhasePath, ...]
+    """The mapping of nominal phase paths between the from and to terminals, ordered by their from phase and then their to phase."""
 
-    def __init__(self, nominal_phase_paths: List[NominalPhasePath]):
-        self.nominal_phase_paths = tuple(sorted(nominal_phase_paths, key=attrgetter('from_terminal', 'to_terminal')))
+    from_phases_mask: int
+    """The `SinglePhaseKind.phase_bit`s of the nominal phases that are connected in the `from_terminal`."""
+
+    to_phases_mask: int
+    """The `SinglePhaseKind.phase_bit`s of the nominal phases that are connected in the `to_terminal`."""
+
+    def __init__(self, from_terminal: Terminal, to_terminal: Terminal, nominal_phase_paths: Iterable[NominalPhasePath]):
+        nominal_phase_paths = tuple(nominal_phase_paths)
+        if len(nominal_phase_paths) > 1:
+            nominal_phase_paths = tuple(sorted(nominal_phase_paths, key=_path_order))
+
+        from_mask = 0
+        to_mask = 0
+        for path in nominal_phase_paths:
+            from_mask |= path.from_phase.phase_bit
+            to_mask |= path.to_phase.phase_bit
+
+        self.from_terminal = from_terminal
+        self.to_terminal = to_terminal
+        self.nominal_phase_paths = nominal_phase_paths
+        self.from_phases_mask = from_mask
+        self.to_phases_mask = to_mask
+        self._hash = hash((from_terminal.mrid, to_terminal.mrid, nominal_phase_paths))
 
     def __eq__(self, other: ConnectivityResult):
         if self is other:
             return True
         try:
-            return self.from_terminal is other.from_terminal and self.to_terminal is other.to_terminal and self.nominal_phase_paths != other.nominal_phase_paths
-        except:
+            return self.from_terminal is other.from_terminal and self.to_terminal is other.to_terminal and self.nominal_phase_paths == other.nominal_phase_paths
+        except AttributeError:
             return False
 
     def __ne__(self, other):
-        if self is other:
-            return False
-        try:
-            return self.from_terminal is not other.from_terminal or self.to_terminal is not other.to_terminal or self.nominal_phase_paths != other.nominal_phase_paths
-        except:
-            return True
+        return not self == other
+
+    def __hash__(self):
+        return self._hash
 
     def __str__(self):
         return (f"ConnectivityResult(from_terminal={self.from_equip.mrid}-t{self.from_terminal.sequence_number}"
                 f", to_terminal={self.to_equip.mrid}-t{self.to_terminal.sequence_number}, core_paths={self.nominal_phase_paths})")
 
-    def __hash__(self):
-        res = self.from_terminal.mrid.__hash__()
-        res = 31 * res + self.to_terminal.mrid.__hash__()
-        res = 31 * res + self.nominal_phase_paths.__hash__()
-        return res
+    def __repr__(self):
+        return f"ConnectivityResult(from_terminal={self.from_terminal!r}, to_terminal={self.to_terminal!r}, nominal_phase_paths={self.nominal_phase_paths!r})"
 
     @property
     def from_equip(self) -> Optional[ConductingEquipment]:
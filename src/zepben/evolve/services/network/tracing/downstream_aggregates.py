@@ -0,0 +1,143 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+from typing import List, Optional, Tuple
+
+from dataclassy import dataclass
+
+from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.cim.iec61970.base.wires.aclinesegment import Conductor
+from zepben.evolve.model.cim.iec61970.base.wires.energy_consumer import EnergyConsumer
+from zepben.evolve.services.network.tracing.downstream_tree import DownstreamTree
+
+__all__ = ["DownstreamTotals", "DownstreamAggregates"]
+
+
+@dataclass(slots=True)
+class DownstreamTotals(object):
+    """
+    The totals of a piece of equipment and everything fed through it.
+    """
+
+    customer_count: int = 0
+    """The total `EnergyConsumer.customer_count`."""
+
+    usage_points: int = 0
+    """The total number of usage points."""
+
+    p: float = 0.0
+    """The total `EnergyConsumer.p`."""
+
+    q: float = 0.0
+    """The total `EnergyConsumer.q`."""
+
+    conductor_length: float = 0.0
+    """The total `Conductor.length`."""
+
+
+def _own_values(ce: ConductingEquipment) -> Tuple[int, int, float, float, float]:
+    usage_points = ce.num_usage_points()
+    if isinstance(ce, EnergyConsumer):
+        return ce.customer_count or 0, usage_points, ce.p or 0.0, ce.q or 0.0, 0.0
+    if isinstance(ce, Conductor):
+        return 0, usage_points, 0.0, 0.0, ce.length or 0.0
+    return 0, usage_points, 0.0, 0.0, 0.0
+
+
+class DownstreamAggregates(object):
+    """
+    The customers, load and conductor length downstream of every piece of equipment in a phased network, for questions like how many customers and
+    how much load are fed through each switch.
+
+    The totals are calculated in one bottom up pass over the `DownstreamTree` of the network, so each piece of equipment is counted once, under the
+    equipment it is fed from in the tree, even where it is fed from more than one direction. Call `update` after changing the load of equipment to
+    adjust the totals of everything upstream of it, which takes time proportional to its depth. The tree and totals are rebuilt on the next query
+    after the network is re-phased.
+    """
+    __slots__ = ["network", "current", "_version", "_tree", "_own", "_totals"]
+
+    def __init__(self, network: NetworkService, current: bool = False):
+        """
+        `network` The phased network.
+        `current` Whether to aggregate through the current state of the network rather than the normal state.
+        """
+        self.network = network
+        self.current = current
+        self._version = -1
+        self._tree: Optional[DownstreamTree] = None
+        # The values of each piece of equipment and the totals of its subtree, as customer count, usage points, p, q and conductor length columns
+        # indexed by the position of the equipment in the tree.
+        self._own: List[List] = []
+        self._totals: List[List] = []
+
+    @property
+    def is_stale(self) -> bool:
+        """True if the phases have changed since the totals were calculated, in which case they are recalculated by the next query."""
+        return self._version != self.network.phase_statuses.version
+
+    @property
+    def tree(self) -> DownstreamTree:
+        """The `DownstreamTree` the totals are calculated over."""
+        self._ensure()
+        return self._tree
+
+    def totals(self, ce: ConductingEquipment) -> DownstreamTotals:
+        """
+        `ce` The equipment to get the totals of.
+        Returns the totals of `ce` and everything downstream of it, which are all zero if `ce` isn't energised.
+        """
+        self._ensure()
+        i = self._tree.index_of(ce)
+        if i is None:
+            return DownstreamTotals()
+        return DownstreamTotals(*(column[i] for column in self._totals))
+
+    def update(self, *equipment: ConductingEquipment):
+        """
+        Update the totals after the customer count, load, usage points or length of `equipment` have changed, adjusting only the totals of each
+        piece of equipment and the equipment upstream of it.
+        `equipment` The equipment that has changed.
+        """
+        if self.is_stale:
+            # The whole tree is recalculated by the next query anyway.
+            return
+
+        tree = self._tree
+        for ce in equipment:
+            i = tree.index_of(ce)
+            if i is None:
+                continue
+            for own, totals, value in zip(self._own, self._totals, _own_values(ce)):
+                delta = value - own[i]
+                if not delta:
+                    continue
+                own[i] = value
+                k = i
+                while k >= 0:
+                    totals[k] += delta
+                    k = tree.parent_index(k)
+
+    def _ensure(self):
+        version = self.network.phase_statuses.version
+        if self._version == version:
+            return
+
+        tree = DownstreamTree(self.network, self.current)
+        values = [_own_values(tree.equipment_at(i)) for i in range(len(tree))]
+        self._own = [list(column) for column in zip(*values)] if values else [[] for _ in range(5)]
+        self._totals = [list(column) for column in self._own]
+
+        # Children always come after their parents in depth first order, so walking it backwards accumulates each subtree before its parent.
+        for i in reversed(tree.depth_first_order):
+            parent = tree.parent_index(i)
+            if parent >= 0:
+                for totals in self._totals:
+                    totals[parent] += totals[i]
+
+        self._tree = tree
+        self._version = version
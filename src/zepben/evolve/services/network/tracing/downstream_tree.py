@@ -0,0 +1,355 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.phasedirection import PhaseDirection
+from zepben.evolve.services.network.tracing.connectivity import get_connectivity
+from zepben.evolve.services.network.tracing.phases.phase_status import normal_phases, current_phases
+from zepben.evolve.services.network.tracing.traces import get_phases_with_direction
+from zepben.evolve.services.network.tracing.util import normally_open, currently_open, is_source
+
+__all__ = ["DownstreamTree"]
+
+
+class DownstreamTree(object):
+    """
+    A spanning tree of the conducting equipment fed from each energy source, following the phase directions traced by `SetPhases` in either the
+    normal or current state of a network. Each piece of equipment records the equipment it is fed from, so questions about the paths between many
+    pairs of equipment can be answered by walking parent pointers and finding lowest common ancestors rather than running a trace for each pair.
+
+    The equipment is also numbered in depth first order, with the entry and exit numbers of each piece of equipment bounding the numbers of
+    everything fed through it. This makes checking if one piece of equipment is downstream of another, or counting what is downstream of it, a
+    constant time comparison, and the equipment downstream of it a contiguous slice of that order.
+
+    Equipment is fed from the first equipment found to supply it in breadth first order from the sources, which is the equipment a downstream trace
+    from the sources reaches it from first. Phases that also flow into equipment from elsewhere, such as around a closed loop or from a second
+    source, are reported by `multi_fed` and `loops` rather than being part of the tree. Equipment that isn't energised is not part of the tree. The
+    tree reflects the phases at the time it was built, so it needs to be rebuilt after re-phasing.
+    """
+    __slots__ = ["current", "_equipment", "_index", "_parent", "_feeds", "_depth", "_children", "_root", "_up", "_order", "_entry", "_exit",
+                 "_extra_feeds", "_extra_feed_terminals"]
+
+    def __init__(self, network: NetworkService, current: bool = False):
+        """
+        Build the tree from the traced phases of `network`.
+        `network` The phased network.
+        `current` Whether to follow the current phases rather than the normal phases.
+        """
+        self.current = current
+        self._equipment: List[ConductingEquipment] = []
+        # Indexes into the lists below, keyed by the id of the equipment.
+        self._index: Dict[int, int] = {}
+        self._parent: List[int] = []
+        # The terminal of the parent phases flow out of and the terminal they flow in to, or None for a root.
+        self._feeds: List[Optional[Tuple[Terminal, Terminal]]] = []
+        self._depth: List[int] = []
+        self._children: List[List[int]] = []
+        self._root: List[int] = []
+        # The ancestor 2^k levels up for each level k, for finding lowest common ancestors by binary lifting.
+        self._up: List[List[int]] = []
+        # The equipment in depth first order, and the range of that order each piece of equipment and everything downstream of it occupies.
+        self._order: List[int] = []
+        self._entry: List[int] = []
+        self._exit: List[int] = []
+        # The feeds between equipment that aren't part of the tree, as (from, to) indexes and whether the feed closes a loop or parallels sources.
+        self._extra_feeds: List[Tuple[int, int, bool]] = []
+        # The terminals phases flow out of and towards for each connection outside the tree, including into equipment that is open.
+        self._extra_feed_terminals: List[Tuple[Terminal, Terminal]] = []
+        self._build(network)
+
+    def __len__(self):
+        return len(self._equipment)
+
+    def __contains__(self, ce: ConductingEquipment) -> bool:
+        return id(ce) in self._index
+
+    def index_of(self, ce: ConductingEquipment) -> Optional[int]:
+        """
+        `ce` The equipment to get the position of.
+        Returns the position of `ce` in the tree, from 0 up to the number of pieces of equipment in the tree, or None if it isn't part of the tree.
+        """
+        return self._index.get(id(ce))
+
+    def equipment_at(self, i: int) -> ConductingEquipment:
+        """
+        `i` The position in the tree, as returned by `index_of`.
+        Returns the equipment at position `i`.
+        """
+        return self._equipment[i]
+
+    def parent_index(self, i: int) -> int:
+        """
+        `i` The position in the tree, as returned by `index_of`.
+        Returns the position of the equipment the equipment at position `i` is fed from, or -1 if it is a root.
+        """
+        return self._parent[i]
+
+    def feed_terminals(self, i: int) -> Optional[Tuple[Terminal, Terminal]]:
+        """
+        `i` The position in the tree, as returned by `index_of`.
+        Returns the terminal of the parent phases flow out of and the terminal of the equipment at position `i` they flow in to, or None if it is a
+        root.
+        """
+        return self._feeds[i]
+
+    @property
+    def extra_feed_terminals(self) -> List[Tuple[Terminal, Terminal]]:
+        """
+        The terminal phases flow out of and the terminal they flow towards for each connection found from equipment in the tree to equipment that was
+        already reached, other than its parent, in breadth first order. Unlike `feeders`, this includes connections into equipment that is open.
+        """
+        return list(self._extra_feed_terminals)
+
+    @property
+    def depth_first_order(self) -> Tuple[int, ...]:
+        """The position of each piece of equipment in depth first order, in which each piece of equipment comes before everything fed through it."""
+        return tuple(self._order)
+
+    @property
+    def roots(self) -> List[ConductingEquipment]:
+        """The equipment at the head of each tree, which are the energy sources and anything else that feeds phases out without being fed."""
+        return [self._equipment[i] for i, parent in enumerate(self._parent) if parent < 0]
+
+    def parent(self, ce: ConductingEquipment) -> Optional[ConductingEquipment]:
+        """
+        `ce` The equipment to get the parent of.
+        Returns the equipment `ce` is fed from, or None if it is a root or isn't part of the tree.
+        """
+        i = self._index.get(id(ce))
+        if i is None or self._parent[i] < 0:
+            return None
+        return self._equipment[self._parent[i]]
+
+    def children(self, ce: ConductingEquipment) -> List[ConductingEquipment]:
+        """
+        `ce` The equipment to get the children of.
+        Returns the equipment fed directly from `ce`.
+        """
+        i = self._index.get(id(ce))
+        return [] if i is None else [self._equipment[c] for c in self._children[i]]
+
+    def depth(self, ce: ConductingEquipment) -> Optional[int]:
+        """
+        `ce` The equipment to get the depth of.
+        Returns the number of pieces of equipment between `ce` and its root, or None if it isn't part of the tree.
+        """
+        i = self._index.get(id(ce))
+        return None if i is None else self._depth[i]
+
+    def lowest_common_ancestor(self, a: ConductingEquipment, b: ConductingEquipment) -> Optional[ConductingEquipment]:
+        """
+        Find the furthest downstream equipment that both `a` and `b` are fed through, which may be `a` or `b` themselves.
+        Returns the lowest common ancestor, or None if either isn't part of the tree or they are fed from different roots.
+        """
+        i = self._index.get(id(a))
+        j = self._index.get(id(b))
+        if i is None or j is None or self._root[i] != self._root[j]:
+            return None
+        return self._equipment[self._lca(i, j)]
+
+    def is_downstream(self, ce: ConductingEquipment, of: ConductingEquipment) -> bool:
+        """
+        Check if `ce` is downstream of `of` in constant time by comparing their depth first numbers.
+        `ce` The equipment to check.
+        `of` The equipment to check against.
+        Returns True if `ce` is `of` or is fed through it.
+        """
+        i = self._index.get(id(ce))
+        j = self._index.get(id(of))
+        if i is None or j is None:
+            return False
+        return self._entry[j] <= self._entry[i] < self._exit[j]
+
+    def downstream_count(self, ce: ConductingEquipment) -> int:
+        """
+        `ce` The equipment to check.
+        Returns the number of pieces of equipment fed through `ce`, not including `ce` itself.
+        """
+        i = self._index.get(id(ce))
+        return 0 if i is None else self._exit[i] - self._entry[i] - 1
+
+    def path(self, from_: ConductingEquipment, to: ConductingEquipment) -> Optional[List[ConductingEquipment]]:
+        """
+        Get the equipment on the path through the tree between `from_` and `to`, going up from `from_` to their lowest common ancestor and back down
+        to `to`.
+        Returns the equipment on the path including `from_` and `to`, or None if there is no path.
+        """
+        i = self._index.get(id(from_))
+        j = self._index.get(id(to))
+        if i is None or j is None or self._root[i] != self._root[j]:
+            return None
+
+        lca = self._lca(i, j)
+        up = self._walk_up(i, lca)
+        down = self._walk_up(j, lca)
+        down.reverse()
+        return [self._equipment[k] for k in up + [lca] + down]
+
+    def subtree(self, ce: ConductingEquipment, stop: Optional[ConductingEquipment] = None) -> List[ConductingEquipment]:
+        """
+        Get `ce` and everything fed through it in depth first order.
+        `ce` The equipment at the top of the subtree.
+        `stop` Optional equipment that is included but not descended below.
+        Returns the equipment in the subtree, or an empty list if `ce` isn't part of the tree.
+        """
+        i = self._index.get(id(ce))
+        if i is None:
+            return []
+        order = self._order
+        j = self._index.get(id(stop)) if stop is not None else None
+        if j is None or not self._entry[i] <= self._entry[j] < self._exit[i]:
+            slots = order[self._entry[i]:self._exit[i]]
+        else:
+            slots = order[self._entry[i]:self._entry[j] + 1] + order[self._exit[j]:self._exit[i]]
+        equipment = self._equipment
+        return [equipment[k] for k in slots]
+
+    def feeders(self, ce: ConductingEquipment) -> List[ConductingEquipment]:
+        """
+        `ce` The equipment to check.
+        Returns all of the equipment phases flow into `ce` from, starting with its parent in the tree.
+        """
+        i = self._index.get(id(ce))
+        if i is None:
+            return []
+        feeders = [] if self._parent[i] < 0 else [self._parent[i]]
+        for f, t, _ in self._extra_feeds:
+            if t == i and f not in feeders:
+                feeders.append(f)
+        return [self._equipment[f] for f in feeders]
+
+    @property
+    def multi_fed(self) -> List[ConductingEquipment]:
+        """The equipment that phases flow into from more than one piece of equipment, such as around closed loops or where sources are paralleled."""
+        fed = {t for _, t, _ in self._extra_feeds}
+        return sorted((self._equipment[t] for t in fed), key=lambda it: it.mrid)
+
+    @property
+    def loops(self) -> List[Tuple[ConductingEquipment, ConductingEquipment]]:
+        """
+        The connections that close a loop between equipment fed from the same source, with one for each independent loop. Each is reported as the
+        pair of equipment phases flow between outside the tree.
+        """
+        return [(self._equipment[f], self._equipment[t]) for f, t, closes in self._extra_feeds if closes and self._root[f] == self._root[t]]
+
+    def _build(self, network: NetworkService):
+        open_test, phase_selector = (currently_open, current_phases) if self.current else (normally_open, normal_phases)
+
+        def out_mask(terminal):
+            return get_phases_with_direction(open_test, phase_selector, terminal, terminal.phases.phase_mask, PhaseDirection.OUT)
+
+        def in_mask(terminal):
+            return get_phases_with_direction(open_test, phase_selector, terminal, terminal.phases.phase_mask, PhaseDirection.IN)
+
+        def is_fed(ce):
+            return any(phase_selector(t, phase).direction().has(PhaseDirection.IN) for t in ce.terminals for phase in t.phases.single_phases)
+
+        # Energy sources are always roots, even when phases flow back into them from sources they are paralleled with.
+        roots = sorted((ce for ce in network.objects(ConductingEquipment)
+                        if (is_source(ce) or not is_fed(ce)) and any(out_mask(t) for t in ce.terminals)), key=lambda it: it.mrid)
+        for root in roots:
+            self._add(root, -1, None)
+
+        # The connectivity nodes phases have already flowed into. Phases flowing into a node for the first time are the only ones that can close a
+        # loop, as any others are flowing into the same node from another side.
+        entered = set()
+        queue = deque(range(len(self._equipment)))
+        while queue:
+            i = queue.popleft()
+            for terminal in self._equipment[i].terminals:
+                mask = out_mask(terminal)
+                if not mask:
+                    continue
+                first_in = id(terminal.connectivity_node) not in entered
+                entered.add(id(terminal.connectivity_node))
+                for cr in get_connectivity(terminal, mask):
+                    to_equip = cr.to_equip
+                    if to_equip is None:
+                        continue
+                    j = self._index.get(id(to_equip))
+                    if j is None:
+                        queue.append(self._add(to_equip, i, (terminal, cr.to_terminal)))
+                    elif j != i and j != self._parent[i]:
+                        self._extra_feed_terminals.append((terminal, cr.to_terminal))
+                        if in_mask(cr.to_terminal):
+                            self._extra_feeds.append((i, j, first_in))
+
+        self._number()
+
+        levels = max(self._depth, default=0).bit_length() or 1
+        up = [p if p >= 0 else i for i, p in enumerate(self._parent)]
+        self._up = [up]
+        for _ in range(1, levels):
+            up = [up[k] for k in up]
+            self._up.append(up)
+
+    def _number(self):
+        count = len(self._equipment)
+        self._entry = [0] * count
+        self._exit = [0] * count
+        order = self._order
+        for root, parent in enumerate(self._parent):
+            if parent >= 0:
+                continue
+            stack = [(root, False)]
+            while stack:
+                k, exiting = stack.pop()
+                if exiting:
+                    self._exit[k] = len(order)
+                    continue
+                self._entry[k] = len(order)
+                order.append(k)
+                stack.append((k, True))
+                stack.extend((c, False) for c in reversed(self._children[k]))
+
+    def _add(self, ce: ConductingEquipment, parent: int, feed: Optional[Tuple[Terminal, Terminal]]) -> int:
+        i = len(self._equipment)
+        self._equipment.append(ce)
+        self._index[id(ce)] = i
+        self._parent.append(parent)
+        self._feeds.append(feed)
+        self._children.append([])
+        if parent < 0:
+            self._depth.append(0)
+            self._root.append(i)
+        else:
+            self._depth.append(self._depth[parent] + 1)
+            self._root.append(self._root[parent])
+            self._children[parent].append(i)
+        return i
+
+    def _ancestor(self, i: int, levels: int) -> int:
+        k = 0
+        while levels:
+            if levels & 1:
+                i = self._up[k][i]
+            levels >>= 1
+            k += 1
+        return i
+
+    def _lca(self, i: int, j: int) -> int:
+        if self._depth[i] < self._depth[j]:
+            i, j = j, i
+        i = self._ancestor(i, self._depth[i] - self._depth[j])
+        if i == j:
+            return i
+        for up in reversed(self._up):
+            if up[i] != up[j]:
+                i = up[i]
+                j = up[j]
+        return self._parent[i]
+
+    def _walk_up(self, i: int, ancestor: int) -> List[int]:
+        path = []
+        while i != ancestor:
+            path.append(i)
+            i = self._parent[i]
+        return path
@@ -8,12 +8,13 @@ from __future__ import annotations
 from dataclassy import dataclass
 
 
+from zepben.evolve.services.network.tracing.downstream_tree import DownstreamTree
 from zepben.evolve.services.network.tracing.phases.phase_step import PhaseStep
 from zepben.evolve.services.network.tracing.traces import normal_downstream_trace, current_downstream_trace
-from typing import Callable, List, Optional, Dict
+from typing import Callable, List, Optional, Dict, Iterable
 from enum import Enum
 
-__all__ = ["Status", "Result", "find_current", "find_normal"]
+__all__ = ["Status", "Result", "find_current", "find_normal", "find_normal_batch", "find_current_batch"]
 
 
 class Status(Enum):
@@ -62,10 +63,10 @@ async def _trace(traversal_supplier: Callable[[...], Traversal], from_: Conducti
             return Result(status=Status.NO_PATH)
         with_usage_points.clear()
         traversal.reset()
-        traversal.trace(PhaseStep(to, frozenset(next(to.terminals).phases.single_phases)), can_stop_on_start_item=False)
+        await traversal.trace(PhaseStep(to, frozenset(next(to.terminals).phases.single_phases)), can_stop_on_start_item=False)
 
     if path_found[0]:
-        return Result(conducting_equipment=with_usage_points)
+        return Result(equipment=with_usage_points)
     else:
         return Result(status=Status.NO_PATH)
 
@@ -79,13 +80,85 @@ async def _find(traversal_supplier: Callable[[...], Traversal], froms: List[Cond
         if t is not None and f.mrid == t.mrid:
             res.append(Result(equipment={f.mrid: f} if f.num_usage_points() != 0 else None))
         else:
-            res.append(_trace(traversal_supplier, f, t))
+            res.append(await _trace(traversal_supplier, f, t))
     return res
 
 
-def find_normal(from_: ConductingEquipment, to: ConductingEquipment):
-    return _find(normal_downstream_trace, froms=[from_], tos=[to])
+async def find_normal(from_: ConductingEquipment, to: ConductingEquipment):
+    return await _find(normal_downstream_trace, froms=[from_], tos=[to])
 
 
-def find_current(from_: ConductingEquipment, to: ConductingEquipment):
-    return _find(current_downstream_trace, froms=[from_], tos=[to])
+async def find_current(from_: ConductingEquipment, to: ConductingEquipment):
+    return await _find(current_downstream_trace, froms=[from_], tos=[to])
+
+
+def _usage_points(equipment: Iterable[ConductingEquipment]) -> Dict[str, ConductingEquipment]:
+    return {ce.mrid: ce for ce in equipment if ce.num_usage_points() != 0}
+
+
+def _find_in_tree(tree: DownstreamTree, from_: ConductingEquipment, to: Optional[ConductingEquipment]) -> Result:
+    if from_.num_terminals() == 0:
+        if to is not None:
+            return Result(status=Status.NO_PATH)
+        return Result(equipment=_usage_points([from_]))
+
+    if from_ not in tree:
+        # Equipment that isn't energised doesn't feed anything, so the trace from it only ever visits itself.
+        return Result(equipment=_usage_points([from_])) if to is None else Result(status=Status.NO_PATH)
+
+    if to is None:
+        return Result(equipment=_usage_points(tree.subtree(from_)))
+    if tree.is_downstream(to, from_):
+        return Result(equipment=_usage_points(tree.subtree(from_, stop=to)))
+    if tree.is_downstream(from_, to):
+        return Result(equipment=_usage_points(tree.subtree(to, stop=from_)))
+    return Result(status=Status.NO_PATH)
+
+
+def _find_batch(tree: DownstreamTree, froms: List[ConductingEquipment], tos: List[Optional[ConductingEquipment]]) -> List[Result]:
+    if len(froms) != len(tos):
+        return [Result(status=Status.MISMATCHED_FROM_TO)] * min(len(froms), len(tos))
+
+    res = []
+    for f, t in zip(froms, tos):
+        if t is not None and f.mrid == t.mrid:
+            res.append(Result(equipment={f.mrid: f} if f.num_usage_points() != 0 else None))
+        else:
+            res.append(_find_in_tree(tree, f, t))
+    return res
+
+
+def find_normal_batch(network: NetworkService,
+                      froms: List[ConductingEquipment],
+                      tos: List[Optional[ConductingEquipment]],
+                      tree: Optional[DownstreamTree] = None) -> List[Result]:
+    """
+    Find the equipment with usage points between many pairs of equipment in the normal state of the network, giving the same results as calling
+    `find_normal` for each pair on a radial network. Rather than running a trace per pair, the `DownstreamTree` of the network is built once and each
+    pair is answered from it using lowest common ancestor lookups, so the cost of each pair is proportional to the size of its result.
+
+    Where the network is meshed, equipment is attributed to the first path that feeds it rather than every path a downstream trace would follow.
+
+    `network` The phased network the equipment belongs to.
+    `froms` The equipment to find paths from.
+    `tos` The equipment to find paths to, paired with `froms`. A `to` of None finds everything downstream of its `from`.
+    `tree` An existing `DownstreamTree` of `network` in the normal state to reuse across batches.
+    Returns a `Result` for each pair.
+    """
+    return _find_batch(tree if tree is not None else DownstreamTree(network), froms, tos)
+
+
+def find_current_batch(network: NetworkService,
+                       froms: List[ConductingEquipment],
+                       tos: List[Optional[ConductingEquipment]],
+                       tree: Optional[DownstreamTree] = None) -> List[Result]:
+    """
+    The same as `find_normal_batch` for the current state of the network, matching `find_current`.
+
+    `network` The phased network the equipment belongs to.
+    `froms` The equipment to find paths from.
+    `tos` The equipment to find paths to, paired with `froms`. A `to` of None finds everything downstream of its `from`.
+    `tree` An existing `DownstreamTree` of `network` in the current state to reuse across batches.
+    Returns a `Result` for each pair.
+    """
+    return _find_batch(tree if tree is not None else DownstreamTree(network, current=True), froms, tos)
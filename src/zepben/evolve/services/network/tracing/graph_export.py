@@ -0,0 +1,164 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+from array import array
+from enum import Enum
+from itertools import combinations
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from dataclassy import dataclass
+
+from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.cim.iec61970.base.core.connectivity_node import ConnectivityNode
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind
+from zepben.evolve.services.network.tracing.util import ignore_open, is_closed
+
+__all__ = ["GraphLevel", "NetworkAdjacency", "adjacency_matrix", "to_networkx"]
+
+
+class GraphLevel(Enum):
+    """
+    The objects used as the nodes of a graph exported from a network.
+    """
+
+    TERMINAL = 0
+    """Terminals, which are adjacent to the other terminals of their connectivity node and, if it is closed, of their equipment."""
+
+    CONNECTIVITY_NODE = 1
+    """Connectivity nodes, which are adjacent if they are joined by closed equipment."""
+
+    EQUIPMENT = 2
+    """Conducting equipment, which is adjacent to the other closed equipment it shares a connectivity node with."""
+
+
+@dataclass(slots=True)
+class NetworkAdjacency(object):
+    """
+    The adjacency matrix of a network in coordinate (COO) format, which is symmetric with each edge stored in both directions.
+    """
+
+    level: GraphLevel = GraphLevel.EQUIPMENT
+    """The objects used as the nodes of the graph."""
+
+    mrids: List[str] = []
+    """The mRID of the object of each row and column, ordered by mRID."""
+
+    rows: array = array("l")
+    """The row index of each non-zero entry."""
+
+    cols: array = array("l")
+    """The column index of each non-zero entry."""
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        """The shape of the matrix, which is square with a row and column per node."""
+        return len(self.mrids), len(self.mrids)
+
+    @property
+    def index(self) -> Dict[str, int]:
+        """The row and column index of each mRID."""
+        return {mrid: i for i, mrid in enumerate(self.mrids)}
+
+    def to_scipy(self, dtype=float):
+        """
+        Convert the matrix to a SciPy sparse matrix, which requires SciPy to be installed.
+        `dtype` The type of the entries of the matrix, which are all one.
+        Returns a `scipy.sparse.coo_matrix`, which can be converted to other formats with methods such as `tocsr`.
+        """
+        import numpy
+        from scipy.sparse import coo_matrix
+
+        rows = numpy.frombuffer(self.rows, dtype=self.rows.typecode) if self.rows else numpy.zeros(0, dtype=int)
+        cols = numpy.frombuffer(self.cols, dtype=self.cols.typecode) if self.cols else numpy.zeros(0, dtype=int)
+        return coo_matrix((numpy.ones(len(rows), dtype=dtype), (rows, cols)), shape=self.shape)
+
+
+def _graph(network: NetworkService,
+           level: GraphLevel,
+           open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool]) -> Tuple[List[object], List[Tuple[int, int]]]:
+    equipment = sorted(network.objects(ConductingEquipment), key=lambda it: it.mrid)
+    closed = [ce for ce in equipment if is_closed(ce, open_test)]
+
+    if level is GraphLevel.TERMINAL:
+        nodes = sorted((t for ce in equipment for t in ce.terminals), key=lambda it: it.mrid)
+        index = {id(t): i for i, t in enumerate(nodes)}
+        groups = [[t for t in ce.terminals] for ce in closed]
+        groups.extend(list(cn.terminals) for cn in network.objects(ConnectivityNode))
+    elif level is GraphLevel.CONNECTIVITY_NODE:
+        nodes = sorted(network.objects(ConnectivityNode), key=lambda it: it.mrid)
+        index = {id(cn): i for i, cn in enumerate(nodes)}
+        groups = [[t.connectivity_node for t in ce.terminals if t.connectivity_node is not None] for ce in closed]
+    else:
+        nodes = equipment
+        closed_ids = {id(ce) for ce in closed}
+        index = {id(ce): i for i, ce in enumerate(nodes) if id(ce) in closed_ids}
+        groups = [[t.conducting_equipment for t in cn.terminals if t.conducting_equipment is not None] for cn in network.objects(ConnectivityNode)]
+
+    # Each group of objects is fully connected. Objects missing from the index, such as open equipment, are left out of the edges.
+    edges: Set[Tuple[int, int]] = set()
+    for group in groups:
+        members = sorted({index[id(it)] for it in group if id(it) in index})
+        edges.update(combinations(members, 2))
+    return nodes, sorted(edges)
+
+
+def adjacency_matrix(network: NetworkService,
+                     level: GraphLevel = GraphLevel.EQUIPMENT,
+                     open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool] = ignore_open) -> NetworkAdjacency:
+    """
+    Build the adjacency matrix of the topology of `network` in one pass over its equipment and connectivity nodes, without running a trace. The
+    matrix is built without SciPy, and can be converted to a SciPy sparse matrix with `NetworkAdjacency.to_scipy`.
+
+    `network` The network to export.
+    `level` The objects to use as the nodes of the graph.
+    `open_test` Function that takes a piece of equipment and a phase and returns whether it is open on that phase. Equipment that is open on every
+                phase doesn't join its terminals or connectivity nodes, and has no edges at the equipment level. Use `normally_open` or
+                `currently_open` to exclude open switches in the normal or current state of the network. Defaults to `ignore_open`, which includes
+                every connection.
+    Returns the `NetworkAdjacency` of `network`.
+    """
+    nodes, edges = _graph(network, level, open_test)
+    rows, cols = array("l"), array("l")
+    for i, j in edges:
+        rows.append(i)
+        cols.append(j)
+    rows, cols = rows + cols, cols + rows
+    return NetworkAdjacency(level, [it.mrid for it in nodes], rows, cols)
+
+
+def to_networkx(network: NetworkService,
+                level: GraphLevel = GraphLevel.EQUIPMENT,
+                open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool] = ignore_open,
+                attributes: Iterable[str] = ("name",)):
+    """
+    Build an undirected NetworkX graph of the topology of `network`, which requires NetworkX to be installed. The graph has the same nodes and
+    edges as the `adjacency_matrix` of `network`, with each node keyed by mRID.
+
+    `network` The network to export.
+    `level` The objects to use as the nodes of the graph.
+    `open_test` Function that takes a piece of equipment and a phase and returns whether it is open on that phase. See `adjacency_matrix`.
+    `attributes` The attributes of each object to copy to its node. Attributes an object doesn't have are left out. Every node also has a "type"
+                 attribute with the name of the class of its object.
+    Returns a `networkx.Graph`.
+    """
+    import networkx
+
+    attributes = list(attributes)
+    nodes, edges = _graph(network, level, open_test)
+    graph = networkx.Graph()
+
+    def node_attributes(node) -> Dict[str, object]:
+        values = {"type": type(node).__name__}
+        for attribute in attributes:
+            if hasattr(node, attribute):
+                values[attribute] = getattr(node, attribute)
+        return values
+
+    graph.add_nodes_from((node.mrid, node_attributes(node)) for node in nodes)
+    graph.add_edges_from((nodes[i].mrid, nodes[j].mrid) for i, j in edges)
+    return graph
@@ -0,0 +1,226 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from dataclassy import dataclass
+
+from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.cim.iec61970.base.wires.energy_consumer import EnergyConsumer
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind
+from zepben.evolve.model.cim.iec61970.base.wires.switch import Switch, Breaker, Recloser, Fuse, Disconnector
+from zepben.evolve.services.network.tracing.util import currently_open, is_closed, is_source
+
+__all__ = ["Isolation", "IsolationAnalysis"]
+
+
+@dataclass(slots=True)
+class Isolation(object):
+    """
+    The switches to open to isolate a piece of equipment from every source, and the customers that lose supply when they are opened.
+    """
+
+    equipment: Optional[ConductingEquipment] = None
+    """The equipment being isolated."""
+
+    isolatable: bool = True
+    """False if the equipment can't be isolated by opening switches, because there is a source between it and the nearest switches."""
+
+    switches: List[Switch] = []
+    """The switches to open, ordered by mRID."""
+
+    consumers_lost: List[EnergyConsumer] = []
+    """The energy consumers that are currently supplied but lose supply when `switches` are opened, ordered by mRID."""
+
+    customers_lost: int = 0
+    """The total `EnergyConsumer.customer_count` of `consumers_lost`."""
+
+
+class _Zones(object):
+    """
+    The network divided into zones of equipment connected without passing through an isolating switch, and the isolating switches between them.
+    """
+    __slots__ = ["zone_of", "sources", "edges", "consumers", "supplied"]
+
+    def __init__(self):
+        # The zone of each piece of equipment other than isolating switches, and of each connectivity node, keyed by id.
+        self.zone_of: Dict[int, int] = {}
+        self.sources: Set[int] = set()
+        # The closed isolating switches out of each zone, with the zone on their other side.
+        self.edges: List[List[Tuple[Switch, int]]] = []
+        self.consumers: List[List[EnergyConsumer]] = []
+        self.supplied: Set[int] = set()
+
+
+class IsolationAnalysis(object):
+    """
+    Finds the switches to open to isolate equipment for outage management, along with the customers lost, for one asset or every asset at once.
+
+    The network is divided into zones of equipment that are connected without passing through a closed isolating switch, which are by default
+    breakers, reclosers, fuses and disconnectors. Equipment is isolated by opening the isolating switches on the boundary of its zone that still have
+    a source behind them, which is the smallest set of switches that isolates the equipment while interrupting as few customers as possible. Open
+    switches and equipment that is out of service, as determined by the open test, already separate zones and never need to be opened.
+
+    Results are cached until the `NetworkService.state_version` of the network changes, which happens when switches are opened or closed and when
+    equipment is taken in or out of service. Call `invalidate` after connecting or disconnecting equipment, or if the open test depends on anything else.
+    """
+    __slots__ = ["network", "open_test", "isolating_types", "_version", "_zones", "_cache"]
+
+    def __init__(self,
+                 network: NetworkService,
+                 open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool] = currently_open,
+                 isolating_types: Tuple[Type[Switch], ...] = (Breaker, Recloser, Fuse, Disconnector)):
+        """
+        `network` The network to analyse.
+        `open_test` Function that takes a piece of equipment and a phase and returns whether it is open on that phase. Defaults to the current state.
+        `isolating_types` The types of switches that can be opened to isolate equipment.
+        """
+        self.network = network
+        self.open_test = open_test
+        self.isolating_types = isolating_types
+        # The state version of the network the zones were built from.
+        self._version = -1
+        self._zones: Optional[_Zones] = None
+        # The isolation of each zone, keyed by the zones being isolated and the switch being isolated, if any.
+        self._cache: Dict[Tuple[Tuple[int, ...], Optional[str]], Tuple[bool, List[Switch], List[EnergyConsumer]]] = {}
+
+    def invalidate(self):
+        """Discard the cached zones and results, so they are recalculated by the next query."""
+        self._zones = None
+
+    def isolate(self, ce: ConductingEquipment) -> Isolation:
+        """
+        Find the switches to open to isolate `ce` from every source.
+        `ce` The equipment to isolate. Isolating a switch opens the switches around the zones on both sides of it.
+        Returns the `Isolation` of `ce`.
+        """
+        return self._isolate_in(self._ensure(), ce)
+
+    def isolate_all(self, equipment: Optional[Iterable[ConductingEquipment]] = None) -> Dict[str, Isolation]:
+        """
+        Find the switches to open to isolate each piece of equipment. Equipment in the same zone shares its result, so a search of the zones is only
+        done once per zone rather than once per piece of equipment, with each search visiting up to every zone.
+        `equipment` The equipment to isolate. Defaults to all of the conducting equipment in the network.
+        Returns the `Isolation` of each piece of equipment, keyed by mRID.
+        """
+        zones = self._ensure()
+        if equipment is None:
+            equipment = self.network.objects(ConductingEquipment)
+        return {ce.mrid: self._isolate_in(zones, ce) for ce in equipment}
+
+    def _isolate_in(self, zones: _Zones, ce: ConductingEquipment) -> Isolation:
+        target, exclude = self._target_zones(zones, ce)
+        key = (target, exclude.mrid if exclude is not None else None)
+        result = self._cache.get(key)
+        if result is None:
+            result = self._cache[key] = self._isolate(zones, set(target), exclude)
+        isolatable, switches, consumers = result
+        return Isolation(ce, isolatable, list(switches), list(consumers), sum(ec.customer_count or 0 for ec in consumers))
+
+    def _ensure(self) -> _Zones:
+        version = self.network.state_version
+        if self._zones is None or version != self._version:
+            self._zones = self._build([ce for ce in self.network.objects(ConductingEquipment) if is_closed(ce, self.open_test)])
+            self._cache.clear()
+            self._version = version
+        return self._zones
+
+    def _is_isolating(self, ce: ConductingEquipment) -> bool:
+        return isinstance(ce, self.isolating_types)
+
+    def _build(self, equipment: List[ConductingEquipment]) -> _Zones:
+        zones = _Zones()
+        parent: Dict[int, int] = {}
+
+        def find(k: int) -> int:
+            root = k
+            while parent.setdefault(root, root) != root:
+                root = parent[root]
+            while parent[k] != root:
+                parent[k], k = root, parent[k]
+            return root
+
+        isolating = []
+        for ce in equipment:
+            if self._is_isolating(ce):
+                isolating.append(ce)
+                continue
+            find(id(ce))
+            for t in ce.terminals:
+                if t.connectivity_node is not None:
+                    parent[find(id(t.connectivity_node))] = find(id(ce))
+
+        # Number the zones, and give the connectivity nodes only connected to isolating switches zones of their own.
+        numbers: Dict[int, int] = {}
+
+        def zone_of(k: int) -> int:
+            root = find(k)
+            number = numbers.get(root)
+            if number is None:
+                number = numbers[root] = len(zones.edges)
+                zones.edges.append([])
+                zones.consumers.append([])
+            zones.zone_of[k] = number
+            return number
+
+        for ce in equipment:
+            if self._is_isolating(ce):
+                continue
+            zone = zone_of(id(ce))
+            if is_source(ce):
+                zones.sources.add(zone)
+            if isinstance(ce, EnergyConsumer):
+                zones.consumers[zone].append(ce)
+            for t in ce.terminals:
+                if t.connectivity_node is not None:
+                    zones.zone_of[id(t.connectivity_node)] = zone
+
+        for switch in isolating:
+            sides = [zone_of(id(t.connectivity_node)) for t in switch.terminals if t.connectivity_node is not None]
+            if len(sides) == 2 and sides[0] != sides[1]:
+                zones.edges[sides[0]].append((switch, sides[1]))
+                zones.edges[sides[1]].append((switch, sides[0]))
+
+        zones.supplied = self._reachable(zones, zones.sources, set(), set())
+        return zones
+
+    def _target_zones(self, zones: _Zones, ce: ConductingEquipment) -> Tuple[Tuple[int, ...], Optional[Switch]]:
+        if self._is_isolating(ce):
+            sides = {zones.zone_of[id(t.connectivity_node)] for t in ce.terminals if id(t.connectivity_node) in zones.zone_of}
+            return tuple(sorted(sides)), ce
+        zone = zones.zone_of.get(id(ce))
+        return ((zone,) if zone is not None else ()), None
+
+    @staticmethod
+    def _reachable(zones: _Zones, starts: Iterable[int], avoid: Set[int], opened: Set[str]) -> Set[int]:
+        reached = {zone for zone in starts if zone not in avoid}
+        queue = deque(reached)
+        while queue:
+            zone = queue.popleft()
+            for switch, other in zones.edges[zone]:
+                if other not in reached and other not in avoid and switch.mrid not in opened:
+                    reached.add(other)
+                    queue.append(other)
+        return reached
+
+    def _isolate(self, zones: _Zones, target: Set[int], exclude: Optional[Switch]) -> Tuple[bool, List[Switch], List[EnergyConsumer]]:
+        if target & zones.sources:
+            return False, [], []
+
+        # The boundary switches that need opening are the ones with a source behind them that doesn't pass through the zones being isolated.
+        fed_around = self._reachable(zones, zones.sources, target, set())
+        switches = {}
+        for zone in target:
+            for switch, other in zones.edges[zone]:
+                if switch is not exclude and other in fed_around:
+                    switches[switch.mrid] = switch
+
+        still_supplied = self._reachable(zones, zones.sources, set(), set(switches) | ({exclude.mrid} if exclude is not None else set()))
+        consumers = [ec for zone in zones.supplied - still_supplied for ec in zones.consumers[zone]]
+        return True, sorted(switches.values(), key=lambda it: it.mrid), sorted(consumers, key=lambda it: it.mrid)
@@ -0,0 +1,179 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dataclassy import dataclass
+
+from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.cim.iec61970.base.core.terminal import Terminal
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind
+from zepben.evolve.model.cim.iec61970.base.wires.switch import Switch, Breaker
+from zepben.evolve.model.cim.iec61970.infiec61970.feeder.circuit import Circuit
+from zepben.evolve.model.cim.iec61970.infiec61970.feeder.loop import Loop
+from zepben.evolve.services.network.tracing.util import normally_open, is_closed
+
+__all__ = ["NetworkLoop", "find_loops", "populate_loops"]
+
+
+@dataclass(slots=True)
+class NetworkLoop(object):
+    """
+    A loop in the topology of a network, found by `find_loops`.
+    """
+
+    equipment: List[ConductingEquipment] = []
+    """The equipment around the loop, in order, starting from the equipment of `closing_terminal`."""
+
+    switches: List[Switch] = []
+    """The switches around the loop, any of which can be opened to break it."""
+
+    closing_terminal: Optional[Terminal] = None
+    """The terminal that closes the loop, which is the connection that isn't part of the spanning tree the loop was found from."""
+
+    @property
+    def closing_switch(self) -> Optional[Switch]:
+        """The switch that closes the loop, or None if the loop contains no switches."""
+        ce = self.closing_terminal.conducting_equipment if self.closing_terminal is not None else None
+        return ce if isinstance(ce, Switch) else None
+
+
+def find_loops(network: NetworkService,
+               open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool] = normally_open) -> List[NetworkLoop]:
+    """
+    Find a cycle basis of the loops in the topology of `network`, which is a set of loops that every other loop can be made from. There is one loop
+    for each connection that closes a loop, so the number of loops is the number of connections that would need to be broken to make the network
+    radial.
+
+    The network is treated as a graph of equipment and connectivity nodes joined by terminals, and a spanning forest is built by union-find,
+    joining the terminals of switches last so that, wherever possible, the terminal that closes each loop belongs to a switch. Each terminal left
+    out of the forest closes one loop, which is found by walking the forest between its ends. Building the forest takes near-linear time in the
+    number of terminals, with each loop then taking time proportional to its length.
+
+    `network` The network to search.
+    `open_test` Function that takes a piece of equipment and a phase and returns whether it is open on that phase. Equipment that is open on every
+                phase breaks any loop through it. Use `normally_open` or `currently_open` for the loops of the normal or current state of the
+                network, or `ignore_open` for every loop in the topology.
+    Returns the loops found, ordered by the mRID of the terminal that closes them.
+    """
+    equipment = sorted((ce for ce in network.objects(ConductingEquipment) if is_closed(ce, open_test)), key=lambda it: it.mrid)
+    nodes: List[object] = list(equipment)
+    node_index: Dict[int, int] = {id(ce): i for i, ce in enumerate(equipment)}
+
+    def index_of(cn) -> int:
+        i = node_index.get(id(cn))
+        if i is None:
+            i = node_index[id(cn)] = len(nodes)
+            nodes.append(cn)
+        return i
+
+    # The connections between equipment and connectivity nodes, with the terminals of switches last.
+    edges: List[Tuple[int, int, Terminal]] = []
+    switch_edges: List[Tuple[int, int, Terminal]] = []
+    for i, ce in enumerate(equipment):
+        for t in ce.terminals:
+            if t.connectivity_node is not None:
+                (switch_edges if isinstance(ce, Switch) else edges).append((i, index_of(t.connectivity_node), t))
+    edges.extend(switch_edges)
+
+    parent = list(range(len(nodes)))
+    size = [1] * len(nodes)
+
+    def find(k: int) -> int:
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    adjacency: List[List[int]] = [[] for _ in nodes]
+    chords: List[Tuple[int, int, Terminal]] = []
+    for a, b, t in edges:
+        ra, rb = find(a), find(b)
+        if ra == rb:
+            chords.append((a, b, t))
+            continue
+        if size[ra] < size[rb]:
+            ra, rb = rb, ra
+        parent[rb] = ra
+        size[ra] += size[rb]
+        adjacency[a].append(b)
+        adjacency[b].append(a)
+
+    if not chords:
+        return []
+
+    # Root each tree of the forest so the path between the ends of each chord can be found by walking up from the deeper end.
+    tree_parent = [-1] * len(nodes)
+    depth = [-1] * len(nodes)
+    for root in range(len(nodes)):
+        if depth[root] >= 0:
+            continue
+        depth[root] = 0
+        queue = deque([root])
+        while queue:
+            k = queue.popleft()
+            for n in adjacency[k]:
+                if depth[n] < 0:
+                    depth[n] = depth[k] + 1
+                    tree_parent[n] = k
+                    queue.append(n)
+
+    loops = []
+    for a, b, t in sorted(chords, key=lambda it: it[2].mrid):
+        up_from_a, up_from_b = [a], [b]
+        while depth[up_from_a[-1]] > depth[up_from_b[-1]]:
+            up_from_a.append(tree_parent[up_from_a[-1]])
+        while depth[up_from_b[-1]] > depth[up_from_a[-1]]:
+            up_from_b.append(tree_parent[up_from_b[-1]])
+        while up_from_a[-1] != up_from_b[-1]:
+            up_from_a.append(tree_parent[up_from_a[-1]])
+            up_from_b.append(tree_parent[up_from_b[-1]])
+        cycle = up_from_a + up_from_b[-2::-1]
+
+        loop_equipment = [nodes[k] for k in cycle if k < len(equipment)]
+        loops.append(NetworkLoop(loop_equipment, [ce for ce in loop_equipment if isinstance(ce, Switch)], t))
+    return loops
+
+
+def populate_loops(network: NetworkService, loops: List[NetworkLoop], mrid_prefix: str = "loop") -> List[Loop]:
+    """
+    Create a `Loop` for each of `loops` and add it to `network`. Each `Loop` has a single `Circuit` containing the equipment around the loop, and is
+    associated with the substations containing any of that equipment. Substations containing one of the breakers on the loop are also the
+    substations that energise it.
+
+    `network` The network to add the loops to.
+    `loops` The loops to create, normally from `find_loops`.
+    `mrid_prefix` The prefix of the mRIDs of the loops, which are numbered from 1 in the order of `loops`. The circuit of each loop has the mRID of
+                  the loop with a suffix of "-circuit".
+    Returns the `Loop`s created.
+    Raises `ValueError` if the mRID of a loop or circuit is already in use in `network`.
+    """
+    created = []
+    for number, network_loop in enumerate(loops, start=1):
+        loop = Loop(mrid=f"{mrid_prefix}{number}")
+        circuit = Circuit(mrid=f"{loop.mrid}-circuit")
+        if not network.add(loop):
+            raise ValueError(f"Unable to add {loop} to the network as its mRID is already in use.")
+        if not network.add(circuit):
+            network.remove(loop)
+            raise ValueError(f"Unable to add {circuit} to the network as its mRID is already in use.")
+        circuit.loop = loop
+        loop.add_circuit(circuit)
+
+        for ce in network_loop.equipment:
+            circuit.add_equipment(ce)
+            ce.add_container(circuit)
+            for substation in ce.substations:
+                substation.add_loop(loop)
+                loop.add_substation(substation)
+                if isinstance(ce, Breaker):
+                    substation.add_energized_loop(loop)
+                    loop.add_energizing_substation(substation)
+        created.append(loop)
+    return created
@@ -0,0 +1,144 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import struct
+import sys
+from array import array
+from typing import List, Tuple
+
+from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.cim.iec61970.base.core.terminal import Terminal
+from zepben.evolve.model.cim.iec61970.base.wires.energy_source import EnergySource
+from zepben.evolve.model.cim.iec61970.base.wires.switch import Switch, Breaker
+
+__all__ = ["phase_fingerprint", "save_phases", "load_phases"]
+
+logger = logging.getLogger(__name__)
+
+_MAGIC = b"ZBPH"
+_FORMAT_VERSION = 1
+# Magic, format version, fingerprint, number of terminals and the length of the mRID block.
+_HEADER = struct.Struct("<4sH32sII")
+
+
+def _sorted_terminals(network: NetworkService) -> List[Terminal]:
+    return sorted(network.objects(Terminal), key=lambda t: t.mrid)
+
+
+def _fingerprint(network: NetworkService, terminals: List[Terminal]) -> bytes:
+    digest = hashlib.sha256()
+    for t in terminals:
+        ce = t.conducting_equipment
+        cn = t.connectivity_node
+        digest.update(f"T\x1f{t.mrid}\x1f{ce.mrid if ce else ''}\x1f{cn.mrid if cn else ''}\x1f{t.phases.name}\x1e".encode())
+
+    for ce in sorted(network.objects(ConductingEquipment), key=lambda e: e.mrid):
+        state = f"E\x1f{ce.mrid}\x1f{type(ce).__name__}\x1f{ce.normally_in_service:d}\x1f{ce.in_service:d}"
+        if isinstance(ce, Switch):
+            state += f"\x1f{ce.get_normal_state()}\x1f{ce.get_state()}"
+        if isinstance(ce, Breaker):
+            state += f"\x1f{ce.is_substation_breaker():d}"
+        if isinstance(ce, EnergySource):
+            state += "\x1f" + ",".join(phase.phase.short_name for phase in ce.phases)
+        digest.update(f"{state}\x1e".encode())
+    return digest.digest()
+
+
+def phase_fingerprint(network: NetworkService) -> bytes:
+    """
+    Calculate a fingerprint of everything phasing depends on, which is the terminals of `network` and how they are connected, the nominal phases of
+    each terminal, the in service and open states of the equipment, which breakers are feeder circuit breakers and the phases of the energy sources.
+    `network` The network to fingerprint.
+    Returns the SHA-256 digest of the phasing inputs.
+    """
+    return _fingerprint(network, _sorted_terminals(network))
+
+
+def save_phases(network: NetworkService, path: str):
+    """
+    Save the normal and current traced phases of every terminal in `network` to a compact binary file, along with the `phase_fingerprint` of the
+    network, so they can be loaded with `load_phases` instead of re-running phasing. The file holds the terminal mRIDs followed by the normal and
+    current statuses as arrays of little endian unsigned 32 bit ints.
+    `network` The network to save the phases of.
+    `path` The file to write. It is written to a temporary file first and then replaced, so an interrupted save never leaves a partial file.
+    """
+    terminals = _sorted_terminals(network)
+    mrids = b"\0".join(t.mrid.encode() for t in terminals)
+    normal = array("I", (t.traced_phases.normal_status for t in terminals))
+    current = array("I", (t.traced_phases.current_status for t in terminals))
+    if sys.byteorder != "little":
+        normal.byteswap()
+        current.byteswap()
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _FORMAT_VERSION, _fingerprint(network, terminals), len(terminals), len(mrids)))
+        f.write(mrids)
+        f.write(normal.tobytes())
+        f.write(current.tobytes())
+    os.replace(tmp_path, path)
+
+
+def _read(path: str) -> Tuple[bytes, List[str], array, array]:
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if len(data) < _HEADER.size:
+        raise ValueError("the file is too short to be a saved phases file")
+    magic, version, fingerprint, count, mrids_length = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("the file is not a saved phases file")
+    if version != _FORMAT_VERSION:
+        raise ValueError(f"unsupported format version {version}")
+
+    offset = _HEADER.size + mrids_length
+    if len(data) != offset + 8 * count:
+        raise ValueError(f"expected {offset + 8 * count} bytes for {count} terminals, got {len(data)}")
+    mrids = data[_HEADER.size:offset].decode().split("\0") if count else []
+    normal = array("I", data[offset:offset + 4 * count])
+    current = array("I", data[offset + 4 * count:])
+    if sys.byteorder != "little":
+        normal.byteswap()
+        current.byteswap()
+    return fingerprint, mrids, normal, current
+
+
+def load_phases(network: NetworkService, path: str) -> bool:
+    """
+    Load the traced phases of every terminal in `network` from a file written by `save_phases`. The phases are only loaded if the fingerprint in the
+    file matches the `phase_fingerprint` of `network`, so phases saved before the topology, nominal phases or switch states changed are refused.
+    `network` The network to load the phases into.
+    `path` The file to read.
+    Returns True if the phases were loaded, or False if the file doesn't exist, can't be read or was saved for a different network or state, in
+    which case `network` is unchanged and phasing needs to be run.
+    """
+    try:
+        fingerprint, mrids, normal, current = _read(path)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError) as ex:
+        logger.warning(f"Ignoring saved phases in {path}: {ex}")
+        return False
+
+    terminals = _sorted_terminals(network)
+    if fingerprint != _fingerprint(network, terminals) or mrids != [t.mrid for t in terminals]:
+        logger.info(f"Ignoring saved phases in {path} as they are for a different network or switch state.")
+        return False
+
+    store = network.phase_statuses
+    store_normal = array("I", store.normal)
+    store_current = array("I", store.current)
+    for terminal, normal_status, current_status in zip(terminals, normal, current):
+        slot = terminal.traced_phases.slot
+        store_normal[slot] = normal_status
+        store_current[slot] = current_status
+    store.load(store_normal.tobytes(), store_current.tobytes())
+    return True
@@ -22,6 +22,7 @@ def current_phases(terminal: Terminal, phase: SinglePhaseKind):
 
 
 class PhaseStatus(ABC):
+    __slots__ = []
 
     @abstractmethod
     def phase(self):
@@ -69,6 +70,7 @@ class PhaseStatus(ABC):
 
 
 class NormalPhases(PhaseStatus):
+    __slots__ = ["terminal", "nominal_phase"]
 
     def __init__(self, terminal: Terminal, nominal_phase: SinglePhaseKind):
         self.terminal = terminal
@@ -94,6 +96,7 @@ class NormalPhases(PhaseStatus):
 
 
 class CurrentPhases(PhaseStatus):
+    __slots__ = ["terminal", "nominal_phase"]
 
     def __init__(self, terminal: Terminal, nominal_phase: SinglePhaseKind):
         self.terminal = terminal
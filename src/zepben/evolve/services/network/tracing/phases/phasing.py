@@ -10,32 +10,48 @@
 
 from __future__ import annotations
 
+import asyncio
 import copy
+import itertools
 import logging
+import multiprocessing
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclassy import dataclass
 from enum import Enum
 
 
 from zepben.evolve.model.cim.iec61970.base.wires.energy_source import EnergySource
-from zepben.evolve.model.cim.iec61970.base.wires.switch import Breaker
-from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind
+from zepben.evolve.model.cim.iec61970.base.wires.switch import Breaker, Switch
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind, phases_from_mask
 from zepben.evolve.model.phasedirection import PhaseDirection
+from zepben.evolve.model.phases import PhaseStatusStore
 from zepben.evolve.exceptions import PhaseException
 from zepben.evolve.services.network.tracing.connectivity import get_connectivity
 from zepben.evolve.exceptions import TracingException
 from zepben.evolve.services.network.tracing.phases.phase_status import normal_phases, current_phases
+from zepben.evolve.services.network.tracing.trace_events import trace_events
 from zepben.evolve.services.network.tracing.traces import queue_next_terminal
 from zepben.evolve.services.network.tracing.traversals.queue import PriorityQueue
 from zepben.evolve.services.network.tracing.traversals.tracing import Traversal
-from zepben.evolve.services.network.tracing.phases.phase_status import PhaseStatus
+from zepben.evolve.services.network.tracing.phases.phase_status import PhaseStatus, CurrentPhases
 from zepben.evolve.services.network.tracing.traversals.branch_recursive_tracing import BranchRecursiveTraversal
+from zepben.evolve.services.network.tracing.traversals.tracker import Tracker
 from zepben.evolve.services.network.tracing.util import normally_open, currently_open
-from typing import Set, Callable, List, Iterable, Optional
+from typing import Set, Callable, List, Iterable, Optional, Awaitable, Dict, Tuple, FrozenSet
 
-__all__ = ["FeederProcessingStatus", "SetPhases", "FeederCbTerminalPhasesByStatus", "DelayedFeederTrace",
-           "set_phases_and_queue_next", "set_current_phases_and_queue_next", "set_normal_phases_and_queue_next"]
+__all__ = ["FeederProcessingStatus", "SetPhases", "FeederCbTerminalPhasesByStatus", "DelayedFeederTrace", "FeederCbStats", "PhaseConflict", "run_set_phasing",
+           "set_phases_and_queue_next", "set_current_phases_and_queue_next", "set_normal_phases_and_queue_next", "remove_phases_downstream",
+           "reflow_region"]
 
 logger = logging.getLogger("phasing.py")
+_events = trace_events("phasing")
+
+# The work for a forked phasing worker. Only ever set inside a worker, by `_init_worker` when it starts, from the `initargs` of the pool that forked
+# it, so each run's workers get their own work and inherit it rather than having it pickled.
+_worker_phasing = None
 
 
 class FeederProcessingStatus(Enum):
@@ -58,6 +74,145 @@ class DelayedFeederTrace:
     phases_to_flow: Set[SinglePhaseKind]
 
 
+@dataclass(slots=True)
+class PhaseConflict(object):
+    """
+    A phase that couldn't be applied to a terminal because a different phase had already been traced to the same nominal phase, found by
+    `SetPhases.run`, `SetPhases.run_switches` or `RemovePhases.run` when collecting conflicts. The conflicting phase is not applied, and tracing
+    continues with the phases that don't conflict.
+    """
+
+    terminal: str
+    """The mRID of the terminal the phase couldn't be applied to."""
+
+    equipment: Optional[str]
+    """The mRID of the conducting equipment of `terminal`, if it has any."""
+
+    nominal_phase: SinglePhaseKind
+    """The nominal phase of `terminal` the phase was being applied to."""
+
+    existing_phase: SinglePhaseKind
+    """The phase already traced to `nominal_phase`."""
+
+    attempted_phase: SinglePhaseKind
+    """The phase that couldn't be applied."""
+
+    from_terminal: str
+    """The mRID of the terminal the phase was flowing from, which is a terminal of the same equipment when flowing through it."""
+
+    from_equipment: Optional[str]
+    """The mRID of the conducting equipment of `from_terminal`, if it has any."""
+
+    current: bool
+    """True if the conflict is in the current phases, or False if it is in the normal phases."""
+
+    path: List[str] = []
+    """The mRIDs of the terminals the attempted phase was traced through, from the terminal it was fed out of, such as that of an energy source or
+    feeder circuit breaker, to `from_terminal`. Found by following the traced directions of the phase back from `from_terminal`, so around a loop it
+    is one of the paths the phase could have taken."""
+
+
+@dataclass(slots=True)
+class FeederCbStats(object):
+    """
+    Progress of the feeder circuit breaker worklist used by `run_set_phasing`. Each round processes the queued feeder circuit breakers, then traces
+    the feeders they flowed into. A breaker that phases didn't completely flow through is only queued again once one of its terminals has received
+    new phases, and processing stops when a round flows into no new feeders.
+    """
+
+    rounds: int = 0
+    """The number of rounds processed."""
+
+    breakers_processed: int = 0
+    """The number of times a feeder circuit breaker was processed, including being processed again after it was queued again."""
+
+    breakers_requeued: int = 0
+    """The number of times a feeder circuit breaker was queued again because one of its terminals received new phases."""
+
+    delayed_traces: int = 0
+    """The number of feeders traced from feeder circuit breakers."""
+
+    incomplete: List[str] = []
+    """The mRIDs of the feeder circuit breakers that phases never completely flowed through, e.g. because they are not energised on every phase."""
+
+
+class _ReflowTracker(Tracker):
+    """
+    A tracker for flowing phases back into a region that has had its phases removed. Terminals outside the region that were already feeding phases
+    out are treated as visited, so flow that loops back onto the energised network stops there as it would have during a full run.
+
+    The region and blocked terminals are held by id, as terminals all hash the same.
+    """
+    region: Set[int] = set()
+    phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus] = None
+    blocked: Set[int] = set()
+
+    def _is_energised_boundary(self, item):
+        return id(item) not in self.region and _has_direction(item, PhaseDirection.OUT, self.phase_selector)
+
+    def has_visited(self, item):
+        return item in self.visited or id(item) in self.blocked or self._is_energised_boundary(item)
+
+    def visit(self, item):
+        if id(item) in self.blocked or self._is_energised_boundary(item):
+            return False
+        return Tracker.visit(self, item)
+
+    def copy(self):
+        return _ReflowTracker(visited=self.visited.copy(), region=self.region, phase_selector=self.phase_selector, blocked=self.blocked)
+
+
+class _ReflowPhases(PhaseStatus):
+    """
+    The status of a phase on a terminal that phases are being flowed back into that can only be added to in the `allowed` direction. Terminals
+    outside the region being reflowed keep their phases, and blocked terminals can receive phases but not feed them out. Adding a phase in any other
+    direction changes nothing, but still raises a `PhaseException` if it crosses the existing phase.
+    """
+    __slots__ = ["status", "allowed"]
+
+    def __init__(self, status: PhaseStatus, allowed: PhaseDirection):
+        self.status = status
+        self.allowed = allowed
+
+    def phase(self):
+        return self.status.phase()
+
+    def direction(self):
+        return self.status.direction()
+
+    def set(self, phase: SinglePhaseKind, direction: PhaseDirection):
+        return False
+
+    def add(self, phase: SinglePhaseKind, direction: PhaseDirection):
+        if self.allowed.has(direction):
+            return self.status.add(phase, direction)
+        existing = self.status.phase()
+        if existing != SinglePhaseKind.NONE and phase != SinglePhaseKind.NONE and existing != phase:
+            raise PhaseException("Crossing phases")
+        return False
+
+    def remove(self, phase: SinglePhaseKind, direction: PhaseDirection = None):
+        return False
+
+
+def _reflow_phase_selector(region: Set[int], blocked: Set[int],
+                           phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]) -> Callable[[Terminal, SinglePhaseKind], PhaseStatus]:
+    # Only terminals in the region can be changed by the reflow, with blocked terminals only receiving phases. De-energised terminals, such as those
+    # beyond a switch that has closed, join the region when the flow first reaches them, while energised terminals outside it keep their phases.
+    def selector(terminal, phase):
+        status = phase_selector(terminal, phase)
+        key = id(terminal)
+        if key in blocked:
+            return _ReflowPhases(status, PhaseDirection.IN)
+        if key in region:
+            return status
+        if not any(phase_selector(terminal, it).direction() != PhaseDirection.NONE for it in terminal.phases.single_phases):
+            region.add(key)
+            return status
+        return _ReflowPhases(status, PhaseDirection.NONE)
+    return selector
+
+
 class SetPhases(object):
     def __init__(self):
         self.normal_traversal = BranchRecursiveTraversal(queue_next=set_normal_phases_and_queue_next,
@@ -66,26 +221,144 @@ class SetPhases(object):
         self.current_traversal = BranchRecursiveTraversal(queue_next=set_current_phases_and_queue_next,
                                                           process_queue=PriorityQueue(),
                                                           branch_queue=PriorityQueue())
-
-    async def run(self, network: NetworkService):
+        self.normal_feeder_cb_stats: Optional[FeederCbStats] = None
+        """The progress of the feeder circuit breakers from the last trace of the normal phases."""
+        self.current_feeder_cb_stats: Optional[FeederCbStats] = None
+        """The progress of the feeder circuit breakers from the last trace of the current phases."""
+        self.conflicts: List[PhaseConflict] = []
+        """The phase conflicts found by the last `run` or `run_switches` that collected conflicts."""
+
+    async def run(self, network: NetworkService, parallel: bool = False, per_feeder: bool = False, max_workers: Optional[int] = None,
+                  collect_conflicts: bool = False) -> List[PhaseConflict]:
+        """
+        Apply phases from the energy sources of `network` and trace them through it.
+        `network` The network to phase.
+        `parallel` Whether to trace the normal and current phases in parallel worker processes. See `run_complete_parallel`.
+        `per_feeder` Whether to trace independent feeders in parallel worker processes. See `run_complete_per_feeder`. Takes precedence over `parallel`.
+        `max_workers` The maximum number of worker processes to use when `per_feeder` is set. Defaults to the number of CPUs.
+        `collect_conflicts` Whether to record each phase that conflicts with a phase already traced to a terminal and carry on tracing, rather than
+                            raising a `PhaseException` on the first conflict, so every conflict in the network is found by a single run.
+        Returns the conflicts found, which are also kept in `conflicts`. Always empty unless `collect_conflicts` is set.
+        Raises `PhaseException` on the first conflict if `collect_conflicts` isn't set.
+        """
         # terminals = await _apply_phases_from_feeder_cbs(network)
         await _apply_phases_from_sources(network)
         terminals = [term for es in network.objects(EnergySource) if es.num_phases() > 0 for term in es.terminals]
         if not terminals:
             raise TracingException("No feeder sources were found, tracing cannot be performed.")
         breakers = network.objects(Breaker)
-        await self.run_complete(terminals, breakers)
 
-    async def run_complete(self, terminals: Iterable[Terminal], breakers: Iterable[Breaker]):
+        # Each run collects into its own list, which is passed down to wherever phases are applied, so concurrent runs can't mix their conflicts.
+        conflicts = [] if collect_conflicts else None
+        self.conflicts = conflicts if conflicts is not None else []
+        if per_feeder:
+            await self.run_complete_per_feeder(network, terminals, breakers, max_workers, conflicts)
+        elif parallel:
+            await self.run_complete_parallel(network, terminals, breakers, conflicts)
+        else:
+            await self.run_complete(terminals, breakers, conflicts)
+        return self.conflicts
+
+    async def run_complete(self, terminals: Iterable[Terminal], breakers: Iterable[Breaker], conflicts: Optional[List[PhaseConflict]] = None):
+        """
+        Trace the normal and then the current phases from `terminals` in this process.
+        `terminals` The terminals to trace from.
+        `breakers` The breakers in the network, used to find the feeder circuit breakers.
+        `conflicts` The list to record phase conflicts in, or None to raise a `PhaseException` on the first conflict.
+        """
         feeder_cbs = [br for br in breakers if br.is_substation_breaker()]
-        await self._run_normal(terminals, feeder_cbs)
-        await self._run_current(terminals, feeder_cbs)
+        await self._run_normal(terminals, feeder_cbs, conflicts)
+        await self._run_current(terminals, feeder_cbs, conflicts)
+
+    async def run_complete_parallel(self, network: NetworkService, terminals: Iterable[Terminal], breakers: Iterable[Breaker],
+                                    conflicts: Optional[List[PhaseConflict]] = None):
+        """
+        Trace the normal and current phases at the same time in two forked worker processes, then merge the statuses they traced back into
+        `network.phase_statuses`. The normal and current phases read different switch states and write different statuses, so the runs are
+        independent. The workers inherit the parent's copy of the network rather than having it pickled, and only send back the status array of the
+        state they traced.
+
+        Falls back to `run_complete` when the platform can't fork worker processes, the workers fail to start, or terminals connected to `terminals`
+        aren't bound to `network.phase_statuses`, as only the statuses in the store are sent back.
+        `network` The network being phased.
+        `terminals` The terminals to trace from.
+        `breakers` The breakers in the network, used to find the feeder circuit breakers.
+        `conflicts` The list to record phase conflicts in, or None to raise a `PhaseException` on the first conflict.
+        """
+        store = network.phase_statuses
+        terminals = list(terminals)
+        context = _fork_context()
+        if context is None or not _all_bound(terminals, store):
+            await self.run_complete(terminals, breakers, conflicts)
+            return
 
-    async def _run_normal(self, terminals, feeder_cbs):
-        await run_set_phasing(terminals, feeder_cbs, self.normal_traversal, normally_open, normal_phases)
+        work = (terminals, [br for br in breakers if br.is_substation_breaker()], store, conflicts is not None)
+        try:
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(max_workers=2, mp_context=context, initializer=_init_worker, initargs=(work,)) as executor:
+                (normal, self.normal_feeder_cb_stats, normal_conflicts), (current, self.current_feeder_cb_stats, current_conflicts) = \
+                    await asyncio.gather(loop.run_in_executor(executor, _phase_in_worker, False), loop.run_in_executor(executor, _phase_in_worker, True))
+        except (BrokenProcessPool, OSError) as ex:
+            logger.warning(f"Phasing workers failed to run, phasing serially instead: {ex}")
+            await self.run_complete(terminals, breakers, conflicts)
+            return
 
-    async def _run_current(self, terminals, feeder_cbs):
-        await run_set_phasing(terminals, feeder_cbs, self.current_traversal, currently_open, current_phases)
+        store.load(normal, current)
+        if conflicts is not None:
+            conflicts.extend(normal_conflicts)
+            conflicts.extend(current_conflicts)
+
+    async def run_complete_per_feeder(self, network: NetworkService, terminals: Iterable[Terminal], breakers: Iterable[Breaker],
+                                      max_workers: Optional[int] = None, conflicts: Optional[List[PhaseConflict]] = None):
+        """
+        Trace phases with the feeders supplied by the feeder circuit breakers spread over a pool of forked worker processes. Flow from the sources to
+        the feeder circuit breakers, and through the breakers, is traced in this process as it is for `run_complete`. Each round of feeder traces is
+        then grouped by the part of the network reachable from each breaker without passing through another feeder circuit breaker or a fully open
+        switch. Groups can't affect each other, so they are traced by the workers and their statuses combined, giving the same result as
+        `run_complete`. Feeders joined by closed switches are traced together in the order `run_complete` traces them.
+
+        The workers are forked once for the whole run, and each round only sends them the statuses of the terminals in the groups they trace, and only
+        gets back the statuses of those terminals.
+
+        Falls back to tracing in this process when the platform can't fork worker processes, there is only one group to trace, or a group contains
+        terminals that aren't bound to `network.phase_statuses`.
+        `network` The network being phased.
+        `terminals` The terminals to trace from.
+        `breakers` The breakers in the network, used to find the feeder circuit breakers.
+        `max_workers` The maximum number of worker processes. Defaults to the number of CPUs.
+        `conflicts` The list to record phase conflicts in, or None to raise a `PhaseException` on the first conflict.
+        """
+        store = network.phase_statuses
+        feeder_cbs = [br for br in breakers if br.is_substation_breaker()]
+        terminals = list(terminals)
+        workers = max_workers or os.cpu_count() or 1
+        context = _fork_context()
+        # The pool doesn't fork its workers until the first round that has more than one group to trace.
+        executor = None
+        if context is not None and workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker, initargs=(store,))
+        try:
+            for traversal, open_test, phase_selector, current in ((self.normal_traversal, normally_open, normal_phases, False),
+                                                                  (self.current_traversal, currently_open, current_phases, True)):
+                async def run_delayed_traces(traces, traversal=traversal, open_test=open_test, phase_selector=phase_selector, current=current):
+                    await _run_traces_per_feeder(traces, traversal, open_test, phase_selector, store, current, executor, workers, conflicts)
+
+                stats = await run_set_phasing(terminals, feeder_cbs, traversal, open_test, phase_selector, run_delayed_traces, conflicts)
+                if current:
+                    self.current_feeder_cb_stats = stats
+                else:
+                    self.normal_feeder_cb_stats = stats
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    async def _run_normal(self, terminals, feeder_cbs, conflicts=None):
+        self.normal_feeder_cb_stats = await run_set_phasing(terminals, feeder_cbs, self.normal_traversal, normally_open, normal_phases,
+                                                            conflicts=conflicts)
+
+    async def _run_current(self, terminals, feeder_cbs, conflicts=None):
+        self.current_feeder_cb_stats = await run_set_phasing(terminals, feeder_cbs, self.current_traversal, currently_open, current_phases,
+                                                             conflicts=conflicts)
 
     async def run_ce(self, ce: ConductingEquipment, breakers: Iterable[Breaker]):
         if ce.num_terminals() == 0:
@@ -104,6 +377,207 @@ class SetPhases(object):
 
         await self.run_complete(ce.terminals, breakers)
 
+    async def run_switches(self, switches: Iterable[Switch], normal: bool = True, current: bool = True,
+                           collect_conflicts: bool = False) -> List[PhaseConflict]:
+        """
+        Incrementally re-phase the network after the open state of `switches` has changed, rather than re-running phasing over the whole network.
+        Phases are removed from the region downstream of each switch, then flowed back in from the energised terminals on the boundary of that region,
+        so the work done is proportional to the size of the affected region rather than the network. Switches that open or close a loop re-phase
+        everything fed from the same sources or feeder circuit breakers, as the directions around a loop depend on the order it was traced in.
+
+        `switches` The switches whose open state has changed.
+        `normal` Whether to re-phase the normal state of the network.
+        `current` Whether to re-phase the current state of the network.
+        `collect_conflicts` Whether to record each phase conflict found while re-phasing and carry on, as for `run`.
+        Returns the conflicts found in the re-phased region, which are also kept in `conflicts`. Always empty unless `collect_conflicts` is set.
+        Raises `PhaseException` on the first conflict if `collect_conflicts` isn't set.
+        """
+        switches = list(switches)
+        conflicts = [] if collect_conflicts else None
+        self.conflicts = conflicts if conflicts is not None else []
+        if normal:
+            await _run_switch_phasing(switches, set_normal_phases_and_queue_next, normally_open, normal_phases, conflicts)
+        if current:
+            await _run_switch_phasing(switches, set_current_phases_and_queue_next, currently_open, current_phases, conflicts)
+        return self.conflicts
+
+
+def _fork_context():
+    # Workers must be forked to share the network with the parent, which isn't possible on every platform.
+    if "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context("fork")
+
+
+def _all_bound(terminals: List[Terminal], store: PhaseStatusStore) -> bool:
+    # Check everything connected to the terminals regardless of switch states, which covers everything that phasing could reach.
+    seen = {id(t) for t in terminals}
+    stack = list(terminals)
+    while stack:
+        terminal = stack.pop()
+        if terminal.traced_phases.store is not store:
+            return False
+        neighbours = list(terminal.connectivity_node.terminals) if terminal.connectivity_node is not None else []
+        if terminal.conducting_equipment is not None:
+            neighbours.extend(terminal.conducting_equipment.terminals)
+        for neighbour in neighbours:
+            if id(neighbour) not in seen:
+                seen.add(id(neighbour))
+                stack.append(neighbour)
+    return True
+
+
+def _init_worker(work):
+    global _worker_phasing
+    _worker_phasing = work
+
+
+def _phase_in_worker(current: bool) -> Tuple[bytes, FeederCbStats, List[PhaseConflict]]:
+    terminals, feeder_cbs, store, collect_conflicts = _worker_phasing
+    conflicts = [] if collect_conflicts else None
+    if current:
+        traversal = BranchRecursiveTraversal(queue_next=set_current_phases_and_queue_next, process_queue=PriorityQueue(), branch_queue=PriorityQueue())
+        stats = asyncio.run(run_set_phasing(terminals, feeder_cbs, traversal, currently_open, current_phases, conflicts=conflicts))
+        statuses = store.current
+    else:
+        traversal = BranchRecursiveTraversal(queue_next=set_normal_phases_and_queue_next, process_queue=PriorityQueue(), branch_queue=PriorityQueue())
+        stats = asyncio.run(run_set_phasing(terminals, feeder_cbs, traversal, normally_open, normal_phases, conflicts=conflicts))
+        statuses = store.normal
+    return statuses.tobytes(), stats, conflicts or []
+
+
+async def _run_traces_per_feeder(traces: List[DelayedFeederTrace],
+                                 traversal: BranchRecursiveTraversal,
+                                 open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
+                                 phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                                 store: PhaseStatusStore,
+                                 current: bool,
+                                 executor: Optional[ProcessPoolExecutor],
+                                 max_workers: int,
+                                 conflicts: Optional[List[PhaseConflict]] = None):
+    groups = _group_feeder_traces(traces, open_test)
+    workers = min(max_workers, len(groups))
+    # The workers find terminals by their slot in the store they were forked with, so every terminal they trace must be bound to it.
+    if executor is None or workers < 2 or any(t.traced_phases.store is not store for _, group_terminals in groups for t in group_terminals):
+        await _run_traces_serially(traces, traversal, phase_selector, conflicts)
+        return
+
+    statuses = store.current if current else store.normal
+    tasks = []
+    for bin_traces, bin_terminals in _balance_feeder_groups(groups, workers):
+        slots = array("I", (t.traced_phases.slot for t in bin_terminals))
+        starts = [(trace.out_terminal.traced_phases.slot, trace.phases_to_flow) for trace in bin_traces]
+        tasks.append((slots, array("I", (statuses[slot] for slot in slots)), starts))
+
+    try:
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(*(loop.run_in_executor(executor, _phase_feeders_in_worker, current, open_test, phase_selector, slots, values,
+                                                              starts, conflicts is not None)
+                                         for slots, values, starts in tasks))
+    except (BrokenProcessPool, OSError) as ex:
+        logger.warning(f"Phasing workers failed to run, phasing serially instead: {ex}")
+        await _run_traces_serially(traces, traversal, phase_selector, conflicts)
+        return
+
+    # Phasing only ever adds to a status, and the groups are disjoint, so the statuses traced by each worker can be combined with a bitwise or of
+    # the slots in its groups.
+    for (slots, _, _), (values, worker_conflicts) in zip(tasks, results):
+        for slot, value in zip(slots, values):
+            statuses[slot] |= value
+        if conflicts is not None:
+            conflicts.extend(worker_conflicts)
+
+
+async def _run_traces_serially(traces: List[DelayedFeederTrace],
+                               traversal: BranchRecursiveTraversal,
+                               phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                               conflicts: Optional[List[PhaseConflict]]):
+    for trace in traces:
+        await _run_from_out_terminal(traversal, trace.out_terminal, trace.phases_to_flow, phase_selector, conflicts)
+
+
+def _phase_feeders_in_worker(current: bool,
+                             open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
+                             phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                             slots: array,
+                             values: array,
+                             starts: List[Tuple[int, Set[SinglePhaseKind]]],
+                             collect_conflicts: bool) -> Tuple[array, List[PhaseConflict]]:
+    # The store was forked at the start of the run, so only the slots of the groups being traced are brought up to date with this round.
+    store = _worker_phasing
+    statuses = store.current if current else store.normal
+    for slot, value in zip(slots, values):
+        statuses[slot] = value
+
+    conflicts = [] if collect_conflicts else None
+    traversal = BranchRecursiveTraversal(queue_next=_phases_queue_next(open_test, phase_selector, conflicts),
+                                         process_queue=PriorityQueue(),
+                                         branch_queue=PriorityQueue())
+
+    async def run():
+        for slot, phases_to_flow in starts:
+            await _run_from_out_terminal(traversal, store.owner(slot), phases_to_flow, phase_selector, conflicts)
+
+    asyncio.run(run())
+    return array("I", (statuses[slot] for slot in slots)), conflicts or []
+
+
+def _group_feeder_traces(traces: List[DelayedFeederTrace],
+                         open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool]) -> List[Tuple[List[DelayedFeederTrace], List[Terminal]]]:
+    """
+    Group `traces` by the part of the network reachable from their out terminal without passing through a feeder circuit breaker or fully open
+    equipment, which bounds what each trace can change. Traces keep their relative order within a group, and groups are ordered by their first trace.
+    Returns the traces of each group, paired with the terminals in its part of the network.
+    """
+    # Keyed by id, as terminals all hash the same.
+    labels: Dict[int, int] = {}
+    groups = []
+    for trace in traces:
+        label = labels.get(id(trace.out_terminal))
+        if label is None:
+            label = len(groups)
+            groups.append(([], _label_feeder_terminals(trace.out_terminal, label, labels, open_test)))
+        groups[label][0].append(trace)
+    return groups
+
+
+def _label_feeder_terminals(start: Terminal, label: int, labels: Dict[int, int],
+                            open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool]) -> List[Terminal]:
+    terminals = []
+    stack = [start]
+    labels[id(start)] = label
+    while stack:
+        terminal = stack.pop()
+        terminals.append(terminal)
+        neighbours = list(terminal.connectivity_node.terminals) if terminal.connectivity_node is not None else []
+        ce = terminal.conducting_equipment
+        if ce is not None and not (isinstance(ce, Breaker) and ce.is_substation_breaker()) and not _is_fully_open(ce, open_test):
+            neighbours.extend(ce.terminals)
+        for neighbour in neighbours:
+            if id(neighbour) not in labels:
+                labels[id(neighbour)] = label
+                stack.append(neighbour)
+    return terminals
+
+
+def _is_fully_open(ce: ConductingEquipment, open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool]) -> bool:
+    phases = {phase for terminal in ce.terminals for phase in terminal.phases.single_phases}
+    if not phases:
+        return open_test(ce, None)
+    return all(open_test(ce, phase) for phase in phases)
+
+
+def _balance_feeder_groups(groups: List[Tuple[List[DelayedFeederTrace], List[Terminal]]],
+                           workers: int) -> List[Tuple[List[DelayedFeederTrace], List[Terminal]]]:
+    # Assign the largest groups first, each to the least loaded worker, keeping the original trace order within each worker.
+    bins = [[] for _ in range(workers)]
+    loads = [0] * workers
+    for index in sorted(range(len(groups)), key=lambda i: (-len(groups[i][1]), i)):
+        target = loads.index(min(loads))
+        bins[target].append(index)
+        loads[target] += len(groups[index][1])
+    return [([trace for index in sorted(indexes) for trace in groups[index][0]], [t for index in indexes for t in groups[index][1]]) for indexes in bins]
+
 
 async def find_es_breaker_terminal(es):
     """
@@ -157,7 +631,8 @@ async def _apply_phases_from_feeder_cbs(network):
                 for phase in terminal.phases.single_phases:
                     normal_phases(terminal, phase).add(esp[phase].phase, PhaseDirection.OUT)
                     current_phases(terminal, phase).add(esp[phase].phase, PhaseDirection.OUT)
-                logger.debug(f"Set {terminal.conducting_equipment.mrid} as Feeder Circuit Breaker with phases {terminal.phases.phase}")
+                if _events.enabled:
+                    _events.emit("feeder_cb", equipment=terminal.conducting_equipment.mrid, phases=terminal.phases)
             start_terms.extend(breaker_terms)
     return start_terms
 
@@ -206,101 +681,380 @@ def set_current_phases_and_queue_next(terminal, traversal, visited):
 def set_phases_and_queue_next(current: Terminal,
                               traversal: BranchRecursiveTraversal,
                               open_test: Callable[[ConductingEquipment, SinglePhaseKind], bool],
-                              phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]):
+                              phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                              conflicts: Optional[List[PhaseConflict]] = None):
     phases_to_flow = _get_phases_to_flow(current, open_test, phase_selector)
 
     if current.conducting_equipment:
         for out_terminal in current.conducting_equipment.terminals:
-            if out_terminal != current and _flow_through_equipment(traversal, current, out_terminal, phases_to_flow, phase_selector):
-                _flow_out_to_connected_terminals_and_queue(traversal, out_terminal, phases_to_flow, phase_selector)
+            if out_terminal != current and _flow_through_equipment(traversal, current, out_terminal, phases_to_flow, phase_selector, conflicts):
+                _flow_out_to_connected_terminals_and_queue(traversal, out_terminal, phases_to_flow, phase_selector, conflicts)
+
+
+def _phases_queue_next(open_test: Callable[[ConductingEquipment, SinglePhaseKind], bool],
+                       phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                       conflicts: Optional[List[PhaseConflict]]) -> Callable[[Terminal, BranchRecursiveTraversal, Set[Terminal]], None]:
+    # A queue next function for a traversal that sets phases, recording conflicts in `conflicts`.
+    def queue_next(terminal, traversal, visited):
+        set_phases_and_queue_next(terminal, traversal, open_test, phase_selector, conflicts)
+    return queue_next
 
 
 async def run_set_phasing(start_terminals: List[Terminal],
                           process_feeder_cbs: List[Breaker],
                           traversal: BranchRecursiveTraversal,
                           open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
-                          phase_selector: Callable[[Terminal, Optional[SinglePhaseKind]], PhaseStatus]):
+                          phase_selector: Callable[[Terminal, Optional[SinglePhaseKind]], PhaseStatus],
+                          run_delayed_traces: Optional[Callable[[List[DelayedFeederTrace]], Awaitable[None]]] = None,
+                          conflicts: Optional[List[PhaseConflict]] = None) -> FeederCbStats:
+    """
+    Trace phases out from `start_terminals`, then through `process_feeder_cbs` into the feeders they supply.
+
+    The feeder circuit breakers are processed from a worklist. A breaker that phases didn't completely flow through waits until one of its terminals
+    receives new phases from tracing other feeders before it is processed again, and processing stops once nothing new flows into a feeder.
+    `run_delayed_traces` Optional coroutine function used to trace each round of feeders from their circuit breakers. Defaults to tracing them one at a
+    time with `traversal`.
+    `conflicts` The list to record phase conflicts in, or None to raise a `PhaseException` on the first conflict. When set, `traversal` queues with
+                `set_phases_and_queue_next` for the duration of the run so conflicts found while tracing are recorded too.
+    Returns the `FeederCbStats` for the feeder circuit breakers.
+    """
+    queue_next = traversal.queue_next
+    if conflicts is not None:
+        traversal.queue_next = _phases_queue_next(open_test, phase_selector, conflicts)
+    try:
+        return await _run_set_phasing(start_terminals, process_feeder_cbs, traversal, open_test, phase_selector, run_delayed_traces, conflicts)
+    finally:
+        traversal.queue_next = queue_next
+        _mark_changed(itertools.chain(start_terminals, (t for cb in process_feeder_cbs for t in cb.terminals)))
+
+
+async def _run_set_phasing(start_terminals: List[Terminal],
+                           process_feeder_cbs: List[Breaker],
+                           traversal: BranchRecursiveTraversal,
+                           open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
+                           phase_selector: Callable[[Terminal, Optional[SinglePhaseKind]], PhaseStatus],
+                           run_delayed_traces: Optional[Callable[[List[DelayedFeederTrace]], Awaitable[None]]],
+                           conflicts: Optional[List[PhaseConflict]]) -> FeederCbStats:
     for terminal in start_terminals:
-        await _run_terminal(terminal, traversal, phase_selector)
+        await _run_terminal(terminal, traversal, phase_selector, conflicts)
 
-    # We take a copy of the feeder CB's as we will modify the list while processing them.
-    process_feeder_cbs = copy.copy(process_feeder_cbs)
-    keep_processing = True
-    while keep_processing:
+    stats = FeederCbStats()
+    worklist = list(process_feeder_cbs)
+    waiting = []
+    while worklist:
+        stats.rounds += 1
         delayed_feeder_traces = []
-        for feeder_cb in process_feeder_cbs:
-            status = _run_feeder_breaker(feeder_cb, traversal, open_test, phase_selector, delayed_feeder_traces)
-            if status == FeederProcessingStatus.COMPLETE:
-                process_feeder_cbs.remove(feeder_cb)
+        for feeder_cb in worklist:
+            stats.breakers_processed += 1
+            status = _run_feeder_breaker(feeder_cb, traversal, open_test, phase_selector, delayed_feeder_traces, conflicts)
+            if status != FeederProcessingStatus.COMPLETE:
+                waiting.append((feeder_cb, _feeder_cb_phases(feeder_cb, phase_selector)))
+        worklist = []
+
+        if not delayed_feeder_traces:
+            break
+        stats.delayed_traces += len(delayed_feeder_traces)
+        if run_delayed_traces is None:
+            for trace in delayed_feeder_traces:
+                await _run_from_out_terminal(traversal, trace.out_terminal, trace.phases_to_flow, phase_selector, conflicts)
+        else:
+            await run_delayed_traces(delayed_feeder_traces)
+
+        # Only process waiting breakers again if tracing the feeders changed the phases on one of their terminals.
+        still_waiting = []
+        for feeder_cb, phases in waiting:
+            if _feeder_cb_phases(feeder_cb, phase_selector) != phases:
+                worklist.append(feeder_cb)
+            else:
+                still_waiting.append((feeder_cb, phases))
+        stats.breakers_requeued += len(worklist)
+        waiting = still_waiting
+
+        if _events.enabled:
+            _events.emit("feeder_cb_round", round=stats.rounds, traces=len(delayed_feeder_traces), requeued=[cb.mrid for cb in worklist])
+
+    stats.incomplete = [feeder_cb.mrid for feeder_cb, _ in waiting]
+    return stats
+
+
+def _feeder_cb_phases(feeder_cb: Breaker, phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]) -> Tuple:
+    return tuple((status.phase(), status.direction())
+                 for terminal in feeder_cb.terminals
+                 for status in (phase_selector(terminal, phase) for phase in terminal.phases.single_phases))
+
+
+async def _run_switch_phasing(switches: List[Switch],
+                              queue_next: Callable[[Terminal, BranchRecursiveTraversal, Set[Terminal]], None],
+                              open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
+                              phase_selector: Callable[[Terminal, Optional[SinglePhaseKind]], PhaseStatus],
+                              conflicts: Optional[List[PhaseConflict]] = None):
+    switch_terminals = [t for sw in switches for t in sw.terminals]
+    if any(_affects_loop(sw, phase_selector) for sw in switches):
+        # The directions around a loop depend on the order it was traced in, so re-phase everything fed from the same heads as a full run would.
+        heads = _find_feed_heads(switch_terminals, phase_selector)
+        region = remove_phases_downstream(heads, phase_selector, keep=heads)
+        if _events.enabled:
+            _events.emit("removed_downstream", switches=[sw.mrid for sw in switches], terminals=len(region), heads=[t.mrid for t in heads])
+
+        traversal = BranchRecursiveTraversal(queue_next=queue_next, process_queue=PriorityQueue(), branch_queue=PriorityQueue())
+        await run_set_phasing(heads, [], traversal, open_test, phase_selector, conflicts=conflicts)
+        return
 
-        for trace in delayed_feeder_traces:
-            await _run_from_out_terminal(traversal, trace.out_terminal, trace.phases_to_flow, phase_selector)
-        keep_processing = len(delayed_feeder_traces) > 0
+    region = remove_phases_downstream(switch_terminals, phase_selector)
+    if _events.enabled:
+        _events.emit("removed_downstream", switches=[sw.mrid for sw in switches], terminals=len(region))
 
+    # Include the switches themselves in case they have closed.
+    region_ids = {id(t) for t in region}
+    in_terminals = [t for t in switch_terminals if id(t) not in region_ids and _has_direction(t, PhaseDirection.IN, phase_selector)]
+    await reflow_region(region, in_terminals, open_test, phase_selector, conflicts=conflicts)
 
-async def _run_terminal(start: Terminal, traversal: BranchRecursiveTraversal, phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]):
+
+async def reflow_region(region: Iterable[Terminal],
+                        in_terminals: List[Terminal],
+                        open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
+                        phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                        blocked: Iterable[Terminal] = (),
+                        conflicts: Optional[List[PhaseConflict]] = None):
+    """
+    Flow phases back into a `region` that has had its phases removed from every energised terminal next to it, stopping where the flow reaches
+    terminals that are still energised. Used with `remove_phases_downstream` to re-phase part of a network without re-running phasing over all of it.
+    Only the phases of terminals in `region`, and of de-energised terminals the flow reaches, are changed.
+    `region` The terminals that had their phases removed, normally as returned by `remove_phases_downstream`.
+    `in_terminals` Extra terminals with incoming phases to flow through their equipment into the region.
+    `open_test` Function that takes a piece of equipment and a phase and returns whether it is open on that phase, matching `phase_selector`.
+    `phase_selector` The phases to reflow, either `normal_phases` or `current_phases`.
+    `blocked` Terminals in the region that phases can flow to, but not on from.
+    `conflicts` The list to record phase conflicts in, or None to raise a `PhaseException` on the first conflict.
+    """
+    region = list(region)
+    region_ids = {id(t) for t in region}
+    blocked_ids = {id(t) for t in blocked}
+    in_terminals = list(in_terminals)
+    start_terminals = []
+    for terminal in region:
+        for other in terminal.conducting_equipment.terminals if terminal.conducting_equipment else ():
+            if other is not terminal and id(other) not in region_ids and _has_direction(other, PhaseDirection.IN, phase_selector):
+                in_terminals.append(other)
+        for cr in get_connectivity(terminal):
+            if id(cr.to_terminal) not in region_ids and _has_direction(cr.to_terminal, PhaseDirection.OUT, phase_selector):
+                start_terminals.append(cr.to_terminal)
+
+    reflow_phases = _reflow_phase_selector(region_ids, blocked_ids, phase_selector)
+    traversal = BranchRecursiveTraversal(queue_next=_phases_queue_next(open_test, reflow_phases, conflicts),
+                                         process_queue=PriorityQueue(),
+                                         branch_queue=PriorityQueue(),
+                                         tracker=_ReflowTracker(region=region_ids, phase_selector=phase_selector, blocked=blocked_ids))
+
+    feeder_cbs = []
+    for in_terminal in in_terminals:
+        ce = in_terminal.conducting_equipment
+        if isinstance(ce, Breaker) and ce.is_substation_breaker():
+            if all(cb is not ce for cb in feeder_cbs) and not any(id(t) in blocked_ids for t in ce.terminals):
+                feeder_cbs.append(ce)
+            continue
+
+        phases_to_flow = _get_phases_to_flow(in_terminal, open_test, phase_selector)
+        for out_terminal in ce.terminals:
+            if out_terminal is not in_terminal and _flow_through_equipment(traversal, in_terminal, out_terminal, phases_to_flow, reflow_phases,
+                                                                                   conflicts):
+                start_terminals.append(out_terminal)
+
+    await run_set_phasing(start_terminals, feeder_cbs, traversal, open_test, reflow_phases, conflicts=conflicts)
+
+
+def _affects_loop(switch: Switch, phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]) -> bool:
+    """
+    Check if changing the state of `switch` opens or closes a loop, which is the case when it is already part of a loop (it is fed from both sides),
+    or when it is fed from every side.
+    """
+    terminals = list(switch.terminals)
+    if any(phase_selector(t, phase).direction() == PhaseDirection.BOTH for t in terminals for phase in t.phases.single_phases):
+        return True
+    return len(terminals) > 1 and all(_has_direction(t, PhaseDirection.IN, phase_selector) for t in terminals)
+
+
+def _find_feed_heads(terminals: Iterable[Terminal], phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]) -> List[Terminal]:
+    """
+    Walk against the direction of flow from `terminals` to the terminals phases are fed out of, which are the outgoing terminals of feeder circuit
+    breakers and terminals with outgoing phases that are not fed from anything else, such as those of energy sources.
+    Returns the head terminals, in the order they were found.
+    """
+    heads = []
+    seen = set()
+    stack = list(terminals)
+    while stack:
+        terminal = stack.pop()
+        if id(terminal) in seen:
+            continue
+        seen.add(id(terminal))
+
+        ce = terminal.conducting_equipment
+        feeds = []
+        if _has_direction(terminal, PhaseDirection.IN, phase_selector):
+            feeds.extend(cr.to_terminal for cr in get_connectivity(terminal) if _has_direction(cr.to_terminal, PhaseDirection.OUT, phase_selector))
+        if _has_direction(terminal, PhaseDirection.OUT, phase_selector):
+            if isinstance(ce, Breaker) and ce.is_substation_breaker():
+                heads.append(terminal)
+                continue
+            if ce is not None:
+                feeds.extend(other for other in ce.terminals if other is not terminal and _has_direction(other, PhaseDirection.IN, phase_selector))
+            if not feeds:
+                heads.append(terminal)
+        stack.extend(feeds)
+    return heads
+
+
+def _mark_changed(terminals: Iterable[Terminal]):
+    # Writes to the traced phases don't change the version of their store, so it is changed once for each store written to by a run.
+    stores = {}
+    for terminal in terminals:
+        store = terminal.traced_phases.store
+        if store is not None:
+            stores[id(store)] = store
+    for store in stores.values():
+        store.mark_changed()
+
+
+def _has_direction(terminal: Terminal, direction: PhaseDirection, phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                   exact: bool = False) -> bool:
+    if exact:
+        return any(phase_selector(terminal, phase).direction() == direction for phase in terminal.phases.single_phases)
+    return any(phase_selector(terminal, phase).direction().has(direction) for phase in terminal.phases.single_phases)
+
+
+def remove_phases_downstream(terminals: Iterable[Terminal],
+                             phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                             keep: Iterable[Terminal] = ()) -> List[Terminal]:
+    """
+    Remove the phases from every terminal fed through the outgoing phases of `terminals`, following the direction of flow.
+
+    A terminal fed from both directions is part of a loop, and its statuses don't say which way phases went around it, so following them could walk
+    back against the flow. When one is reached, the phases are removed from everything fed from the feed heads of `terminals` and the loop instead,
+    which are the outgoing terminals of feeder circuit breakers and terminals not fed from anything else. Heads other than `terminals` keep their
+    phases, so flowing phases back in re-phases the loop in the order a full run traces it.
+
+    `terminals` The terminals to start from. Only those with outgoing phases are removed.
+    `phase_selector` The phases to remove.
+    `keep` Terminals to follow the flow through without removing their phases.
+    Returns the terminals that had their phases removed, in the order they were found.
+    """
+    terminals = list(terminals)
+    found, loop_terminal = _find_downstream(terminals, phase_selector, stop_at_loops=True)
+    if loop_terminal is not None:
+        heads = _find_feed_heads(terminals + [loop_terminal], phase_selector)
+        starts = {id(t) for t in terminals}
+        keep = itertools.chain(keep, (head for head in heads if id(head) not in starts))
+        found, _ = _find_downstream(heads, phase_selector, stop_at_loops=False)
+
+    for terminal in keep:
+        found.pop(id(terminal), None)
+    region = list(found.values())
+    for terminal in region:
+        for phase in terminal.phases.single_phases:
+            phase_selector(terminal, phase).set(SinglePhaseKind.NONE, PhaseDirection.NONE)
+    _mark_changed(region)
+    return region
+
+
+def _find_downstream(terminals: List[Terminal], phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                     stop_at_loops: bool) -> Tuple[Dict[int, Terminal], Optional[Terminal]]:
+    # Keyed by id, as terminals all hash the same. When `stop_at_loops`, stops at the first terminal fed from both directions and returns it too.
+    found = {}
+    stack = [t for t in terminals if _has_direction(t, PhaseDirection.OUT, phase_selector)]
+    while stack:
+        terminal = stack.pop()
+        if id(terminal) in found:
+            continue
+        if stop_at_loops and _has_direction(terminal, PhaseDirection.BOTH, phase_selector, exact=True):
+            return found, terminal
+        found[id(terminal)] = terminal
+
+        out_phases = {phase for phase in terminal.phases.single_phases if phase_selector(terminal, phase).direction().has(PhaseDirection.OUT)}
+        if out_phases:
+            for cr in get_connectivity(terminal, out_phases):
+                if any(phase_selector(cr.to_terminal, path.to_phase).direction().has(PhaseDirection.IN) for path in cr.nominal_phase_paths):
+                    stack.append(cr.to_terminal)
+
+        if terminal.conducting_equipment is not None and _has_direction(terminal, PhaseDirection.IN, phase_selector):
+            for other in terminal.conducting_equipment.terminals:
+                if other is not terminal and _has_direction(other, PhaseDirection.OUT, phase_selector):
+                    stack.append(other)
+    return found, None
+
+
+async def _run_terminal(start: Terminal, traversal: BranchRecursiveTraversal, phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                        conflicts: Optional[List[PhaseConflict]] = None):
     phases_to_flow = {phase for phase in start.phases.single_phases if phase_selector(start, phase).direction().has(PhaseDirection.OUT)}
-    await _run_from_out_terminal(traversal, start, phases_to_flow, phase_selector)
+    await _run_from_out_terminal(traversal, start, phases_to_flow, phase_selector, conflicts)
 
 
 async def _run_from_out_terminal(traversal: BranchRecursiveTraversal, out_terminal: Terminal, phases_to_flow: Set[SinglePhaseKind],
-                                 phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]):
+                                 phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus], conflicts: Optional[List[PhaseConflict]] = None):
     traversal.reset()
+    # The trace starts from the terminals queued below rather than from the start item of a previous run, which would otherwise be visited again.
+    traversal.start_item = None
     traversal.tracker.visit(out_terminal)
-    _flow_out_to_connected_terminals_and_queue(traversal, out_terminal, phases_to_flow, phase_selector)
+    if _events.enabled:
+        _events.emit("trace_from", terminal=out_terminal.mrid, phases=sorted(p.short_name for p in phases_to_flow))
+    _flow_out_to_connected_terminals_and_queue(traversal, out_terminal, phases_to_flow, phase_selector, conflicts)
     await traversal.trace()
 
 
 def _flow_out_to_connected_terminals_and_queue(traversal: BranchRecursiveTraversal, out_terminal: Terminal, phases_to_flow: Set[SinglePhaseKind],
-                                               phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]):
+                                               phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                                               conflicts: Optional[List[PhaseConflict]] = None):
     connectivity_results = get_connectivity(out_terminal, phases_to_flow)
     for cr in connectivity_results:
         in_term = cr.to_terminal
         has_added = False
         for oi in cr.nominal_phase_paths:
-            out_core = oi.from_core
-            in_core = oi.to_core
+            out_core = oi.from_phase
+            in_core = oi.to_phase
             out_phase = phase_selector(out_terminal, out_core).phase()
             in_phase = phase_selector(in_term, in_core)
             try:
                 if in_phase.add(out_phase, PhaseDirection.IN):
                     has_added = True
             except PhaseException as ex:
-                raise PhaseException(
-                    (f"Attempted to apply more than one phase to [{in_term.conducting_equipment.mrid if in_term.conducting_equipment else in_term.mrid}"
-                     f" on nominal phase {oi.to_phase}. Attempted to apply phase {out_phase} to {in_phase.phase()}."), ex)
+                if conflicts is None:
+                    raise PhaseException(
+                        (f"Attempted to apply more than one phase to [{in_term.conducting_equipment.mrid if in_term.conducting_equipment else in_term.mrid}"
+                         f" on nominal phase {oi.to_phase}. Attempted to apply phase {out_phase} to {in_phase.phase()}."), ex)
+                _record_conflict(conflicts, in_term, in_core, in_phase.phase(), out_phase, out_terminal, phase_selector)
 
         if has_added and not traversal.has_visited(in_term):
             if len(connectivity_results) > 1 or (out_terminal.conducting_equipment is not None and out_terminal.conducting_equipment.num_terminals() > 2):
                 branch = traversal.create_branch()
                 branch.start_item = in_term
                 traversal.branch_queue.put(branch)
+                if _events.enabled:
+                    _events.emit("branched", source=out_terminal.mrid, start=in_term.mrid)
             else:
                 traversal.process_queue.put(in_term)
+                if _events.enabled:
+                    _events.emit("queued", source=out_terminal.mrid, queued=[in_term.mrid])
 
 
 def _get_phases_to_flow(terminal: Terminal,
                         open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
-                        phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]):
-    phases_to_flow = set()
-    try:
-        if terminal.conducting_equipment.is_substation_breaker():
-            return phases_to_flow
-    except AttributeError:
-        pass
-
-    if terminal.conducting_equipment is None:
-        return phases_to_flow
-
+                        phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]) -> FrozenSet[SinglePhaseKind]:
     equip = terminal.conducting_equipment
+    if equip is None or (isinstance(equip, Breaker) and equip.is_substation_breaker()):
+        return _NO_PHASES
+
+    flow_mask = 0
     for phase in terminal.phases.single_phases:
         if not open_test(equip, phase) and phase_selector(terminal, phase).direction().has(PhaseDirection.IN):
-            phases_to_flow.add(phase)
-    return phases_to_flow
+            flow_mask |= phase.phase_bit
+    return phases_from_mask(flow_mask)
+
+
+_NO_PHASES = phases_from_mask(0)
 
 
 def _flow_through_equipment(traversal: BranchRecursiveTraversal, in_terminal: Terminal, out_terminal: Terminal, phases_to_flow: Set[SinglePhaseKind],
-                            phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]):
+                            phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus], conflicts: Optional[List[PhaseConflict]] = None):
     traversal.tracker.visit(out_terminal)
     has_changes = False
 
@@ -311,13 +1065,73 @@ def _flow_through_equipment(traversal: BranchRecursiveTraversal, in_terminal: Te
             applied = out_phase_status.add(in_phase, PhaseDirection.OUT)
             has_changes = applied or has_changes
         except PhaseException as ex:
-            raise PhaseException((
-                f"Attempted to apply more than one phase to {out_terminal.conducting_equipment.mrid if out_terminal.conducting_equipment else in_terminal.mrid}"
-                f" on nominal phase {phase}. Detected phases {out_phase_status.phase()} and {in_phase}. Underlying error was {str(ex)}"),
-                ex)
+            if conflicts is None:
+                raise PhaseException((
+                    f"Attempted to apply more than one phase to {out_terminal.conducting_equipment.mrid if out_terminal.conducting_equipment else in_terminal.mrid}"
+                    f" on nominal phase {phase}. Detected phases {out_phase_status.phase()} and {in_phase}. Underlying error was {str(ex)}"),
+                    ex)
+            _record_conflict(conflicts, out_terminal, phase, out_phase_status.phase(), in_phase, in_terminal, phase_selector)
     return has_changes
 
 
+def _record_conflict(conflicts: List[PhaseConflict], terminal: Terminal, nominal_phase: SinglePhaseKind, existing_phase: SinglePhaseKind,
+                     attempted_phase: SinglePhaseKind, from_terminal: Terminal, phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]):
+    conflict = PhaseConflict(terminal=terminal.mrid,
+                             equipment=terminal.conducting_equipment.mrid if terminal.conducting_equipment else None,
+                             nominal_phase=nominal_phase,
+                             existing_phase=existing_phase,
+                             attempted_phase=attempted_phase,
+                             from_terminal=from_terminal.mrid,
+                             from_equipment=from_terminal.conducting_equipment.mrid if from_terminal.conducting_equipment else None,
+                             current=_is_current(phase_selector(terminal, nominal_phase)),
+                             path=_source_path(from_terminal, attempted_phase, phase_selector))
+    conflicts.append(conflict)
+    if _events.enabled:
+        _events.emit("conflict", terminal=conflict.terminal, nominal_phase=nominal_phase.short_name, existing=existing_phase.short_name,
+                     attempted=attempted_phase.short_name, source=conflict.from_terminal)
+
+
+def _source_path(terminal: Terminal, traced_phase: SinglePhaseKind, phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]) -> List[str]:
+    # Follow the directions `traced_phase` was traced in back from `terminal` until it reaches a terminal it wasn't fed into, without revisiting any.
+    path = [terminal]
+    seen = {id(terminal)}
+    while True:
+        terminal = next((t for t in _traced_from(terminal, traced_phase, phase_selector) if id(t) not in seen), None)
+        if terminal is None:
+            return [t.mrid for t in reversed(path)]
+        path.append(terminal)
+        seen.add(id(terminal))
+
+
+def _traced_from(terminal: Terminal, traced_phase: SinglePhaseKind,
+                 phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]) -> Iterable[Terminal]:
+    # Incoming phases are fed from connected terminals with the phase outgoing, and outgoing phases through the equipment from its other terminals.
+    direction = _traced_direction(terminal, traced_phase, phase_selector)
+    if direction.has(PhaseDirection.IN):
+        for cr in get_connectivity(terminal):
+            if _traced_direction(cr.to_terminal, traced_phase, phase_selector).has(PhaseDirection.OUT):
+                yield cr.to_terminal
+    if direction.has(PhaseDirection.OUT) and terminal.conducting_equipment is not None:
+        for other in terminal.conducting_equipment.terminals:
+            if other is not terminal and _traced_direction(other, traced_phase, phase_selector).has(PhaseDirection.IN):
+                yield other
+
+
+def _traced_direction(terminal: Terminal, traced_phase: SinglePhaseKind,
+                      phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]) -> PhaseDirection:
+    for nominal_phase in terminal.phases.single_phases:
+        status = phase_selector(terminal, nominal_phase)
+        if status.phase() == traced_phase:
+            return status.direction()
+    return PhaseDirection.NONE
+
+
+def _is_current(status: PhaseStatus) -> bool:
+    if isinstance(status, _ReflowPhases):
+        status = status.status
+    return isinstance(status, CurrentPhases)
+
+
 def _get_feeder_cb_terminal_cores_by_status(feeder_cb: Breaker,
                                             open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
                                             phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]):
@@ -344,7 +1158,8 @@ def _flow_through_feeder_cb_and_queue(in_terminal: FeederCbTerminalPhasesByStatu
                                       traversal: BranchRecursiveTraversal,
                                       phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
                                       delayed_traces: List,
-                                      processed_phases: Set[SinglePhaseKind]):
+                                      processed_phases: Set[SinglePhaseKind],
+                                      conflicts: Optional[List[PhaseConflict]] = None):
     if not in_terminal.in_phases:
         return
 
@@ -355,9 +1170,9 @@ def _flow_through_feeder_cb_and_queue(in_terminal: FeederCbTerminalPhasesByStatu
 
             # Remove any phases that have already been processed from the other side
             if phase not in out_terminal.none_phases:
-                phases_to_flow.remove(phase)
+                phases_to_flow.discard(phase)
 
-    if _flow_through_equipment(traversal, in_terminal.terminal, out_terminal.terminal, phases_to_flow, phase_selector):
+    if _flow_through_equipment(traversal, in_terminal.terminal, out_terminal.terminal, phases_to_flow, phase_selector, conflicts):
         delayed_traces.append(DelayedFeederTrace(out_terminal.terminal, phases_to_flow))
 
 
@@ -365,19 +1180,20 @@ def _run_feeder_breaker(feeder_cb: Breaker,
                         traversal: BranchRecursiveTraversal,
                         open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
                         phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
-                        delayed_traces: List):
+                        delayed_traces: List,
+                        conflicts: Optional[List[PhaseConflict]] = None):
     if feeder_cb.num_terminals() not in (1, 2):
         logger.warning(f"Ignoring feeder CB {str(feeder_cb)} with {feeder_cb.num_terminals()} terminals, expected 1 or 2 terminals")
         return FeederProcessingStatus.COMPLETE
 
     if feeder_cb.num_terminals() == 1:
-        set_phases_and_queue_next(next(feeder_cb.terminals), traversal, open_test, phase_selector)
+        set_phases_and_queue_next(next(feeder_cb.terminals), traversal, open_test, phase_selector, conflicts)
         return FeederProcessingStatus.COMPLETE
 
     processed_phases = set()
     statuses = _get_feeder_cb_terminal_cores_by_status(feeder_cb, open_test, phase_selector)
-    _flow_through_feeder_cb_and_queue(statuses[0], statuses[1], traversal, phase_selector, delayed_traces, processed_phases)
-    _flow_through_feeder_cb_and_queue(statuses[1], statuses[0], traversal, phase_selector, delayed_traces, processed_phases)
+    _flow_through_feeder_cb_and_queue(statuses[0], statuses[1], traversal, phase_selector, delayed_traces, processed_phases, conflicts)
+    _flow_through_feeder_cb_and_queue(statuses[1], statuses[0], traversal, phase_selector, delayed_traces, processed_phases, conflicts)
 
     nominal_phases = {phase for term in feeder_cb.terminals for phase in term.phases.single_phases}
     if len(processed_phases) == len(nominal_phases):
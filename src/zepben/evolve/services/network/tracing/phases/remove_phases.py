@@ -0,0 +1,119 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+from typing import Callable, List, Optional, Set
+
+from dataclassy import dataclass
+
+from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.cim.iec61970.base.core.terminal import Terminal
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind
+from zepben.evolve.model.phasedirection import PhaseDirection
+from zepben.evolve.services.network.tracing.phases.phase_status import PhaseStatus, normal_phases, current_phases
+from zepben.evolve.services.network.tracing.phases.phasing import PhaseConflict, remove_phases_downstream, reflow_region
+from zepben.evolve.services.network.tracing.trace_events import trace_events
+from zepben.evolve.services.network.tracing.util import normally_open, currently_open
+
+__all__ = ["RemovedPhases", "RemovePhases"]
+
+_events = trace_events("phasing")
+
+
+@dataclass(slots=True)
+class RemovedPhases(object):
+    """
+    The outage caused by `RemovePhases` de-energising a terminal in either the normal or current state of the network.
+    """
+
+    terminals: List[Terminal] = []
+    """The terminals left without any phases."""
+
+    equipment: List[ConductingEquipment] = []
+    """The conducting equipment left without phases on any of its terminals."""
+
+    refed_terminals: List[Terminal] = []
+    """The terminals that had their phases removed that are still supplied from another energised path, which may now be fed from a different
+    direction. When the de-energised terminal is part of a loop, this includes the rest of the loop, which is re-phased from its feed."""
+
+    terminals_cleared: int = 0
+    """The number of terminals that had their phases removed before phases were flowed back in from the surrounding energised network, which bounds
+    the work done."""
+
+    conflicts: List[PhaseConflict] = []
+    """The phase conflicts found while flowing phases back in, if they were being collected."""
+
+
+class RemovePhases(object):
+    """
+    The counterpart to `SetPhases`, which removes the phases fed out of a terminal for outage studies without re-phasing the whole network.
+    """
+
+    def __init__(self):
+        self.normal_removed: Optional[RemovedPhases] = None
+        """The outage from the last run in the normal state of the network."""
+        self.current_removed: Optional[RemovedPhases] = None
+        """The outage from the last run in the current state of the network."""
+
+    async def run(self, terminal: Terminal, normal: bool = True, current: bool = True, collect_conflicts: bool = False):
+        """
+        De-energise `terminal`, removing the phases fed out of it from everything downstream. The terminal is treated as the open point of the outage,
+        so phases can still reach it but no longer flow on through it, even if the switch state of the network hasn't been changed.
+
+        Phases are removed from the terminals downstream of `terminal` following the direction of flow, then flowed back in from the energised
+        terminals on the boundary of the cleared region, so parts of it that are also supplied from another energised path, such as through a closed
+        tie, stay energised. The work done is proportional to the size of the outage rather than the network. When the outage reaches a loop, the
+        phases are removed from everything fed from the same feed heads instead, as described by `remove_phases_downstream`, so the loop is
+        re-phased in the order a full run traces it. The outages are recorded in `normal_removed` and `current_removed`. Use `SetPhases` to restore
+        the phases once the outage is over.
+
+        `terminal` The terminal to de-energise.
+        `normal` Whether to remove the normal phases.
+        `current` Whether to remove the current phases.
+        `collect_conflicts` Whether to record each phase conflict found while flowing phases back in and carry on, as for `SetPhases.run`, rather than
+                            raising a `PhaseException` on the first conflict. The conflicts are kept in the `RemovedPhases` of each state.
+        """
+        if normal:
+            self.normal_removed = await _remove_phases(terminal, normally_open, normal_phases, collect_conflicts)
+        if current:
+            self.current_removed = await _remove_phases(terminal, currently_open, current_phases, collect_conflicts)
+
+
+async def _remove_phases(terminal: Terminal,
+                         open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
+                         phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                         collect_conflicts: bool) -> RemovedPhases:
+    conflicts = [] if collect_conflicts else None
+    region = remove_phases_downstream([terminal], phase_selector)
+    if region:
+        await reflow_region(region, [], open_test, phase_selector, blocked=[terminal], conflicts=conflicts)
+    if _events.enabled:
+        _events.emit("removed_phases", terminal=terminal.mrid, terminals=len(region))
+
+    removed = RemovedPhases(terminals_cleared=len(region), conflicts=conflicts or [])
+    # Keyed by id, as equipment all hash the same.
+    seen: Set[int] = set()
+    for t in region:
+        if _is_energised(t, phase_selector):
+            removed.refed_terminals.append(t)
+            continue
+        removed.terminals.append(t)
+
+        ce = t.conducting_equipment
+        if ce is not None and id(ce) not in seen:
+            seen.add(id(ce))
+            if not any(_is_energised(other, phase_selector) for other in ce.terminals):
+                removed.equipment.append(ce)
+
+    removed.terminals.sort(key=lambda it: it.mrid)
+    removed.refed_terminals.sort(key=lambda it: it.mrid)
+    removed.equipment.sort(key=lambda it: it.mrid)
+    return removed
+
+
+def _is_energised(terminal: Terminal, phase_selector: Callable[[Terminal, SinglePhaseKind], PhaseStatus]) -> bool:
+    return any(phase_selector(terminal, phase).direction() != PhaseDirection.NONE for phase in terminal.phases.single_phases)
@@ -0,0 +1,306 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import math
+from heapq import heappush, heappop
+from itertools import count
+from typing import Callable, Dict, Iterable, List, Optional, Set, Union, Tuple
+
+from dataclassy import dataclass
+
+from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.cim.iec61970.base.core.phase_code import PhaseCode
+from zepben.evolve.model.cim.iec61970.base.wires.aclinesegment import Conductor, AcLineSegment
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind, SINGLE_PHASE_KIND_VALUES, phase_mask, \
+    ordered_phases_from_mask
+from zepben.evolve.services.network.tracing.connectivity import get_connectivity
+from zepben.evolve.services.network.tracing.util import normally_open
+
+__all__ = ["ShortestPath", "ShortestPaths", "length_weight", "impedance_weight", "hop_weight", "shortest_path", "shortest_paths"]
+
+Phases = Union[PhaseCode, Set[SinglePhaseKind], int, None]
+Weight = Callable[[ConductingEquipment], float]
+OpenTest = Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool]
+
+_ALL_PHASES = phase_mask(SINGLE_PHASE_KIND_VALUES)
+
+
+def length_weight(ce: ConductingEquipment) -> float:
+    """
+    Weight equipment by its length, which is `Conductor.length` for conductors and zero for everything else.
+    """
+    return (ce.length or 0.0) if isinstance(ce, Conductor) else 0.0
+
+
+def impedance_weight(ce: ConductingEquipment) -> float:
+    """
+    Weight equipment by the magnitude of its positive sequence impedance, calculated from the length and `PerLengthSequenceImpedance` of an
+    `AcLineSegment`. Everything else, including line segments without a per length impedance, has zero impedance.
+    """
+    if isinstance(ce, AcLineSegment) and ce.per_length_sequence_impedance is not None:
+        plsi = ce.per_length_sequence_impedance
+        return (ce.length or 0.0) * math.hypot(plsi.r or 0.0, plsi.x or 0.0)
+    return 0.0
+
+
+def hop_weight(ce: ConductingEquipment) -> float:
+    """
+    Weight every piece of equipment as one, so the shortest path is the one through the fewest pieces of equipment.
+    """
+    return 1.0
+
+
+@dataclass(slots=True)
+class ShortestPath(object):
+    """
+    A path between two pieces of equipment.
+    """
+
+    distance: float = 0.0
+    """The total weight of the equipment on the path, including both ends."""
+
+    equipment: List[ConductingEquipment] = []
+    """The equipment on the path, in order from the start to the end."""
+
+
+class ShortestPaths(object):
+    """
+    The shortest paths from one or more sources to everything reachable from them, as found by `shortest_paths`.
+    """
+    __slots__ = ["_distances", "_previous", "_equipment"]
+
+    def __init__(self, distances: Dict[str, float], previous: Dict[str, Optional[str]], equipment: Dict[str, ConductingEquipment]):
+        self._distances = distances
+        self._previous = previous
+        self._equipment = equipment
+
+    @property
+    def distances(self) -> Dict[str, float]:
+        """The distance to the nearest source of each piece of equipment reached, keyed by mRID."""
+        return self._distances
+
+    def distance(self, ce: ConductingEquipment) -> Optional[float]:
+        """
+        `ce` The equipment to check.
+        Returns the distance from the nearest source to `ce`, or None if it wasn't reached.
+        """
+        return self._distances.get(ce.mrid)
+
+    def path(self, ce: ConductingEquipment) -> Optional[ShortestPath]:
+        """
+        `ce` The equipment to get the path to.
+        Returns the shortest path from the nearest source to `ce`, or None if it wasn't reached.
+        """
+        distance = self._distances.get(ce.mrid)
+        if distance is None:
+            return None
+        mrids = [ce.mrid]
+        while self._previous[mrids[-1]] is not None:
+            mrids.append(self._previous[mrids[-1]])
+        return ShortestPath(distance, [self._equipment[mrid] for mrid in reversed(mrids)])
+
+
+class _Graph(object):
+    """
+    The neighbours of equipment and the weights used by a search, cached by mRID so each piece of equipment is only examined once.
+    """
+    __slots__ = ["weight", "open_test", "mask", "_weights", "_neighbours"]
+
+    def __init__(self, weight: Weight, open_test: OpenTest, phases: Phases):
+        self.weight = weight
+        self.open_test = open_test
+        if phases is None:
+            self.mask = _ALL_PHASES
+        elif isinstance(phases, int):
+            self.mask = phases
+        elif isinstance(phases, PhaseCode):
+            self.mask = phases.phase_mask
+        else:
+            self.mask = phase_mask(phases)
+        self._weights: Dict[str, float] = {}
+        self._neighbours: Dict[str, List[ConductingEquipment]] = {}
+
+    def weight_of(self, ce: ConductingEquipment) -> float:
+        w = self._weights.get(ce.mrid)
+        if w is None:
+            w = self.weight(ce)
+            if w < 0:
+                raise ValueError(f"Weights must not be negative, but {ce} has a weight of {w}.")
+            self._weights[ce.mrid] = w
+        return w
+
+    def is_closed(self, ce: ConductingEquipment) -> bool:
+        """Check if any of the phases searched can pass through `ce`."""
+        mask = 0
+        for t in ce.terminals:
+            mask |= t.phases.phase_mask
+        return any(not self.open_test(ce, phase) for phase in ordered_phases_from_mask(mask & self.mask))
+
+    def neighbours(self, ce: ConductingEquipment) -> List[ConductingEquipment]:
+        neighbours = self._neighbours.get(ce.mrid)
+        if neighbours is None:
+            neighbours = []
+            for t in ce.terminals:
+                mask = t.phases.phase_mask & self.mask
+                if not mask:
+                    continue
+                for cr in get_connectivity(t, mask):
+                    if cr.to_equip is not None and cr.to_equip is not ce and cr.nominal_phase_paths:
+                        neighbours.append(cr.to_equip)
+            self._neighbours[ce.mrid] = neighbours
+        return neighbours
+
+
+def shortest_paths(sources: Union[ConductingEquipment, Iterable[ConductingEquipment]],
+                   weight: Weight = length_weight,
+                   open_test: OpenTest = normally_open,
+                   phases: Phases = None,
+                   targets: Optional[Iterable[ConductingEquipment]] = None) -> ShortestPaths:
+    """
+    Find the shortest paths from one or more sources to everything reachable from them in a single run of Dijkstra's algorithm, e.g. the distance
+    to the nearest energy source of every consumer.
+
+    The distance of a path is the total weight of the equipment on it, including the source and the equipment it ends at. Paths can end at open
+    equipment but never pass through it.
+
+    `sources` The equipment to find paths from.
+    `weight` Function giving the weight of a piece of equipment, which must not be negative. Defaults to `length_weight`.
+    `open_test` Function that takes a piece of equipment and a phase and returns whether it is open on that phase. Use `normally_open` or
+                `currently_open` for the normal or current state of the network, or `ignore_open` to pass through open switches.
+    `phases` The phases to follow, either as a `PhaseCode`, a set of `SinglePhaseKind`s or a mask of their phase bits. Only connections between
+             terminals carrying at least one of the phases are followed. Defaults to all phases.
+    `targets` Optional equipment to find paths to, which stops the search once the paths to all of them are found.
+    Returns the `ShortestPaths` found.
+    Raises `ValueError` if a weight is negative.
+    """
+    if isinstance(sources, ConductingEquipment):
+        sources = [sources]
+    graph = _Graph(weight, open_test, phases)
+    remaining = {ce.mrid for ce in targets} if targets is not None else None
+
+    distances: Dict[str, float] = {}
+    previous: Dict[str, Optional[str]] = {}
+    equipment: Dict[str, ConductingEquipment] = {}
+    settled: Set[str] = set()
+    tie_break = count()
+    heap: List[Tuple[float, int, ConductingEquipment]] = []
+
+    for source in sources:
+        d = graph.weight_of(source)
+        if d < distances.get(source.mrid, math.inf):
+            distances[source.mrid] = d
+            previous[source.mrid] = None
+            equipment[source.mrid] = source
+            heappush(heap, (d, next(tie_break), source))
+    start_mrids = set(distances)
+
+    while heap:
+        d, _, ce = heappop(heap)
+        if ce.mrid in settled:
+            continue
+        settled.add(ce.mrid)
+        if remaining is not None:
+            remaining.discard(ce.mrid)
+            if not remaining:
+                break
+        if ce.mrid not in start_mrids and not graph.is_closed(ce):
+            continue
+
+        for other in graph.neighbours(ce):
+            nd = d + graph.weight_of(other)
+            if nd < distances.get(other.mrid, math.inf):
+                distances[other.mrid] = nd
+                previous[other.mrid] = ce.mrid
+                equipment[other.mrid] = other
+                heappush(heap, (nd, next(tie_break), other))
+
+    # Only the distances that were settled are known to be the shortest.
+    for mrid in [mrid for mrid in distances if mrid not in settled]:
+        del distances[mrid]
+    return ShortestPaths(distances, previous, equipment)
+
+
+def shortest_path(from_: ConductingEquipment,
+                  to: ConductingEquipment,
+                  weight: Weight = length_weight,
+                  open_test: OpenTest = normally_open,
+                  phases: Phases = None,
+                  bidirectional: bool = True) -> Optional[ShortestPath]:
+    """
+    Find the shortest path between two pieces of equipment, weighted by `weight`. See `shortest_paths` for how paths are weighted and which are
+    followed.
+
+    `from_` The equipment to find a path from.
+    `to` The equipment to find a path to.
+    `weight` Function giving the weight of a piece of equipment, which must not be negative. Defaults to `length_weight`.
+    `open_test` Function that takes a piece of equipment and a phase and returns whether it is open on that phase.
+    `phases` The phases to follow. Defaults to all phases.
+    `bidirectional` Whether to search from both ends at once, which visits far less of the network when the ends are close together.
+    Returns the shortest path, or None if there is no path between the equipment.
+    Raises `ValueError` if a weight is negative.
+    """
+    if not bidirectional:
+        return shortest_paths(from_, weight, open_test, phases, targets=[to]).path(to)
+    if from_.mrid == to.mrid:
+        return ShortestPath(_Graph(weight, open_test, phases).weight_of(from_), [from_])
+
+    graph = _Graph(weight, open_test, phases)
+    # The path is weighted by giving each connection between equipment half the weight of the equipment either side, plus half the weight of each
+    # end, which makes the connections the same weight in both directions.
+    ends = (from_, to)
+    distances: Tuple[Dict[str, float], Dict[str, float]] = ({from_.mrid: graph.weight_of(from_) / 2}, {to.mrid: graph.weight_of(to) / 2})
+    previous: Tuple[Dict[str, Optional[ConductingEquipment]], Dict[str, Optional[ConductingEquipment]]] = ({from_.mrid: None}, {to.mrid: None})
+    settled: Tuple[Set[str], Set[str]] = (set(), set())
+    tie_break = count()
+    heaps = ([(distances[0][from_.mrid], next(tie_break), from_)], [(distances[1][to.mrid], next(tie_break), to)])
+
+    best = math.inf
+    meeting: Optional[Tuple[ConductingEquipment, ConductingEquipment]] = None
+
+    def can_pass(ce: ConductingEquipment) -> bool:
+        return ce is from_ or ce is to or graph.is_closed(ce)
+
+    while heaps[0] and heaps[1]:
+        if heaps[0][0][0] + heaps[1][0][0] >= best:
+            break
+        side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+        d, _, ce = heappop(heaps[side])
+        if ce.mrid in settled[side]:
+            continue
+        settled[side].add(ce.mrid)
+        if ce is not ends[side] and not graph.is_closed(ce):
+            continue
+
+        half = graph.weight_of(ce) / 2
+        for other in graph.neighbours(ce):
+            nd = d + half + graph.weight_of(other) / 2
+            if nd < distances[side].get(other.mrid, math.inf):
+                distances[side][other.mrid] = nd
+                previous[side][other.mrid] = ce
+                heappush(heaps[side], (nd, next(tie_break), other))
+
+            # Join the searches if the other side has already reached this neighbour and the path can pass through it. The distances from each side
+            # both include half the weight of the neighbour, so their sum is the distance of the whole path.
+            other_distance = distances[1 - side].get(other.mrid)
+            if other_distance is not None and nd + other_distance < best and other is not ends[side] and can_pass(other):
+                best = nd + other_distance
+                meeting = (ce, other) if side == 0 else (other, ce)
+
+    if meeting is None:
+        return None
+
+    forward, backward = meeting
+    path = [forward]
+    while previous[0][path[-1].mrid] is not None:
+        path.append(previous[0][path[-1].mrid])
+    path.reverse()
+    ce = backward
+    while ce is not None:
+        path.append(ce)
+        ce = previous[1][ce.mrid]
+    return ShortestPath(best, path)
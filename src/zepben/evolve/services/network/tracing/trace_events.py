@@ -0,0 +1,94 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+import logging
+from typing import Callable, Dict, Any, Optional, List
+
+__all__ = ["TraceEvents", "TraceEventSink", "trace_events", "enable_trace_events", "disable_trace_events"]
+
+TraceEventSink = Callable[[str, str, Dict[str, Any]], None]
+"""A callback passed the name of the event source, the event and its fields each time an event is emitted."""
+
+_sources: Dict[str, TraceEvents] = {}
+
+
+class TraceEvents(object):
+    """
+    A named source of trace events for the tracing and phasing modules.
+
+    Emitting sites must check `enabled` before building the fields of an event. It is a plain attribute, so while a source is disabled (the default)
+    an emitting site costs a single attribute lookup, no matter how expensive the event data is to build:
+
+        if _events.enabled:
+            _events.emit("queued", source=item.mrid, queued=[t.mrid for t in to_terms])
+
+    Enabled events are logged at DEBUG level to the `logging` logger with the same name as the source, and passed to any registered sinks.
+    """
+    __slots__ = ["name", "enabled", "_logger", "_sinks"]
+
+    def __init__(self, name: str):
+        self.name = name
+        self.enabled = False
+        self._logger = logging.getLogger(name)
+        self._sinks: List[TraceEventSink] = []
+
+    def enable(self, sink: Optional[TraceEventSink] = None) -> TraceEvents:
+        """
+        Start emitting events from this source.
+        `sink` An optional callback to pass each event to, in addition to logging it.
+        Returns this source.
+        """
+        if sink is not None:
+            self._sinks.append(sink)
+        self.enabled = True
+        return self
+
+    def disable(self):
+        """Stop emitting events from this source and remove any registered sinks."""
+        self.enabled = False
+        self._sinks.clear()
+
+    def emit(self, event: str, **fields: Any):
+        """
+        Emit an event. Callers should only call this when `enabled` is True.
+        `event` The name of the event.
+        `fields` The data for the event.
+        """
+        for sink in self._sinks:
+            sink(self.name, event, fields)
+        self._logger.debug("%s %s", event, fields)
+
+
+def trace_events(name: str) -> TraceEvents:
+    """
+    Get the event source with the given name, creating it if it doesn't exist.
+    `name` The name of the source. Also used as the name of the logger the events are written to.
+    """
+    source = _sources.get(name)
+    if source is None:
+        source = _sources[name] = TraceEvents(name)
+    return source
+
+
+def enable_trace_events(*names: str, sink: Optional[TraceEventSink] = None):
+    """
+    Enable trace events.
+    `names` The names of the sources to enable. Enables every source that has been created if none are given.
+    `sink` An optional callback to pass each event to, in addition to logging it.
+    """
+    for source in ([trace_events(name) for name in names] if names else list(_sources.values())):
+        source.enable(sink)
+
+
+def disable_trace_events(*names: str):
+    """
+    Disable trace events and remove their sinks.
+    `names` The names of the sources to disable. Disables every source if none are given.
+    """
+    for source in ([trace_events(name) for name in names] if names else list(_sources.values())):
+        source.disable()
@@ -3,23 +3,24 @@
 #  This Source Code Form is subject to the terms of the Mozilla Public
 #  License, v. 2.0. If a copy of the MPL was not distributed with this
 #  file, You can obtain one at https://mozilla.org/MPL/2.0/.
-import logging
 from typing import Optional, Callable, Set, Iterable, TypeVar
 
 from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
 from zepben.evolve.model.cim.iec61970.base.core.terminal import Terminal
-from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import SinglePhaseKind, phase_mask, phases_from_mask, ordered_phases_from_mask
 from zepben.evolve.model.phasedirection import PhaseDirection
 from zepben.evolve.services.network.tracing.phases.phase_step import PhaseStep
 from zepben.evolve.services.network.tracing.phases.phase_status import PhaseStatus, current_phases, normal_phases
 from zepben.evolve.services.network.tracing.connectivity import get_connected_equipment, get_connectivity
+from zepben.evolve.services.network.tracing.trace_events import trace_events
 from zepben.evolve.services.network.tracing.util import currently_open, normally_open
 from zepben.evolve.services.network.tracing.traversals.tracing import Traversal
 from zepben.evolve.services.network.tracing.traversals.queue import depth_first, Queue, PriorityQueue
 
-__all__ = ["queue_next_terminal", "normal_downstream_trace", "create_basic_depth_trace", "connected_equipment_trace", "current_downstream_trace"]
+__all__ = ["queue_next_terminal", "normal_downstream_trace", "create_basic_depth_trace", "connected_equipment_trace", "current_downstream_trace",
+           "get_phases_with_direction"]
 
-tracing_logger = logging.getLogger("queue_next")
+_events = trace_events("queue_next")
 
 T = TypeVar("T")
 
@@ -54,6 +55,8 @@ def current_downstream_trace(queue: Queue = None, **kwargs):
     `kwargs` Args to be passed to `zepben.evolve.Traversal`
     Returns A `zepben.evolve.traversals.Traversal`
     """
+    if queue is None:
+        queue = PriorityQueue()
     return Traversal(queue_next=_create_downstream_queue_next(currently_open, current_phases), process_queue=queue, **kwargs)
 
 
@@ -69,12 +72,13 @@ def _create_downstream_queue_next(open_test: Callable[[ConductingEquipment, Opti
         connected_terms = []
         if not phase_step:
             return connected_terms
-        out_phases = set()
+        candidate_mask = phase_mask(phase_step.phases)
         for term in phase_step.conducting_equipment.terminals:
-            _get_phases_with_direction(open_test, active_phases, term, phase_step.phases, PhaseDirection.OUT, out_phases)
+            out_mask = get_phases_with_direction(open_test, active_phases, term, candidate_mask, PhaseDirection.OUT)
 
-            if out_phases:
-                crs = get_connectivity(term, out_phases)
+            if out_mask:
+                out_phases = phases_from_mask(out_mask)
+                crs = get_connectivity(term, out_mask)
                 for cr in crs:
                     if cr.to_equip is not None:
                         if cr.to_equip in visited:
@@ -97,17 +101,18 @@ def queue_next_terminal(item, exclude: Optional[Set] = None):
         # If there are no other terminals we get connectivity for this one and return that. Note that this will
         # also return connections for EnergyConsumer's, but upstream will be covered by the exclude parameter and thus
         # should yield an empty list.
-        to_terms = [cr.to_terminal for cr in item.get_connectivity(exclude=exclude)]
-        if len(to_terms) > 0:
-            tracing_logger.debug(f"Queuing {to_terms[0].mrid} from single terminal equipment {item.mrid}")
+        to_terms = [cr.to_terminal for cr in get_connectivity(item, exclude=exclude)]
+        if _events.enabled and to_terms:
+            _events.emit("queued", source=item.mrid, queued=[to_terms[0].mrid], single_terminal=True)
         return to_terms
 
     crs = []
     for term in other_terms:
-        crs.extend(term.get_connectivity(exclude=exclude))
+        crs.extend(get_connectivity(term, exclude=exclude))
 
     to_terms = [cr.to_terminal for cr in crs]
-    tracing_logger.debug(f"Queuing terminals: [{', '.join(t.mrid for t in to_terms)}] from {item.mrid}")
+    if _events.enabled:
+        _events.emit("queued", source=item.mrid, queued=[t.mrid for t in to_terms])
     return to_terms
 
 
@@ -124,28 +129,29 @@ def normal_downstream_trace(queue: Queue = None, **kwargs):
     return Traversal(queue_next=_create_downstream_queue_next(normally_open, normal_phases), process_queue=queue, **kwargs)
 
 
-def _get_phases_with_direction(open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
-                               active_phases: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
-                               terminal: Terminal,
-                               candidate_phases: Set[SinglePhaseKind],
-                               direction: PhaseDirection,
-                               matched_phases: Set[SinglePhaseKind]):
+def get_phases_with_direction(open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool],
+                              active_phases: Callable[[Terminal, SinglePhaseKind], PhaseStatus],
+                              terminal: Terminal,
+                              candidate_mask: int,
+                              direction: PhaseDirection) -> int:
     """
-    Adds the closed phases from `terminal` in a specified `zepben.evolve.model.phasedirection.PhaseDirection` to `matched_phases`.
+    Find the closed phases of `terminal` in a specified `zepben.evolve.model.phasedirection.PhaseDirection`.
 
     `open_test` Function that takes a ConductingEquipment and a phase and returns whether the phase on the equipment is open (True) or closed (False).
     `active_phases` A `zepben.evolve.phase_status.PhaseStatus`
     `terminal` `zepben.evolve.cim.iec61970.base.core.terminal.Terminal` to retrieve phases for
-    `filter_cores` The phases of `terminal` to test.
+    `candidate_mask` A mask of the `SinglePhaseKind.phase_bit`s of the phases of `terminal` to test.
     `direction` The `zepben.evolve.model.phasedirection.PhaseDirection` to check against.
-    `matched_phases` The set of matched phases to add to.
+    Returns a mask of the `SinglePhaseKind.phase_bit`s of the matched phases.
     """
-    if terminal.conducting_equipment is None:
+    ce = terminal.conducting_equipment
+    if ce is None:
         raise TraceException(f"Terminal {terminal} did not have an associated ConductingEquipment, cannot get phases.")
-    for phase in candidate_phases:
-        if phase in terminal.phases.single_phases and not open_test(terminal.conducting_equipment, phase):
-            if active_phases(terminal, phase).direction().has(direction):
-                matched_phases.add(phase)
+    matched_mask = 0
+    for phase in ordered_phases_from_mask(candidate_mask & terminal.phases.phase_mask):
+        if not open_test(ce, phase) and active_phases(terminal, phase).direction().has(direction):
+            matched_mask |= phase.phase_bit
+    return matched_mask
 
 
 class TraceException(Exception):
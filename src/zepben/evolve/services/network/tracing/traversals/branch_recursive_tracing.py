@@ -7,7 +7,7 @@
 from zepben.evolve.services.network.tracing.traversals.queue import Queue
 from zepben.evolve.services.network.tracing.traversals.tracing import BaseTraversal
 from zepben.evolve.services.network.tracing.traversals.tracker import Tracker
-from typing import Callable, Set, TypeVar, Optional
+from typing import Callable, Set, TypeVar, Optional, AsyncGenerator, Tuple
 
 __all__ = ["BranchRecursiveTraversal"]
 T = TypeVar('T')
@@ -89,6 +89,17 @@ class BranchRecursiveTraversal(BaseTraversal[T]):
                     self.on_branch_start(t.start_item)
                 await t.trace()
 
+    async def _iterate_branches(self) -> AsyncGenerator[Tuple[T, bool], None]:
+        # Each step of a branch nested d levels deep passes up through d generators, which is why `trace` awaits branches with `traverse_branches`
+        # rather than draining this.
+        while not self.branch_queue.empty():
+            t = self.branch_queue.get()
+            if t is not None:
+                if self.on_branch_start is not None:
+                    self.on_branch_start(t.start_item)
+                async for step in t.iterate():
+                    yield step
+
     def reset(self):
         """Reset the run state, queues and tracker for this this traversal"""
         self._reset_run_flag()
@@ -109,11 +120,16 @@ class BranchRecursiveTraversal(BaseTraversal[T]):
                                           on_branch_start=self.on_branch_start,
                                           process_queue=self.process_queue.copy(),
                                           step_actions=list(self.step_actions),
-                                          stop_conditions=list(self.stop_conditions))
+                                          batch_step_actions=list(self.batch_step_actions),
+                                          stop_conditions=list(self.stop_conditions),
+                                          step_action_concurrency=self.step_action_concurrency)
         branch.reset()
+        if self.stats is not None:
+            self.stats.branches_created += 1
+            branch.stats = self.stats
         return branch
 
-    async def _run_trace(self, can_stop_on_start_item: bool = True):
+    async def _trace_loop(self, can_stop_on_start_item: bool = True):
         """
         Run's the trace. Stop conditions and step_actions are called with await, so you can utilise asyncio when performing a trace if your step actions or
         conditions are IO intensive. Stop conditions and step actions will always be called for each item in the order provided.
@@ -128,20 +144,67 @@ class BranchRecursiveTraversal(BaseTraversal[T]):
                 await self.traverse_branches()
                 return
 
+        get, visit, matches_stop_condition, apply_step_actions, queue_next = self._loop_callables(self.visit, self.queue_next)
+        empty = self.process_queue.empty
+        visited = self.tracker.visited
+
         self.tracker.visit(self.start_item)
+        if self.stats is not None:
+            self.stats.items_visited += 1
         # If we can't stop on the start item we don't run any stop conditions. if this causes a problem for you,
         # work around it by running the stop conditions for the start item prior to running the trace.
-        stopping = can_stop_on_start_item and await self.matches_stop_condition(self.start_item)
-        await self.apply_step_actions(self.start_item, stopping)
+        stopping = can_stop_on_start_item and await matches_stop_condition(self.start_item)
+        await apply_step_actions(self.start_item, stopping)
         if not stopping:
-            self.queue_next(self.start_item, self, self.tracker.visited)
+            queue_next(self.start_item, self, visited)
 
-        while not self.process_queue.empty():
-            current = self.process_queue.get()
-            if self.visit(current):
-                stopping = await self.matches_stop_condition(current)
-                await self.apply_step_actions(current, stopping)
+        while not empty():
+            current = get()
+            if visit(current):
+                stopping = await matches_stop_condition(current)
+                await apply_step_actions(current, stopping)
                 if not stopping:
-                    self.queue_next(current, self, self.tracker.visited)
+                    queue_next(current, self, visited)
 
         await self.traverse_branches()
+
+    async def _traverse(self, can_stop_on_start_item: bool = True) -> AsyncGenerator[Tuple[T, bool], None]:
+        """
+        The same trace as `_trace_loop`, yielding each visited item, including those visited by branches, with its stopping state once its step
+        actions have been applied.
+        `can_stop_on_start_item` Whether the trace can stop on the start_item.
+        """
+        if self.start_item is None:
+            try:
+                self.start_item = self.process_queue.get()
+            except IndexError:
+                async for step in self._iterate_branches():
+                    yield step
+                return
+
+        get, visit, matches_stop_condition, apply_step_actions, queue_next = self._loop_callables(self.visit, self.queue_next)
+        empty = self.process_queue.empty
+        visited = self.tracker.visited
+
+        self.tracker.visit(self.start_item)
+        if self.stats is not None:
+            self.stats.items_visited += 1
+        # If we can't stop on the start item we don't run any stop conditions. if this causes a problem for you,
+        # work around it by running the stop conditions for the start item prior to running the trace.
+        stopping = can_stop_on_start_item and await matches_stop_condition(self.start_item)
+        await apply_step_actions(self.start_item, stopping)
+        yield self.start_item, stopping
+        if not stopping:
+            queue_next(self.start_item, self, visited)
+
+        while not empty():
+            current = get()
+            if visit(current):
+                stopping = await matches_stop_condition(current)
+                await apply_step_actions(current, stopping)
+                yield current, stopping
+                if not stopping:
+                    queue_next(current, self, visited)
+
+        async for step in self._iterate_branches():
+            yield step
@@ -0,0 +1,136 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+from time import perf_counter
+from typing import Dict, Callable, Awaitable, Any
+
+from dataclassy import dataclass
+
+from zepben.evolve.services.network.tracing.traversals.queue import Queue
+
+__all__ = ["TraversalStats", "STOP_CONDITIONS", "STEP_ACTIONS", "QUEUE_NEXT", "QUEUE", "TRACKER"]
+
+STOP_CONDITIONS = "stop_conditions"
+STEP_ACTIONS = "step_actions"
+QUEUE_NEXT = "queue_next"
+QUEUE = "queue"
+TRACKER = "tracker"
+
+
+@dataclass(slots=True)
+class TraversalStats(object):
+    """
+    Counters and timings collected by a `zepben.evolve.traversals.tracing.BaseTraversal` while it runs.
+
+    Statistics are only collected when a `TraversalStats` is assigned to the traversal's `stats` field. A traversal without one runs the
+    uninstrumented code path, so there is no cost to leaving collection disabled. Branches created by a
+    `zepben.evolve.traversals.branch_recursive_tracing.BranchRecursiveTraversal` share the stats of the traversal that created them.
+    """
+
+    items_dequeued: int = 0
+    """The number of items taken off the process queue."""
+
+    items_visited: int = 0
+    """The number of items visited, including the start item of each traversal and branch."""
+
+    revisits_rejected: int = 0
+    """The number of dequeued items that were skipped because the tracker had already visited them."""
+
+    queue_high_water_mark: int = 0
+    """The largest number of items seen waiting on a process queue."""
+
+    branches_created: int = 0
+    """The number of branches created. Only incremented by `BranchRecursiveTraversal`."""
+
+    callback_time: Dict[str, float] = {}
+    """Cumulative seconds spent in each callback category, keyed by one of `STOP_CONDITIONS`, `STEP_ACTIONS`, `QUEUE_NEXT`, `QUEUE` or `TRACKER`."""
+
+    def clear(self):
+        """Reset all counters and timings."""
+        self.items_dequeued = 0
+        self.items_visited = 0
+        self.revisits_rejected = 0
+        self.queue_high_water_mark = 0
+        self.branches_created = 0
+        self.callback_time.clear()
+
+    def time_in(self, category: str) -> float:
+        """
+        `category` The callback category to look up.
+        Returns the cumulative seconds spent in `category`, or 0.0 if nothing has been recorded for it.
+        """
+        return self.callback_time.get(category, 0.0)
+
+    def _record(self, category: str, elapsed: float):
+        self.callback_time[category] = self.callback_time.get(category, 0.0) + elapsed
+
+    def timed(self, category: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """
+        Wrap a synchronous callable so the time spent in it is added to `category`.
+        `category` The callback category to record against.
+        `fn` The callable to wrap.
+        Returns the wrapped callable.
+        """
+        def wrapper(*args):
+            start = perf_counter()
+            try:
+                return fn(*args)
+            finally:
+                self._record(category, perf_counter() - start)
+        return wrapper
+
+    def timed_async(self, category: str, fn: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        """
+        Wrap a coroutine function so the time spent awaiting it is added to `category`.
+        `category` The callback category to record against.
+        `fn` The coroutine function to wrap.
+        Returns the wrapped coroutine function.
+        """
+        async def wrapper(*args):
+            start = perf_counter()
+            try:
+                return await fn(*args)
+            finally:
+                self._record(category, perf_counter() - start)
+        return wrapper
+
+    def counted_get(self, queue: Queue) -> Callable[[], Any]:
+        """
+        Create a `get` for `queue` that counts dequeued items, tracks the high water mark of the queue and times the call against `QUEUE`.
+        `queue` The `zepben.evolve.traversals.queue.Queue` to take items from.
+        """
+        def get():
+            start = perf_counter()
+            try:
+                size = len(queue.queue)
+                if size > self.queue_high_water_mark:
+                    self.queue_high_water_mark = size
+                item = queue.get()
+                self.items_dequeued += 1
+                return item
+            finally:
+                self._record(QUEUE, perf_counter() - start)
+        return get
+
+    def counted_visit(self, visit: Callable[[Any], bool]) -> Callable[[Any], bool]:
+        """
+        Wrap a tracker style `visit` so successful visits and rejected revisits are counted and the call is timed against `TRACKER`.
+        `visit` The visit function to wrap.
+        """
+        def wrapper(item):
+            start = perf_counter()
+            try:
+                visited = visit(item)
+            finally:
+                self._record(TRACKER, perf_counter() - start)
+            if visited:
+                self.items_visited += 1
+            else:
+                self.revisits_rejected += 1
+            return visited
+        return wrapper
@@ -5,7 +5,9 @@
 #  file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
 from __future__ import annotations
+import asyncio
 from abc import abstractmethod
+from collections import deque
 
 from dataclassy import dataclass
 
@@ -13,10 +15,11 @@ from dataclassy import dataclass
 from zepben.evolve.services.network.tracing.traversals.queue import FifoQueue, LifoQueue, PriorityQueue, Queue
 from zepben.evolve.exceptions import TracingException
 from zepben.evolve.services.network.tracing.traversals.tracker import Tracker
-from typing import List, Callable, Awaitable, TypeVar, Generic, Set, Iterable
+from zepben.evolve.services.network.tracing.traversals.stats import TraversalStats, STOP_CONDITIONS, STEP_ACTIONS, QUEUE_NEXT, QUEUE
+from typing import List, Callable, Awaitable, TypeVar, Generic, Set, Iterable, Optional, Tuple, AsyncGenerator, Generator
 from enum import Enum
 
-__all__ = ["SearchType", "create_queue", "BaseTraversal", "Traversal"]
+__all__ = ["SearchType", "create_queue", "BatchStepAction", "BaseTraversal", "Traversal"]
 T = TypeVar('T')
 
 
@@ -35,6 +38,129 @@ def create_queue(search_type):
         return PriorityQueue()
 
 
+class _ConcurrentStepActions(object):
+    """
+    Applies the step actions for each item as its own task so IO bound actions for consecutive items can overlap. At most `limit` items have actions
+    in flight at once, and the tasks are always awaited in the order they were dispatched, so results and errors surface in traversal order.
+    """
+    __slots__ = ["_apply", "_limit", "_pending"]
+
+    def __init__(self, apply: Callable[[T, bool], Awaitable[None]], limit: int):
+        self._apply = apply
+        self._limit = limit
+        self._pending = deque()
+
+    async def __call__(self, item: T, is_stopping: bool):
+        self._pending.append(asyncio.ensure_future(self._apply(item, is_stopping)))
+        if len(self._pending) >= self._limit:
+            try:
+                await self._pending.popleft()
+            except BaseException:
+                self.cancel()
+                raise
+
+    async def drain(self):
+        """Wait for all dispatched step actions to complete, in the order they were dispatched."""
+        try:
+            while self._pending:
+                await self._pending.popleft()
+        except BaseException:
+            self.cancel()
+            raise
+
+    def cancel(self):
+        """Cancel any step actions that are still in flight."""
+        while self._pending:
+            self._pending.popleft().cancel()
+
+
+@dataclass(slots=True)
+class BatchStepAction(Generic[T]):
+    """
+    A step action that is called with chunks of visited items rather than once per item, so actions that write into arrays or issue bulk queries can
+    amortise their per-call overhead. Each batch is a list of (item, is_stopping) tuples in the order the items were visited.
+    """
+
+    action: Callable[[List[Tuple[T, bool]]], Awaitable[None]]
+    """The callback to pass each batch to. It will be awaited."""
+
+    batch_size: int = 4096
+    """The maximum number of items in a batch. A batch is passed to `action` as soon as it reaches this size."""
+
+    per_level: bool = False
+    """Also pass the batch to `action` at the end of each level of a breadth first search. Only supported by traversals using a `FifoQueue`."""
+
+
+class _BatchedStepActions(object):
+    """
+    Buffers visited items for each `BatchStepAction` of a run after applying the per item step actions. When any action flushes per level, the level
+    of the breadth first search is tracked by counting down the items queued for the current level as they are taken off the queue. When the per
+    item step actions run concurrently, `drain` is awaited before each batch is passed on so every item in it has finished its step actions.
+    """
+    __slots__ = ["_apply", "_drain", "_actions", "_sizes", "_per_level", "_buffers", "_level", "_buffer_level", "_remaining"]
+
+    def __init__(self,
+                 apply: Optional[Callable[[T, bool], Awaitable[None]]],
+                 batches: List[BatchStepAction[T]],
+                 stats: Optional[TraversalStats],
+                 drain: Optional[Callable[[], Awaitable[None]]] = None):
+        self._apply = apply
+        self._drain = drain
+        self._actions = [b.action if stats is None else stats.timed_async(STEP_ACTIONS, b.action) for b in batches]
+        self._sizes = [b.batch_size for b in batches]
+        self._per_level = [i for i, b in enumerate(batches) if b.per_level]
+        self._buffers = [[] for _ in batches]
+        self._level = 0
+        self._buffer_level = 0
+        self._remaining = 0
+
+    @property
+    def tracks_levels(self) -> bool:
+        return bool(self._per_level)
+
+    def level_get(self, queue: Queue, get: Callable[[], T]) -> Callable[[], T]:
+        """
+        Wrap the `get` of a `FifoQueue` to track which level of the search each dequeued item belongs to.
+        `queue` The queue items are taken from.
+        `get` The function that takes the next item from `queue`.
+        """
+        def wrapper():
+            if self._remaining == 0:
+                self._level += 1
+                self._remaining = len(queue.queue)
+            self._remaining -= 1
+            return get()
+        return wrapper
+
+    async def __call__(self, item: T, is_stopping: bool):
+        if self._apply is not None:
+            await self._apply(item, is_stopping)
+
+        if self._per_level and self._level != self._buffer_level:
+            self._buffer_level = self._level
+            for i in self._per_level:
+                await self._flush(i)
+
+        step = (item, is_stopping)
+        for i, buffer in enumerate(self._buffers):
+            buffer.append(step)
+            if len(buffer) >= self._sizes[i]:
+                await self._flush(i)
+
+    async def _flush(self, i: int):
+        buffer = self._buffers[i]
+        if buffer:
+            self._buffers[i] = []
+            if self._drain is not None:
+                await self._drain()
+            await self._actions[i](buffer)
+
+    async def flush(self):
+        """Pass any partially filled batches to their actions."""
+        for i in range(len(self._buffers)):
+            await self._flush(i)
+
+
 @dataclass(slots=True)
 class BaseTraversal(Generic[T]):
     """
@@ -52,6 +178,18 @@ class BaseTraversal(Generic[T]):
     passed the current `zepben.evolve.network.tracing.connectivity.ConnectivityResult` as well as the `stopping` state (True if the trace is stopping after
     the current `ConnectivityResult, False otherwise). Thus, the signature of each step action must be:
     :func: action(cr: `zepben.evolve.tracing.ConnectivityResult`, is_stopping: bool) -> None
+
+    Statistics about a run (items visited, queue high water mark, time spent in each type of callback etc.) can be collected by assigning a
+    `zepben.evolve.traversals.stats.TraversalStats` to `stats`. When `stats` is None the traversal runs without any instrumentation.
+
+    If your step actions are IO bound, setting `step_action_concurrency` above 1 will dispatch the step actions of up to that many items
+    concurrently. Stop conditions and queuing are still evaluated in order for each item, so the traversal order and stopping behaviour are
+    unchanged, and the step actions for a single item are still called in the order they were added.
+
+    Batch step actions (`BatchStepAction`) are passed chunks of visited items and their stopping state, either every `batch_size` items or at the end
+    of each level of a breadth first search, which allows vectorised post processing of the trace. They are awaited in the trace loop once the step
+    actions of every item in the batch have completed, including any still in flight when `step_action_concurrency` is above 1, and any partial
+    batches are passed on once the trace completes.
     """
     start_item: T = None
     """The starting item for this `BaseTraversal`"""
@@ -62,12 +200,30 @@ class BaseTraversal(Generic[T]):
     step_actions: List[Callable[[T, bool], Awaitable[None]]] = []
     """A list of callback functions, to be called on each item."""
 
+    batch_step_actions: List[BatchStepAction[T]] = []
+    """A list of `BatchStepAction`s, to be called with chunks of visited items."""
+
+    stats: Optional[TraversalStats] = None
+    """Statistics collected while tracing. Collection is disabled when this is None. Cleared by `reset`."""
+
+    stats_hook: Optional[Callable[[TraversalStats], None]] = None
+    """A callback passed `stats` each time a trace completes, e.g. to publish the statistics to a metrics pipeline. Only called if `stats` is set."""
+
+    step_action_concurrency: int = 1
+    """The maximum number of items that can have step actions in flight at once. 1 awaits the step actions of each item before continuing."""
+
     _has_run: bool = False
     """Whether this traversal has run """
 
     _running: bool = False
     """Whether this traversal is currently running"""
 
+    _in_flight: Optional[_ConcurrentStepActions] = None
+    """The dispatcher for step actions of the current run when `step_action_concurrency` is greater than 1."""
+
+    _batched: Optional[_BatchedStepActions] = None
+    """The buffers for the batch step actions of the current run."""
+
     async def matches_stop_condition(self, item: T):
         """
         Checks all the stop conditions for the passed in item and returns true if any match.
@@ -104,6 +260,21 @@ class BaseTraversal(Generic[T]):
         self.step_actions.append(action)
         return self
 
+    def add_batch_step_action(self, action: Callable[[List[Tuple[T, bool]]], Awaitable[None]], batch_size: int = 4096,
+                              per_level: bool = False) -> BaseTraversal[T]:
+        """
+        Add a callback which is called with chunks of visited items (including the starting item) and their stopping state.
+
+        `action` Action to be called with each list of (item, is_stopping) tuples.
+        `batch_size` The maximum number of items passed to `action` at once.
+        `per_level` Whether to also call `action` at the end of each level of a breadth first search. Requires a `FifoQueue`.
+        Returns this traversal instance.
+        """
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be at least 1, got {batch_size}.")
+        self.batch_step_actions.append(BatchStepAction(action, batch_size, per_level))
+        return self
+
     def copy_stop_conditions(self, other: BaseTraversal[T]):
         """Copy the stop conditions from `other` to this `BaseTraversal`."""
         self.stop_conditions.extend(other.stop_conditions)
@@ -117,8 +288,9 @@ class BaseTraversal(Generic[T]):
         self.stop_conditions.clear()
 
     def clear_step_actions(self):
-        """Clear all step actions"""
+        """Clear all step actions, including batch step actions."""
         self.step_actions.clear()
+        self.batch_step_actions.clear()
 
     async def apply_step_actions(self, item: T, is_stopping: bool):
         """
@@ -134,6 +306,41 @@ class BaseTraversal(Generic[T]):
         if self._running:
             raise TracingException("Can't reset when Traversal is currently executing.")
         self._has_run = False
+        if self.stats is not None:
+            self.stats.clear()
+
+    def _loop_callables(self, visit: Callable[[T], bool], queue_next: Callable) -> Tuple[Callable, Callable, Callable, Callable, Callable]:
+        """
+        Select the callables used by the main loop of a trace. If `stats` is set these are wrapped to record counters and timings, otherwise
+        the plain callables are returned so an uninstrumented trace pays nothing for the feature.
+        `visit` The function used to mark an item as visited.
+        `queue_next` The queue next function of the traversal.
+        Returns a tuple of (get, visit, matches_stop_condition, apply_step_actions, queue_next).
+        """
+        stats = self.stats
+        apply_step_actions = self.apply_step_actions if stats is None else stats.timed_async(STEP_ACTIONS, self.apply_step_actions)
+        if self.step_action_concurrency > 1:
+            self._in_flight = _ConcurrentStepActions(apply_step_actions, self.step_action_concurrency)
+            apply_step_actions = self._in_flight
+
+        get = self.process_queue.get if stats is None else stats.counted_get(self.process_queue)
+        if self.batch_step_actions:
+            self._batched = _BatchedStepActions(apply_step_actions if self.step_actions else None, self.batch_step_actions, stats,
+                                                self._in_flight.drain if self._in_flight is not None else None)
+            apply_step_actions = self._batched
+            if self._batched.tracks_levels:
+                if not isinstance(self.process_queue, FifoQueue):
+                    raise TracingException("Batch step actions can only be flushed per level by a breadth first traversal using a FifoQueue.")
+                get = self._batched.level_get(self.process_queue, get)
+
+        if stats is None:
+            return get, visit, self.matches_stop_condition, apply_step_actions, queue_next
+
+        return (get,
+                stats.counted_visit(visit),
+                stats.timed_async(STOP_CONDITIONS, self.matches_stop_condition),
+                apply_step_actions,
+                stats.timed(QUEUE_NEXT, queue_next))
 
     @abstractmethod
     def reset(self):
@@ -151,6 +358,55 @@ class BaseTraversal(Generic[T]):
                            which allows tracing over the terminals in a network.
         `can_stop_on_start_item` If it's possible for stop conditions to apply to the start_item.
         """
+        self._start_run(start_item)
+        await self._run_trace(can_stop_on_start_item)
+        self._finish_run()
+
+    async def iterate(self, start_item: T = None, can_stop_on_start_item: bool = True) -> AsyncGenerator[Tuple[T, bool], None]:
+        """
+        Perform the same trace as `trace`, but lazily yield each visited item as it is reached rather than only reporting it to the step actions.
+        Stop conditions and step actions are still called for every item before it is yielded, and the next items are only queued once the consumer
+        asks for the next value, so breaking out of the loop stops the trace. When `step_action_concurrency` is above 1, the step actions of a yielded
+        item may still be in flight, but all of them will have completed when the generator finishes.
+
+        If you stop iterating early, close the generator (`await steps.aclose()`) before calling `reset`, as the traversal is considered running
+        until the generator has been closed. Any partial batches for batch step actions are discarded when the generator is closed early.
+
+        `start_item` The starting point.
+        `can_stop_on_start_item` If it's possible for stop conditions to apply to the start_item.
+        Returns an async generator of (item, is_stopping) tuples, where is_stopping is True if the trace will not continue past the item.
+        """
+        self._start_run(start_item)
+        try:
+            async for step in self._traverse(can_stop_on_start_item):
+                yield step
+            await self._drain_step_actions()
+        finally:
+            self._cancel_step_actions()
+            self._finish_run()
+
+    def iterate_sync(self, start_item: T = None, can_stop_on_start_item: bool = True) -> Generator[Tuple[T, bool], None, None]:
+        """
+        A synchronous equivalent of `iterate`. The async stop conditions and step actions are driven on a private event loop, so this must not be
+        called from code that is already running inside an event loop.
+
+        `start_item` The starting point.
+        `can_stop_on_start_item` If it's possible for stop conditions to apply to the start_item.
+        Returns a generator of (item, is_stopping) tuples, where is_stopping is True if the trace will not continue past the item.
+        """
+        loop = asyncio.new_event_loop()
+        steps = self.iterate(start_item, can_stop_on_start_item)
+        try:
+            while True:
+                try:
+                    yield loop.run_until_complete(steps.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            loop.run_until_complete(steps.aclose())
+            loop.close()
+
+    def _start_run(self, start_item: Optional[T]):
         if self._running:
             raise TracingException("Traversal is already running.")
 
@@ -160,15 +416,49 @@ class BaseTraversal(Generic[T]):
         self._running = True
         self._has_run = True
         self.start_item = start_item if start_item is not None else self.start_item
-        await self._run_trace(can_stop_on_start_item)
+
+    def _finish_run(self):
         self._running = False
+        if self.stats is not None and self.stats_hook is not None:
+            self.stats_hook(self.stats)
 
-    @abstractmethod
     async def _run_trace(self, can_stop_on_start_item: bool = True):
         """
-        Extend and implement your tracing algorithm here.
-        `start_item` The starting object to commence tracing. Must implement :func:`zepben.evolve.ConductingEquipment.get_connectivity`
-        `can_stop_on_start_item` Whether to
+        Run the trace to completion with `_trace_loop`, then pass on any partial batches and wait for any step actions still in flight.
+        `can_stop_on_start_item` Whether the trace can stop on the start_item.
+        """
+        try:
+            await self._trace_loop(can_stop_on_start_item)
+            await self._drain_step_actions()
+        finally:
+            self._cancel_step_actions()
+
+    async def _drain_step_actions(self):
+        if self._batched is not None:
+            await self._batched.flush()
+        if self._in_flight is not None:
+            await self._in_flight.drain()
+
+    def _cancel_step_actions(self):
+        self._batched = None
+        if self._in_flight is not None:
+            self._in_flight.cancel()
+            self._in_flight = None
+
+    @abstractmethod
+    async def _trace_loop(self, can_stop_on_start_item: bool = True):
+        """
+        Extend and implement your tracing algorithm here. This is awaited directly by `trace`, so it shouldn't pay for yielding each item.
+        `can_stop_on_start_item` Whether the trace can stop on the start_item.
+        """
+        raise NotImplementedError()
+
+    @abstractmethod
+    def _traverse(self, can_stop_on_start_item: bool = True) -> AsyncGenerator[Tuple[T, bool], None]:
+        """
+        Implement the same algorithm as `_trace_loop` as an async generator for `iterate`. Each visited item must be yielded as an (item, is_stopping)
+        tuple after its stop conditions have been checked and its step actions applied.
+        `can_stop_on_start_item` Whether the trace can stop on the start_item.
         """
         raise NotImplementedError()
 
@@ -199,7 +489,7 @@ class Traversal(BaseTraversal):
     tracker: Tracker = Tracker()
     """A `zepben.evolve.traversals.tracker.Tracker` for tracking which items have been seen. If not provided a `Tracker` will be created for this trace."""
 
-    async def _run_trace(self, can_stop_on_start_item: bool = True):
+    async def _trace_loop(self, can_stop_on_start_item: bool = True):
         """
         Run's the trace. Stop conditions and step_actions are called with await, so you can utilise asyncio when
         performing a trace if your step actions or conditions are IO intensive. Stop conditions and
@@ -207,35 +497,73 @@ class Traversal(BaseTraversal):
         `can_stop_on_start_item` Whether the trace can stop on the start_item. Actions will still be applied to
                                        the start_item.
         """
-        if self.start_item is None:
-            try:
-                self.start_item = self.process_queue.get()
-            except IndexError:
-                raise TracingException("Starting item wasn't specified and the process queue is empty. Cannot start the trace.")
+        self._take_start_item()
+        get, visit, matches_stop_condition, apply_step_actions, queue_next = self._loop_callables(self.tracker.visit, self.queue_next)
+        put = self.process_queue.put if self.stats is None else self.stats.timed(QUEUE, self.process_queue.put)
+        empty = self.process_queue.empty
+        visited = self.tracker.visited
+
+        visit(self.start_item)
+        # If we can't stop on the start item we don't run any stop conditions. if this causes a problem for you,
+        # you should run the stop conditions for the start item prior to running the traversal.
+        stopping = can_stop_on_start_item and await matches_stop_condition(self.start_item)
+        await apply_step_actions(self.start_item, stopping)
+        if not stopping:
+            for x in queue_next(self.start_item, visited):
+                put(x)
+
+        while not empty():
+            current = get()
+            if visit(current):
+                stopping = await matches_stop_condition(current)
+                await apply_step_actions(current, stopping)
+                if not stopping:
+                    for x in queue_next(current, visited):
+                        put(x)
+
+    async def _traverse(self, can_stop_on_start_item: bool = True) -> AsyncGenerator[Tuple[T, bool], None]:
+        """
+        The same trace as `_trace_loop`, yielding each visited item with its stopping state once its step actions have been applied.
+        `can_stop_on_start_item` Whether the trace can stop on the start_item.
+        """
+        self._take_start_item()
+        get, visit, matches_stop_condition, apply_step_actions, queue_next = self._loop_callables(self.tracker.visit, self.queue_next)
+        put = self.process_queue.put if self.stats is None else self.stats.timed(QUEUE, self.process_queue.put)
+        empty = self.process_queue.empty
+        visited = self.tracker.visited
 
-        self.tracker.visit(self.start_item)
+        visit(self.start_item)
         # If we can't stop on the start item we don't run any stop conditions. if this causes a problem for you,
         # you should run the stop conditions for the start item prior to running the traversal.
-        stopping = can_stop_on_start_item and await self.matches_stop_condition(self.start_item)
-        await self.apply_step_actions(self.start_item, stopping)
+        stopping = can_stop_on_start_item and await matches_stop_condition(self.start_item)
+        await apply_step_actions(self.start_item, stopping)
+        yield self.start_item, stopping
         if not stopping:
-            for x in self.queue_next(self.start_item, self.tracker.visited):
-                self.process_queue.put(x)
-
-        while not self.process_queue.empty():
-            current = self.process_queue.get()
-            if self.tracker.visit(current):
-                stopping = await self.matches_stop_condition(current)
-                await self.apply_step_actions(current, stopping)
+            for x in queue_next(self.start_item, visited):
+                put(x)
+
+        while not empty():
+            current = get()
+            if visit(current):
+                stopping = await matches_stop_condition(current)
+                await apply_step_actions(current, stopping)
+                yield current, stopping
                 if not stopping:
-                    for x in self.queue_next(current, self.tracker.visited):
-                        self.process_queue.put(x)
+                    for x in queue_next(current, visited):
+                        put(x)
 
     def reset(self):
         self._reset_run_flag()
         self.process_queue.queue.clear()
         self.tracker.clear()
 
+    def _take_start_item(self):
+        if self.start_item is None:
+            try:
+                self.start_item = self.process_queue.get()
+            except IndexError:
+                raise TracingException("Starting item wasn't specified and the process queue is empty. Cannot start the trace.")
+
 
 def _depth_trace(start_item, stop_on_start_item=True, stop_fn=None, equip_fn=None, term_fn=None):
     equips_to_trace = []
@@ -0,0 +1,191 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from __future__ import annotations
+
+from typing import List, Optional, Tuple, Type, Union
+
+from zepben.evolve.model.cim.iec61970.base.core.conducting_equipment import ConductingEquipment
+from zepben.evolve.model.cim.iec61970.base.core.terminal import Terminal
+from zepben.evolve.model.cim.iec61970.base.wires.switch import ProtectedSwitch, Fuse
+from zepben.evolve.model.phasedirection import PhaseDirection
+from zepben.evolve.services.network.tracing.downstream_tree import DownstreamTree
+from zepben.evolve.services.network.tracing.phases.phase_status import normal_phases, current_phases
+from zepben.evolve.services.network.tracing.traces import get_phases_with_direction
+from zepben.evolve.services.network.tracing.util import normally_open, currently_open
+
+__all__ = ["UpstreamIndex"]
+
+# The upstream slot of a terminal that is fed directly by a source, and of a terminal that isn't energised.
+_SOURCE = -1
+_UNREACHED = -2
+
+
+class UpstreamIndex(object):
+    """
+    An index of the terminal each terminal of a phased network is fed from in either the normal or current state, derived from the phase directions
+    held in `NetworkService.phase_statuses`. Queries for the path back to a source or the nearest upstream protection device walk the index, taking
+    time proportional to the depth of the terminal rather than running a trace.
+
+    The index is rebuilt on the next query after any status in `NetworkService.phase_statuses` changes, such as when the network is re-phased.
+    It follows the `DownstreamTree` of the network, so each terminal phases flow out of is fed through its equipment from the terminal the tree
+    feeds that equipment through, and any other terminal is fed from the terminal phases flow into it from. A terminal fed from more than one
+    direction, such as around a closed loop, has a single upstream terminal, preferring the path through its own equipment.
+    """
+    __slots__ = ["network", "current", "_version", "_upstream"]
+
+    def __init__(self, network: NetworkService, current: bool = False):
+        """
+        `network` The network to index.
+        `current` Whether to follow the current phases rather than the normal phases.
+        """
+        self.network = network
+        self.current = current
+        self._version = -1
+        # The slot of the upstream terminal of each terminal, indexed by the slot of the terminal in the phase status store.
+        self._upstream: List[int] = []
+
+    @property
+    def is_stale(self) -> bool:
+        """True if the phases have changed since the index was last built, in which case it is rebuilt by the next query."""
+        return self._version != self.network.phase_statuses.version
+
+    def upstream_terminal(self, terminal: Terminal) -> Optional[Terminal]:
+        """
+        `terminal` The terminal to check.
+        Returns the terminal `terminal` is fed from, which is either a terminal it is connected to or another terminal of its equipment, or None if it
+        is fed directly from a source or isn't energised.
+        """
+        upstream = self._ensure()
+        slot = self._slot(terminal)
+        if slot is None or upstream[slot] < 0:
+            return None
+        return self.network.phase_statuses.owner(upstream[slot])
+
+    def is_energised(self, item: Union[Terminal, ConductingEquipment]) -> bool:
+        """
+        `item` The terminal or equipment to check.
+        Returns True if `item` is fed from a source.
+        """
+        return self._start_slot(item, self._ensure()) is not None
+
+    def path_to_source(self, item: Union[Terminal, ConductingEquipment]) -> List[Terminal]:
+        """
+        Get the terminals between `item` and the source feeding it.
+        `item` The terminal or equipment to start from. Equipment starts from the terminal it is fed through.
+        Returns the terminals from `item` up to the terminal of the source, or an empty list if `item` isn't energised.
+        """
+        upstream = self._ensure()
+        slot = self._start_slot(item, upstream)
+        if slot is None:
+            return []
+
+        owner = self.network.phase_statuses.owner
+        path = [owner(slot)]
+        while upstream[slot] >= 0:
+            slot = upstream[slot]
+            path.append(owner(slot))
+        return path
+
+    def equipment_path_to_source(self, item: Union[Terminal, ConductingEquipment]) -> List[ConductingEquipment]:
+        """
+        Get the equipment between `item` and the source feeding it.
+        `item` The terminal or equipment to start from.
+        Returns the equipment from that of `item` up to the source, or an empty list if `item` isn't energised.
+        """
+        path = []
+        for terminal in self.path_to_source(item):
+            ce = terminal.conducting_equipment
+            if not path or path[-1] is not ce:
+                path.append(ce)
+        return path
+
+    def source(self, item: Union[Terminal, ConductingEquipment]) -> Optional[ConductingEquipment]:
+        """
+        `item` The terminal or equipment to check.
+        Returns the source feeding `item`, or None if it isn't energised.
+        """
+        path = self.path_to_source(item)
+        return path[-1].conducting_equipment if path else None
+
+    def upstream_protection_device(self, item: Union[Terminal, ConductingEquipment],
+                                   device_types: Tuple[Type[ConductingEquipment], ...] = (ProtectedSwitch, Fuse)) -> Optional[ConductingEquipment]:
+        """
+        Find the nearest protection device `item` is fed through.
+        `item` The terminal or equipment to start from. The equipment of `item` itself is not considered.
+        `device_types` The types of equipment that count as protection devices. Defaults to breakers, reclosers and fuses.
+        Returns the nearest upstream protection device, or None if there isn't one or `item` isn't energised.
+        """
+        start = item.conducting_equipment if isinstance(item, Terminal) else item
+        for ce in self.equipment_path_to_source(item):
+            if ce is not start and isinstance(ce, device_types):
+                return ce
+        return None
+
+    def _slot(self, terminal: Terminal) -> Optional[int]:
+        traced_phases = terminal.traced_phases
+        return traced_phases.slot if traced_phases.store is self.network.phase_statuses else None
+
+    def _start_slot(self, item: Union[Terminal, ConductingEquipment], upstream: List[int]) -> Optional[int]:
+        terminals = [item] if isinstance(item, Terminal) else item.terminals
+        for terminal in terminals:
+            slot = self._slot(terminal)
+            if slot is not None and upstream[slot] != _UNREACHED:
+                # Prefer the terminal equipment is fed through over the terminals it feeds out of, which are fed from it.
+                parent = upstream[slot]
+                if parent < 0 or self.network.phase_statuses.owner(parent).conducting_equipment is not terminal.conducting_equipment:
+                    return slot
+        for terminal in terminals:
+            slot = self._slot(terminal)
+            if slot is not None and upstream[slot] != _UNREACHED:
+                return slot
+        return None
+
+    def _reached_slot(self, terminal: Terminal, upstream: List[int]) -> Optional[int]:
+        slot = self._slot(terminal)
+        return slot if slot is not None and upstream[slot] != _UNREACHED else None
+
+    def _ensure(self) -> List[int]:
+        store = self.network.phase_statuses
+        if self._version != store.version:
+            self._upstream = self._build()
+            self._version = store.version
+        return self._upstream
+
+    def _build(self) -> List[int]:
+        # The tree records the terminals phases flow between equipment through, so only the flow through each piece of equipment is added here.
+        tree = DownstreamTree(self.network, self.current)
+        open_test, phase_selector = (currently_open, current_phases) if self.current else (normally_open, normal_phases)
+        upstream = [_UNREACHED] * len(self.network.phase_statuses)
+
+        def feed(terminal, from_slot):
+            slot = self._slot(terminal)
+            if slot is not None and from_slot is not None and upstream[slot] == _UNREACHED:
+                upstream[slot] = from_slot
+
+        def is_out(terminal):
+            return get_phases_with_direction(open_test, phase_selector, terminal, terminal.phases.phase_mask, PhaseDirection.OUT) != 0
+
+        # The equipment of the tree is numbered in breadth first order from the sources.
+        for i in range(len(tree)):
+            fed_through = tree.feed_terminals(i)
+            if fed_through is None:
+                in_slot, in_terminal = _SOURCE, None
+            else:
+                from_terminal, in_terminal = fed_through
+                feed(in_terminal, self._reached_slot(from_terminal, upstream))
+                in_slot = self._reached_slot(in_terminal, upstream)
+                if in_slot is None:
+                    continue
+            for terminal in tree.equipment_at(i).terminals:
+                if terminal is not in_terminal and is_out(terminal):
+                    feed(terminal, in_slot)
+
+        # Terminals that phases only flow into from outside the tree, such as the far side of an open switch at the end of a loop.
+        for from_terminal, to_terminal in tree.extra_feed_terminals:
+            feed(to_terminal, self._reached_slot(from_terminal, upstream))
+
+        return upstream
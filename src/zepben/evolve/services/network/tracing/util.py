@@ -6,12 +6,17 @@
 
 from __future__ import annotations
 import logging
+from zepben.evolve.model.cim.iec61970.base.wires.energy_source import EnergySource
+from zepben.evolve.model.cim.iec61970.base.wires.single_phase_kind import ordered_phases_from_mask
+from zepben.evolve.services.network.tracing.connectivity import get_connected_equipment
+from zepben.evolve.services.network.tracing.trace_events import trace_events
 from zepben.evolve.services.network.tracing.traversals.tracing import Traversal
 from zepben.evolve.services.network.tracing.traversals.queue import LifoQueue
 from zepben.evolve.services.network.tracing.phases.phase_status import normal_phases, current_phases
 
-__all__ = ["normally_open", "currently_open", "ignore_open", "phase_log"]
+__all__ = ["normally_open", "currently_open", "ignore_open", "is_closed", "is_source", "phase_log"]
 phase_logger = logging.getLogger("phase_logger")
+_events = trace_events("queue_next")
 
 
 def normally_open(equip: ConductingEquipment, phase: Optional[SinglePhaseKind] = None):
@@ -50,6 +55,31 @@ def ignore_open(ce: ConductingEquipment, phase: Optional[SinglePhaseKind] = None
     return False
 
 
+def is_closed(ce: ConductingEquipment, open_test: Callable[[ConductingEquipment, Optional[SinglePhaseKind]], bool]) -> bool:
+    """
+    Test if a piece of equipment is closed on any of its phases.
+    `ce` The equipment to test.
+    `open_test` Function that takes a piece of equipment and a phase and returns whether it is open on that phase.
+    Returns True if `ce` is closed on at least one of the phases of its terminals, False if it is open on all of them.
+    """
+    # Equipment with no open phases is closed, which saves checking each phase of everything other than open switches.
+    if not open_test(ce, None):
+        return True
+    mask = 0
+    for t in ce.terminals:
+        mask |= t.phases.phase_mask
+    return any(not open_test(ce, phase) for phase in ordered_phases_from_mask(mask))
+
+
+def is_source(ce: ConductingEquipment) -> bool:
+    """
+    Test if a piece of equipment is a source of supply.
+    `ce` The equipment to test.
+    Returns True if `ce` is an `EnergySource` with at least one phase.
+    """
+    return isinstance(ce, EnergySource) and ce.num_phases() > 0
+
+
 async def phase_log(cond_equip):
     msg = ""
     try:
@@ -82,6 +112,7 @@ async def _phase_log_trace(cond_equip):
 
 
 def queue_next_equipment(item, exclude=None):
-    connected_equips = item.get_connected_equipment(exclude=exclude)
-    tracing_logger.debug(f"Queuing connections [{', '.join(e.mrid for e in connected_equips)}] from {item.mrid}")
+    connected_equips = get_connected_equipment(item, exclude=exclude)
+    if _events.enabled:
+        _events.emit("queued", source=item.mrid, queued=[e.mrid for e in connected_equips])
     return connected_equips
@@ -0,0 +1,198 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+"""
+Microbenchmark for the cost of the debug output in the tracing queue functions.
+
+Compares the previous eagerly formatted debug logging against the guarded trace events, both disabled and enabled with a sink that discards the
+events. The debug output alone and each queue function are timed for a step from every item of a large network, followed by complete terminal and
+equipment traces of the network, which are the end to end numbers that matter.
+
+The traces track visited items by identity. Every `IdentifiedObject` currently has the same hash, so the default `Tracker` makes a trace quadratic
+in the size of the network, which would swamp the cost of the debug output being measured.
+
+Run with `python test/bench_trace_events.py [num_junctions] [repeats]`.
+"""
+
+import asyncio
+import gc
+import logging
+import sys
+from time import perf_counter
+from typing import Callable, List
+
+from zepben.evolve import NetworkService, Junction, Terminal, ConductingEquipment, Traversal, FifoQueue, Tracker, queue_next_terminal, \
+    enable_trace_events, disable_trace_events, trace_events
+from zepben.evolve.services.network.tracing.connectivity import get_connectivity, get_connected_equipment
+from zepben.evolve.services.network.tracing.util import queue_next_equipment
+
+legacy_logger = logging.getLogger("legacy_queue_next")
+events = trace_events("queue_next")
+
+
+def legacy_queue_next_terminal(item, exclude=None):
+    """`queue_next_terminal` from before trace events, which formatted its debug message on every call."""
+    other_terms = item.get_other_terminals()
+    if not other_terms:
+        to_terms = [cr.to_terminal for cr in get_connectivity(item, exclude=exclude)]
+        if len(to_terms) > 0:
+            legacy_logger.debug(f"Queuing {to_terms[0].mrid} from single terminal equipment {item.mrid}")
+        return to_terms
+
+    crs = []
+    for term in other_terms:
+        crs.extend(get_connectivity(term, exclude=exclude))
+
+    to_terms = [cr.to_terminal for cr in crs]
+    legacy_logger.debug(f"Queuing terminals: [{', '.join(t.mrid for t in to_terms)}] from {item.mrid}")
+    return to_terms
+
+
+def legacy_queue_next_equipment(item, exclude=None):
+    """`queue_next_equipment` from before trace events, which formatted its debug message on every call."""
+    connected_equips = get_connected_equipment(item, exclude=exclude)
+    legacy_logger.debug(f"Queuing connections [{', '.join(e.mrid for e in connected_equips)}] from {item.mrid}")
+    return connected_equips
+
+
+def legacy_log_step(item, to_terms):
+    legacy_logger.debug(f"Queuing terminals: [{', '.join(t.mrid for t in to_terms)}] from {item.mrid}")
+
+
+def guarded_log_step(item, to_terms):
+    if events.enabled:
+        events.emit("queued", source=item.mrid, queued=[t.mrid for t in to_terms])
+
+
+def build_network(num_junctions: int) -> NetworkService:
+    """A feeder of `num_junctions` two terminal junctions, with a single junction spur off every 10th junction."""
+    network = NetworkService()
+    previous = None
+    for i in range(num_junctions):
+        junction = Junction(f"j{i}")
+        network.add(junction)
+        for seq in (1, 2):
+            t = Terminal(f"j{i}-t{seq}", conducting_equipment=junction, sequence_number=seq)
+            junction.add_terminal(t)
+            network.add(t)
+        if previous is not None:
+            network.connect_terminals(previous, junction.get_terminal_by_sn(1))
+        previous = junction.get_terminal_by_sn(2)
+
+        if i % 10 == 0:
+            spur = Junction(f"s{i}")
+            st = Terminal(f"s{i}-t1", conducting_equipment=spur, sequence_number=1)
+            spur.add_terminal(st)
+            network.add(spur)
+            network.add(st)
+            network.connect_terminals(previous, st)
+    return network
+
+
+def time_steps(items: List, queue_next: Callable, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        gc.disable()
+        start = perf_counter()
+        for item in items:
+            queue_next(item, set())
+        best = min(best, perf_counter() - start)
+        gc.enable()
+    return best
+
+
+def time_log_steps(steps: List, log_step: Callable, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        gc.disable()
+        start = perf_counter()
+        for item, to_terms in steps:
+            log_step(item, to_terms)
+        best = min(best, perf_counter() - start)
+        gc.enable()
+    return best
+
+
+class IdentitySet(object):
+    """The subset of `set` used by a `Traversal` for its visited items, keyed by identity."""
+    __slots__ = ["_ids"]
+
+    def __init__(self):
+        self._ids = set()
+
+    def __contains__(self, item):
+        return id(item) in self._ids
+
+    def add(self, item):
+        self._ids.add(id(item))
+
+    def clear(self):
+        self._ids.clear()
+
+
+def time_trace(start_item, queue_next: Callable, repeats: int) -> float:
+    loop = asyncio.get_event_loop()
+    best = float("inf")
+    for _ in range(repeats):
+        t = Traversal(queue_next=queue_next, start_item=start_item, process_queue=FifoQueue(), tracker=Tracker(visited=IdentitySet()))
+        gc.disable()
+        start = perf_counter()
+        loop.run_until_complete(t.trace())
+        best = min(best, perf_counter() - start)
+        gc.enable()
+    return best
+
+
+def compare(name: str, legacy: Callable, guarded: Callable[[], float]):
+    events = [0]
+
+    def count(source, event, fields):
+        events[0] += 1
+
+    # Alternate the runs so drift in the speed of the machine affects both equally.
+    legacy_time = disabled_time = float("inf")
+    for _ in range(5):
+        legacy_time = min(legacy_time, legacy())
+        disabled_time = min(disabled_time, guarded())
+    enable_trace_events("queue_next", sink=count)
+    try:
+        enabled_time = guarded()
+    finally:
+        disable_trace_events("queue_next")
+
+    print(name)
+    print(f"  eager debug formatting:  {legacy_time * 1000:8.1f} ms")
+    print(f"  trace events disabled:   {disabled_time * 1000:8.1f} ms ({(1 - disabled_time / legacy_time) * 100:.1f}% faster)")
+    print(f"  trace events to a sink:  {enabled_time * 1000:8.1f} ms ({events[0]} events)")
+
+
+def main(num_junctions: int = 5000, repeats: int = 5):
+    logging.basicConfig(level=logging.WARNING)
+    network = build_network(num_junctions)
+    terminals = list(network.objects(Terminal))
+    equipment = list(network.objects(ConductingEquipment))
+
+    print(f"{num_junctions} junctions, best of {repeats}")
+    steps = [(t, queue_next_terminal(t, set())) for t in terminals]
+    compare(f"debug output for {len(steps)} terminal steps",
+            lambda: time_log_steps(steps, legacy_log_step, repeats),
+            lambda: time_log_steps(steps, guarded_log_step, repeats))
+    compare(f"queue_next_terminal step from {len(terminals)} terminals",
+            lambda: time_steps(terminals, legacy_queue_next_terminal, repeats),
+            lambda: time_steps(terminals, queue_next_terminal, repeats))
+    compare(f"queue_next_equipment step from {len(equipment)} equipment",
+            lambda: time_steps(equipment, legacy_queue_next_equipment, repeats),
+            lambda: time_steps(equipment, queue_next_equipment, repeats))
+    compare(f"terminal trace over {len(terminals)} terminals",
+            lambda: time_trace(network.get("j0-t1", Terminal), legacy_queue_next_terminal, repeats),
+            lambda: time_trace(network.get("j0-t1", Terminal), queue_next_terminal, repeats))
+    compare(f"equipment trace over {len(equipment)} equipment",
+            lambda: time_trace(network.get("j0", Junction), legacy_queue_next_equipment, repeats),
+            lambda: time_trace(network.get("j0", Junction), queue_next_equipment, repeats))
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
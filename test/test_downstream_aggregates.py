@@ -0,0 +1,82 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pytest
+from zepben.evolve import DownstreamAggregates, DownstreamTotals, UsagePoint, EnergyConsumer
+
+from test.util import create_branched_network, create_feeders
+
+
+async def _create_loaded_network():
+    """The `create_branched_network` with loads on the consumers and lengths on the lines."""
+    network = await create_branched_network()
+    for mrid, customers, p, q in (("ec1", 1, 5.0, 1.0), ("ec2", 10, 20.0, 4.0), ("ec3", 100, 50.0, 10.0)):
+        ec = network[mrid]
+        ec.customer_count = customers
+        ec.p = p
+        ec.q = q
+    network["l1"].length = 100.0
+    network["l2"].length = 250.0
+    return network
+
+
+class TestDownstreamAggregates(object):
+
+    @pytest.mark.asyncio
+    async def test_totals_everything_downstream(self):
+        network = await _create_loaded_network()
+        aggregates = DownstreamAggregates(network)
+
+        assert aggregates.totals(network["es"]) == DownstreamTotals(111, 4, 75.0, 15.0, 350.0)
+        assert aggregates.totals(network["l2"]) == DownstreamTotals(110, 3, 70.0, 14.0, 250.0)
+        assert aggregates.totals(network["sw"]) == DownstreamTotals(100, 1, 50.0, 10.0, 0.0)
+        assert aggregates.totals(network["ec1"]) == DownstreamTotals(1, 1, 5.0, 1.0, 0.0)
+        assert aggregates.totals(EnergyConsumer("unconnected")) == DownstreamTotals()
+
+    @pytest.mark.asyncio
+    async def test_updates_the_totals_upstream_of_changed_equipment(self):
+        network = await _create_loaded_network()
+        aggregates = DownstreamAggregates(network)
+        aggregates.totals(network["es"])
+
+        network["ec3"].p = 60.0
+        network["ec3"].customer_count = 90
+        network["l1"].length = 150.0
+        up = UsagePoint("ec1-up2")
+        network["ec1"].add_usage_point(up)
+        aggregates.update(network["ec3"], network["l1"], network["ec1"])
+
+        assert aggregates.totals(network["es"]) == DownstreamTotals(101, 5, 85.0, 15.0, 400.0)
+        assert aggregates.totals(network["j2"]) == DownstreamTotals(100, 2, 80.0, 14.0, 0.0)
+        assert aggregates.totals(network["l1"]) == DownstreamTotals(1, 2, 5.0, 1.0, 150.0)
+        assert aggregates.totals(network["ec2"]) == DownstreamTotals(10, 1, 20.0, 4.0, 0.0)
+        assert aggregates.totals(network["es"]) == DownstreamAggregates(network).totals(network["es"])
+
+    @pytest.mark.asyncio
+    async def test_recalculates_after_re_phasing(self):
+        network = await _create_loaded_network()
+        aggregates = DownstreamAggregates(network, current=True)
+        assert aggregates.totals(network["j1"]).customer_count == 111
+
+        network["sw"].set_open(True)
+        network.reset_phases()
+        await network.set_phases()
+
+        assert aggregates.is_stale
+        assert aggregates.totals(network["j1"]).customer_count == 11
+        assert aggregates.totals(network["ec3"]) == DownstreamTotals()
+        assert DownstreamAggregates(network).totals(network["j1"]).customer_count == 111
+
+    @pytest.mark.asyncio
+    async def test_counts_equipment_in_loops_once(self):
+        network = create_feeders()
+        for i in (1, 2, 3):
+            network[f"f{i}ec"].customer_count = i
+        await network.set_phases()
+        aggregates = DownstreamAggregates(network)
+
+        assert aggregates.totals(network["es"]).customer_count == 6
+        assert aggregates.totals(network["cb2"]).customer_count + aggregates.totals(network["cb3"]).customer_count == 5
@@ -0,0 +1,161 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pytest
+from zepben.evolve import NetworkService, Breaker, Junction, EnergyConsumer, ConductingEquipment, DownstreamTree, Status, find_normal, find_current, \
+    find_normal_batch, find_current_batch
+
+from test.util import add_with_terminals, add_energy_source, connect_chain, create_feeders, create_branched_network
+
+
+def _mrids(items):
+    return [it.mrid for it in items]
+
+
+def _keys(result):
+    return result.status, sorted(result.equipment) if result.equipment else result.equipment
+
+
+class TestDownstreamTree(object):
+
+    @pytest.mark.asyncio
+    async def test_links_equipment_to_what_feeds_it(self):
+        network = await create_branched_network()
+        tree = DownstreamTree(network)
+
+        assert [ce.mrid for ce in tree.roots] == ["es"]
+        assert len(tree) == len(list(network.objects(ConductingEquipment)))
+        assert tree.parent(network["ec3"]).mrid == "sw"
+        assert tree.depth(network["ec3"]) == 6
+        assert sorted(ce.mrid for ce in tree.children(network["j1"])) == ["l1", "l2"]
+        assert tree.lowest_common_ancestor(network["ec1"], network["ec3"]).mrid == "j1"
+        assert tree.lowest_common_ancestor(network["j2"], network["ec3"]).mrid == "j2"
+        assert tree.is_downstream(network["ec2"], network["l2"])
+        assert not tree.is_downstream(network["l2"], network["ec2"])
+        assert [ce.mrid for ce in tree.path(network["ec1"], network["ec2"])] == ["ec1", "l1", "j1", "l2", "j2", "ec2"]
+
+    @pytest.mark.asyncio
+    async def test_open_switches_split_the_current_tree(self):
+        network = await create_branched_network()
+        network["sw"].set_open(True)
+        await network.set_phases()
+
+        assert network["ec3"] in DownstreamTree(network)
+        current = DownstreamTree(network, current=True)
+        assert network["sw"] in current
+        assert network["ec3"] not in current
+        assert current.path(network["es"], network["ec3"]) is None
+
+    @pytest.mark.asyncio
+    async def test_subtrees_are_contiguous_in_depth_first_order(self):
+        network = await create_branched_network()
+        tree = DownstreamTree(network)
+
+        assert _mrids(tree.subtree(network["j1"])) == ["j1", "l1", "ec1", "l2", "j2", "ec2", "sw", "ec3"]
+        assert _mrids(tree.subtree(network["j1"], stop=network["j2"])) == ["j1", "l1", "ec1", "l2", "j2"]
+        assert _mrids(tree.subtree(network["j2"], stop=network["ec1"])) == ["j2", "ec2", "sw", "ec3"]
+        assert tree.downstream_count(network["j1"]) == 7
+        assert tree.downstream_count(network["ec1"]) == 0
+        for ce in network.objects(ConductingEquipment):
+            downstream = {it.mrid for it in tree.subtree(ce)}
+            for other in network.objects(ConductingEquipment):
+                assert tree.is_downstream(other, ce) == (other.mrid in downstream)
+
+    @pytest.mark.asyncio
+    async def test_exposes_positions_in_the_tree(self):
+        network = await create_branched_network()
+        tree = DownstreamTree(network)
+
+        for ce in network.objects(ConductingEquipment):
+            i = tree.index_of(ce)
+            assert tree.equipment_at(i) is ce
+            parent = tree.parent(ce)
+            assert tree.parent_index(i) == (-1 if parent is None else tree.index_of(parent))
+        assert tree.index_of(Junction()) is None
+
+        order = tree.depth_first_order
+        assert sorted(order) == list(range(len(tree)))
+        assert _mrids(tree.equipment_at(i) for i in order[order.index(tree.index_of(network["j1"])):][:8]) == _mrids(tree.subtree(network["j1"]))
+
+    @pytest.mark.asyncio
+    async def test_reports_loops_and_multi_fed_points(self):
+        network = create_feeders()
+        await network.set_phases()
+
+        normal = DownstreamTree(network)
+        assert [(a.mrid, b.mrid) for a, b in normal.loops] == [("f3j", "tie23")]
+        assert _mrids(normal.multi_fed) == ["f3j", "tie23"]
+        assert _mrids(normal.feeders(network["tie23"])) == ["f2j", "f3j"]
+        assert _mrids(normal.feeders(network["f3j"])) == ["cb3", "tie23"]
+        assert _mrids(normal.feed_terminals(normal.index_of(network["tie23"]))) == ["f2j-t3", "tie23-t1"]
+        assert normal.feed_terminals(normal.index_of(network["es"])) is None
+        # Phases flowing towards the normally open tie12 are included, even though they don't flow into it.
+        assert [(a.mrid, b.mrid) for a, b in normal.extra_feed_terminals] == [("f2j-t2", "tie12-t2"), ("f3j-t3", "tie23-t2"), ("tie23-t2", "f3j-t3")]
+
+        # tie12 is only normally open, so it closes a second loop in the current state.
+        current = DownstreamTree(network, current=True)
+        assert [(a.mrid, b.mrid) for a, b in current.loops] == [("f2j", "tie12"), ("f3j", "tie23")]
+
+    @pytest.mark.asyncio
+    async def test_reports_equipment_fed_from_more_than_one_source(self):
+        network = NetworkService()
+        es1, es2 = add_energy_source(network, "es1"), add_energy_source(network, "es2")
+        cb1, cb2 = add_with_terminals(network, Breaker("cb1")), add_with_terminals(network, Breaker("cb2"))
+        j = add_with_terminals(network, Junction("j"), 1)
+        connect_chain(network, es1, cb1, j)
+        connect_chain(network, es2, cb2)
+        network.connect_terminals(cb2.get_terminal_by_sn(2), j.get_terminal_by_sn(1))
+        await network.set_phases()
+
+        tree = DownstreamTree(network)
+        assert _mrids(tree.roots) == ["es1", "es2"]
+        assert tree.loops == []
+        assert _mrids(tree.multi_fed) == ["cb1", "cb2", "j"]
+        assert _mrids(tree.feeders(network["cb2"])) == ["es2", "cb1"]
+        assert tree.lowest_common_ancestor(network["j"], network["cb2"]) is None
+
+
+class TestFindBatch(object):
+
+    @pytest.mark.asyncio
+    async def test_matches_the_traced_results(self):
+        network = await create_branched_network()
+        equipment = sorted(network.objects(ConductingEquipment), key=lambda it: it.mrid)
+        froms = [f for f in equipment for _ in equipment + [None]]
+        tos = [t for _ in equipment for t in equipment + [None]]
+
+        tree = DownstreamTree(network)
+        batch = find_normal_batch(network, froms, tos, tree=tree)
+        for f, t, result in zip(froms, tos, batch):
+            expected, = await find_normal(f, t)
+            assert _keys(result) == _keys(expected), f"{f.mrid} -> {t.mrid if t else None}"
+
+    @pytest.mark.asyncio
+    async def test_finds_paths_in_either_direction(self):
+        network = await create_branched_network()
+
+        down, up, across, below = find_normal_batch(network, [network["cb"], network["ec2"], network["ec1"], network["j2"]],
+                                                    [network["j2"], network["cb"], network["ec3"], None])
+
+        assert _keys(down) == (Status.SUCCESS, ["ec1", "l2"])
+        assert _keys(up) == (Status.SUCCESS, ["ec1", "ec2", "ec3", "l2"])
+        assert across.status == Status.NO_PATH
+        assert _keys(below) == (Status.SUCCESS, ["ec2", "ec3"])
+
+    @pytest.mark.asyncio
+    async def test_uses_the_current_state(self):
+        network = await create_branched_network()
+        network["sw"].set_open(True)
+        await network.set_phases()
+
+        result, = find_current_batch(network, [network["cb"]], [network["ec3"]])
+        expected, = await find_current(network["cb"], network["ec3"])
+        assert result.status == expected.status == Status.NO_PATH
+        assert find_normal_batch(network, [network["cb"]], [network["ec3"]])[0].status == Status.SUCCESS
+
+    def test_mismatched_from_to(self):
+        results = find_normal_batch(NetworkService(), [EnergyConsumer("ec1"), EnergyConsumer("ec2")], [None])
+        assert [result.status for result in results] == [Status.MISMATCHED_FROM_TO]
@@ -0,0 +1,102 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pytest
+from zepben.evolve import NetworkService, AcLineSegment, Breaker, EnergyConsumer, GraphLevel, adjacency_matrix, to_networkx, normally_open, \
+    currently_open
+
+from test.util import add_with_terminals, add_energy_source, connect_chain, create_feeders
+
+
+def _edges(adjacency):
+    return sorted((adjacency.mrids[i], adjacency.mrids[j]) for i, j in zip(adjacency.rows, adjacency.cols) if i < j)
+
+
+def _create_chain():
+    """
+    es - cb - line - ec
+    """
+    network = NetworkService()
+    es = add_energy_source(network, "es")
+    cb = add_with_terminals(network, Breaker("cb"))
+    line = add_with_terminals(network, AcLineSegment("line", name="the line"))
+    ec = add_with_terminals(network, EnergyConsumer("ec"), 1)
+    connect_chain(network, es, cb, line, ec)
+    return network
+
+
+class TestAdjacencyMatrix(object):
+
+    def test_equipment_level(self):
+        network = create_feeders()
+
+        adjacency = adjacency_matrix(network)
+        assert adjacency.level is GraphLevel.EQUIPMENT
+        assert adjacency.mrids == ["bus", "cb1", "cb2", "cb3", "es", "f1ec", "f1j", "f2ec", "f2j", "f3ec", "f3j", "tie12", "tie23"]
+        assert adjacency.shape == (13, 13)
+        assert len(adjacency.rows) == len(adjacency.cols) == 30
+        assert [edge for edge in _edges(adjacency) if "tie12" in edge] == [("f1j", "tie12"), ("f2ec", "tie12"), ("f2j", "tie12")]
+
+        # Each edge is stored in both directions.
+        assert sorted(zip(adjacency.rows, adjacency.cols)) == sorted(zip(adjacency.cols, adjacency.rows))
+
+    def test_excludes_open_switches(self):
+        network = create_feeders()
+
+        normal = adjacency_matrix(network, open_test=normally_open)
+        assert normal.shape == (13, 13)
+        assert len(_edges(normal)) == 12
+        assert not any("tie12" in edge for edge in _edges(normal))
+
+        # tie12 is only normally open.
+        assert len(_edges(adjacency_matrix(network, open_test=currently_open))) == 15
+
+    def test_terminal_and_connectivity_node_levels(self):
+        network = _create_chain()
+        network["cb"].set_normally_open(True)
+
+        terminals = adjacency_matrix(network, GraphLevel.TERMINAL, normally_open)
+        assert terminals.mrids == ["cb-t1", "cb-t2", "ec-t1", "es-t1", "line-t1", "line-t2"]
+        assert _edges(terminals) == [("cb-t1", "es-t1"), ("cb-t2", "line-t1"), ("ec-t1", "line-t2"), ("line-t1", "line-t2")]
+
+        nodes = adjacency_matrix(network, GraphLevel.CONNECTIVITY_NODE)
+        index = nodes.index
+        cn = {t.mrid: index[t.connectivity_node.mrid] for t in (network["es-t1"], network["line-t1"], network["ec-t1"])}
+        assert nodes.shape == (3, 3)
+        assert sorted(zip(nodes.rows, nodes.cols)) == sorted([(cn["es-t1"], cn["line-t1"]), (cn["line-t1"], cn["es-t1"]),
+                                                              (cn["line-t1"], cn["ec-t1"]), (cn["ec-t1"], cn["line-t1"])])
+        assert len(adjacency_matrix(network, GraphLevel.CONNECTIVITY_NODE, normally_open).rows) == 2
+
+    def test_to_scipy(self):
+        pytest.importorskip("scipy")
+        adjacency = adjacency_matrix(_create_chain())
+
+        matrix = adjacency.to_scipy().tocsr()
+        assert matrix.shape == (4, 4)
+        assert (matrix != matrix.T).nnz == 0
+        index = adjacency.index
+        assert matrix[index["cb"], index["line"]] == 1.0
+        assert matrix[index["es"], index["line"]] == 0.0
+        assert matrix.sum() == 6
+
+
+class TestToNetworkx(object):
+
+    def test_builds_graph_with_attributes(self):
+        pytest.importorskip("networkx")
+        network = _create_chain()
+
+        graph = to_networkx(network)
+        assert sorted(graph.nodes) == ["cb", "ec", "es", "line"]
+        assert sorted(tuple(sorted(edge)) for edge in graph.edges) == [("cb", "es"), ("cb", "line"), ("ec", "line")]
+        assert graph.nodes["line"] == {"type": "AcLineSegment", "name": "the line"}
+
+        network["cb"].set_open(True)
+        graph = to_networkx(network, open_test=currently_open, attributes=("name", "length"))
+        assert sorted(tuple(sorted(edge)) for edge in graph.edges) == [("ec", "line")]
+        assert "cb" in graph.nodes
+        assert graph.nodes["line"] == {"type": "AcLineSegment", "name": "the line", "length": network["line"].length}
+        assert "length" not in graph.nodes["ec"]
@@ -0,0 +1,139 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+from zepben.evolve import NetworkService, AcLineSegment, EnergyConsumer, Fuse, Recloser, IsolationAnalysis, normally_open
+
+from test.util import add_with_terminals, add_energy_source, connect_chain, create_feeders
+
+
+def _mrids(items):
+    return [it.mrid for it in items]
+
+
+def _create_feeders_with_customers():
+    network = create_feeders()
+    for i in (1, 2, 3):
+        network[f"f{i}ec"].customer_count = 10 * i
+    return network
+
+
+class TestIsolationAnalysis(object):
+
+    def test_opens_the_fed_switches_around_the_zone(self):
+        network = _create_feeders_with_customers()
+
+        normal = IsolationAnalysis(network, normally_open).isolate(network["f2ec"])
+        assert normal.isolatable
+        assert _mrids(normal.switches) == ["cb2", "tie23"]
+        assert _mrids(normal.consumers_lost) == ["f2ec"]
+        assert normal.customers_lost == 20
+
+        # tie12 is only normally open, so it also needs opening in the current state.
+        current = IsolationAnalysis(network).isolate(network["f2j"])
+        assert _mrids(current.switches) == ["cb2", "tie12", "tie23"]
+        assert current.customers_lost == 20
+
+    def test_isolating_a_switch_isolates_both_sides(self):
+        network = _create_feeders_with_customers()
+
+        isolation = IsolationAnalysis(network, normally_open).isolate(network["tie23"])
+        assert _mrids(isolation.switches) == ["cb2", "cb3"]
+        assert _mrids(isolation.consumers_lost) == ["f2ec", "f3ec"]
+        assert isolation.customers_lost == 50
+
+    def test_equipment_in_a_source_zone_cannot_be_isolated(self):
+        network = _create_feeders_with_customers()
+        analysis = IsolationAnalysis(network)
+
+        for mrid in ("es", "bus", "cb1"):
+            isolation = analysis.isolate(network[mrid])
+            assert not isolation.isolatable
+            assert isolation.switches == []
+            assert isolation.customers_lost == 0
+
+    def test_includes_customers_downstream_of_the_isolated_zone(self):
+        network = NetworkService()
+        es = add_energy_source(network, "es")
+        recloser = add_with_terminals(network, Recloser("r"))
+        l1 = add_with_terminals(network, AcLineSegment("l1"))
+        fuse = add_with_terminals(network, Fuse("fuse"))
+        l2 = add_with_terminals(network, AcLineSegment("l2"))
+        ec1 = add_with_terminals(network, EnergyConsumer("ec1"), 1)
+        ec2 = add_with_terminals(network, EnergyConsumer("ec2"), 1)
+        ec1.customer_count = 3
+        ec2.customer_count = 4
+        connect_chain(network, es, recloser, l1, fuse, l2, ec2)
+        network.connect_terminals(ec1.get_terminal_by_sn(1), l1.get_terminal_by_sn(2))
+
+        analysis = IsolationAnalysis(network)
+        isolation = analysis.isolate(l1)
+        assert _mrids(isolation.switches) == ["r"]
+        assert _mrids(isolation.consumers_lost) == ["ec1", "ec2"]
+        assert isolation.customers_lost == 7
+
+        isolation = analysis.isolate(l2)
+        assert _mrids(isolation.switches) == ["fuse"]
+        assert isolation.customers_lost == 4
+
+    def test_results_are_refreshed_when_switches_change(self):
+        network = _create_feeders_with_customers()
+        analysis = IsolationAnalysis(network)
+
+        assert _mrids(analysis.isolate(network["f2ec"]).switches) == ["cb2", "tie12", "tie23"]
+
+        network["tie23"].set_open(True)
+        assert _mrids(analysis.isolate(network["f2ec"]).switches) == ["cb2", "tie12"]
+
+        # With cb1 open, feeder 1 is only fed through tie12 and is lost along with feeder 2.
+        network["cb1"].set_open(True)
+        isolation = analysis.isolate(network["f2ec"])
+        assert _mrids(isolation.switches) == ["cb2"]
+        assert _mrids(isolation.consumers_lost) == ["f1ec", "f2ec"]
+        assert isolation.customers_lost == 30
+
+    def test_results_are_refreshed_when_equipment_is_taken_out_of_service(self):
+        network = _create_feeders_with_customers()
+        analysis = IsolationAnalysis(network)
+
+        assert _mrids(analysis.isolate(network["f2ec"]).switches) == ["cb2", "tie12", "tie23"]
+
+        network["f3j"].in_service = False
+        assert _mrids(analysis.isolate(network["f2ec"]).switches) == ["cb2", "tie12"]
+
+        network["f3j"].in_service = True
+        assert _mrids(analysis.isolate(network["f2ec"]).switches) == ["cb2", "tie12", "tie23"]
+
+    def test_switches_in_other_networks_do_not_refresh_results(self, monkeypatch):
+        builds = []
+        build = IsolationAnalysis._build
+        monkeypatch.setattr(IsolationAnalysis, "_build", lambda self, equipment: builds.append(self.network) or build(self, equipment))
+
+        network = _create_feeders_with_customers()
+        other = _create_feeders_with_customers()
+        analysis = IsolationAnalysis(network)
+        other_analysis = IsolationAnalysis(other)
+
+        analysis.isolate(network["f2ec"])
+        other_analysis.isolate(other["f2ec"])
+        other["tie23"].set_open(True)
+        assert _mrids(analysis.isolate(network["f2ec"]).switches) == ["cb2", "tie12", "tie23"]
+        assert _mrids(other_analysis.isolate(other["f2ec"]).switches) == ["cb2", "tie12"]
+        assert builds == [network, other, other]
+
+        analysis.invalidate()
+        analysis.isolate(network["f2ec"])
+        assert builds == [network, other, other, network]
+
+    def test_isolate_all_shares_results_within_zones(self):
+        network = _create_feeders_with_customers()
+
+        results = IsolationAnalysis(network, normally_open).isolate_all()
+        assert set(results) == {ce.mrid for ce in network.objects(EnergyConsumer)} | {"es", "bus", "cb1", "cb2", "cb3", "f1j", "f2j", "f3j",
+                                                                                       "tie12", "tie23"}
+        assert _mrids(results["f3j"].switches) == _mrids(results["f3ec"].switches) == ["cb3", "tie23"]
+        assert results["f3j"].equipment is network["f3j"]
+        assert _mrids(results["f1ec"].switches) == ["cb1"]
+        assert _mrids(results["tie12"].switches) == ["cb1", "cb2", "tie23"]
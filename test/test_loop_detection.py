@@ -0,0 +1,77 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pytest
+from zepben.evolve import NetworkService, AcLineSegment, Junction, Loop, Circuit, find_loops, populate_loops, currently_open, ignore_open
+
+from test.util import add_with_terminals, connect_chain, create_feeders
+
+
+def _mrids(items):
+    return [it.mrid for it in items]
+
+
+class TestFindLoops(object):
+
+    def test_finds_the_loops_of_each_state(self):
+        network = create_feeders()
+
+        loop, = find_loops(network)
+        assert _mrids(loop.equipment) == ["tie23", "f2j", "cb2", "bus", "cb3", "f3j"]
+        assert _mrids(loop.switches) == ["tie23", "cb2", "cb3"]
+        assert loop.closing_terminal.mrid == "tie23-t2"
+        assert loop.closing_switch.mrid == "tie23"
+
+        # tie12 is only normally open.
+        assert [loop.closing_switch.mrid for loop in find_loops(network, currently_open)] == ["tie12", "tie23"]
+
+        network["tie23"].set_open(True)
+        assert [loop.closing_switch.mrid for loop in find_loops(network, currently_open)] == ["tie12"]
+        assert [loop.closing_switch.mrid for loop in find_loops(network, ignore_open)] == ["tie12", "tie23"]
+
+    def test_loops_without_switches(self):
+        network = NetworkService()
+        lines = [add_with_terminals(network, AcLineSegment(f"l{i}")) for i in range(3)]
+        j = add_with_terminals(network, Junction("j"), 1)
+        connect_chain(network, *lines)
+        network.connect_terminals(lines[2].get_terminal_by_sn(2), lines[0].get_terminal_by_sn(1))
+        network.connect_terminals(j.get_terminal_by_sn(1), lines[0].get_terminal_by_sn(1))
+
+        loop, = find_loops(network)
+        assert sorted(_mrids(loop.equipment)) == ["l0", "l1", "l2"]
+        assert loop.switches == []
+        assert loop.closing_switch is None
+
+    def test_radial_networks_have_no_loops(self):
+        network = create_feeders()
+        network["tie23"].set_normally_open(True)
+        assert find_loops(network) == []
+
+
+class TestPopulateLoops(object):
+
+    def test_creates_loops_and_circuits(self):
+        network = create_feeders()
+
+        loop, = populate_loops(network, find_loops(network))
+        assert network.get("loop1", Loop) is loop
+        circuit, = loop.circuits
+        assert network.get("loop1-circuit", Circuit) is circuit
+        assert circuit.loop is loop
+        assert sorted(_mrids(circuit.equipment)) == ["bus", "cb2", "cb3", "f2j", "f3j", "tie23"]
+        assert circuit in network["f2j"].equipment_containers
+        assert _mrids(loop.substations) == ["zs"]
+        assert _mrids(loop.energizing_substations) == ["zs"]
+        assert list(network["zs"].loops) == [loop]
+        assert list(network["zs"].energized_loops) == [loop]
+
+    def test_rejects_mrids_in_use(self):
+        network = create_feeders()
+        network.add(Circuit(mrid="loop1-circuit"))
+
+        with pytest.raises(ValueError):
+            populate_loops(network, find_loops(network))
+        assert "loop1" not in {loop.mrid for loop in network.objects(Loop)}
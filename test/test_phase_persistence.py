@@ -0,0 +1,95 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pytest
+from zepben.evolve import NetworkService, Breaker, Junction, Disconnector, EnergyConsumer, Terminal, SinglePhaseKind, phase_fingerprint, save_phases, \
+    load_phases
+
+from test.util import add_with_terminals, add_energy_source, connect_chain, phase_snapshot
+
+
+async def _create_phased_network():
+    """es - cb - j1 - sw - ec"""
+    network = NetworkService()
+    es = add_energy_source(network, "es")
+    equipment = [add_with_terminals(network, ce) for ce in (Breaker("cb"), Junction("j1"), Disconnector("sw"))]
+    ec = add_with_terminals(network, EnergyConsumer("ec"), 1)
+    connect_chain(network, es, *equipment, ec)
+    await network.set_phases()
+    return network
+
+
+class TestPhasePersistence(object):
+
+    @pytest.mark.asyncio
+    async def test_round_trip(self, tmp_path):
+        network = await _create_phased_network()
+        expected = phase_snapshot(network)
+        path = str(tmp_path / "phases.bin")
+
+        network.save_phases(path)
+        network.reset_phases()
+        assert network.get("ec-t1", Terminal).traced_phases.phase_normal(SinglePhaseKind.A) == SinglePhaseKind.NONE
+
+        assert network.load_phases(path)
+        assert phase_snapshot(network) == expected
+
+    @pytest.mark.asyncio
+    async def test_loads_into_a_freshly_built_network(self, tmp_path):
+        path = str(tmp_path / "phases.bin")
+        phased = await _create_phased_network()
+        save_phases(phased, path)
+
+        network = NetworkService()
+        es = add_energy_source(network, "es")
+        equipment = [add_with_terminals(network, ce) for ce in (Breaker("cb"), Junction("j1"), Disconnector("sw"))]
+        ec = add_with_terminals(network, EnergyConsumer("ec"), 1)
+        connect_chain(network, es, *equipment, ec)
+
+        assert phase_fingerprint(network) == phase_fingerprint(phased)
+        assert load_phases(network, path)
+        assert phase_snapshot(network) == phase_snapshot(phased)
+
+    @pytest.mark.asyncio
+    async def test_refuses_phases_for_a_different_switch_state(self, tmp_path):
+        network = await _create_phased_network()
+        path = str(tmp_path / "phases.bin")
+        network.save_phases(path)
+        network.reset_phases(current=False)
+        fingerprint = phase_fingerprint(network)
+
+        network.get("sw", Disconnector).set_open(True)
+
+        assert phase_fingerprint(network) != fingerprint
+        assert not network.load_phases(path)
+        assert network.get("ec-t1", Terminal).traced_phases.phase_normal(SinglePhaseKind.A) == SinglePhaseKind.NONE
+
+    @pytest.mark.asyncio
+    async def test_refuses_phases_for_a_different_topology(self, tmp_path):
+        network = await _create_phased_network()
+        path = str(tmp_path / "phases.bin")
+        network.save_phases(path)
+
+        ec2 = add_with_terminals(network, EnergyConsumer("ec2"), 1)
+        network.connect_terminals(network.get("j1-t2", Terminal), ec2.get_terminal_by_sn(1))
+
+        assert not network.load_phases(path)
+
+    @pytest.mark.asyncio
+    async def test_ignores_missing_and_invalid_files(self, tmp_path):
+        network = await _create_phased_network()
+        expected = phase_snapshot(network)
+        path = tmp_path / "phases.bin"
+
+        assert not network.load_phases(str(path))
+
+        network.save_phases(str(path))
+        path.write_bytes(path.read_bytes()[:-1])
+        assert not network.load_phases(str(path))
+
+        path.write_bytes(b"not phases")
+        assert not network.load_phases(str(path))
+        assert phase_snapshot(network) == expected
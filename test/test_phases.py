@@ -4,6 +4,145 @@
 #  License, v. 2.0. If a copy of the MPL was not distributed with this
 #  file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+from array import array
 
+import pytest
+from zepben.evolve import NetworkService, Junction, SinglePhaseKind, PhaseDirection, PhaseStatusStore, TracedPhases, PhaseCode, normal_phases, \
+    current_phases, phase, direction, setphs, decode_phases, decode_directions, encode_phases, phasedirection_from_value
+from zepben.evolve.model.phases import PHASE_DIR_MAP
 
+from test.util import add_with_terminals
 
+
+class TestPhaseStatusStore(object):
+
+    def test_bound_phases_are_views_of_the_store(self):
+        store = PhaseStatusStore()
+        tp = TracedPhases()
+        tp.add_normal(SinglePhaseKind.A, SinglePhaseKind.A, PhaseDirection.IN)
+
+        tp.bind(store, "owner")
+        assert (tp.store, tp.slot, len(store)) == (store, 0, 1)
+        assert tp.phase_normal(SinglePhaseKind.A) == SinglePhaseKind.A
+        assert store.normal[0] == tp.normal_status
+
+        version = store.version
+        assert tp.add_current(SinglePhaseKind.B, SinglePhaseKind.B, PhaseDirection.OUT)
+        assert store.current[0] == tp.current_status != 0
+        assert store.version == version
+        store.mark_changed()
+        assert store.version > version
+
+        tp.unbind()
+        assert tp.store is None
+        assert tp.direction_current(SinglePhaseKind.B) == PhaseDirection.OUT
+        assert store.owner(0) is None
+        assert store.current[0] == 0
+
+    def test_network_binds_terminals(self):
+        network = NetworkService()
+        j1 = add_with_terminals(network, Junction("j1"))
+        normal_phases(j1.get_terminal_by_sn(1), SinglePhaseKind.A).add(SinglePhaseKind.A, PhaseDirection.IN)
+
+        store = network.phase_statuses
+        assert len(store) == 2
+        assert normal_phases(j1.get_terminal_by_sn(1), SinglePhaseKind.A).phase() == SinglePhaseKind.A
+
+        j2 = add_with_terminals(network, Junction("j2"))
+        assert len(store) == 4
+        t = j2.get_terminal_by_sn(2)
+        assert t.traced_phases.store is store
+
+        network.remove(t)
+        assert t.traced_phases.store is None
+        assert t not in network.terminals_with_phase(SinglePhaseKind.B, SinglePhaseKind.NONE)
+
+    def test_bulk_queries_and_reset(self):
+        network = NetworkService()
+        j1 = add_with_terminals(network, Junction("j1"))
+        j2 = add_with_terminals(network, Junction("j2"), phases=PhaseCode.AN)
+        j1t1, j1t2 = j1.terminals
+        j2t1, j2t2 = j2.terminals
+
+        for t in (j1t1, j1t2):
+            for phase in t.phases.single_phases:
+                normal_phases(t, phase).add(phase, PhaseDirection.IN)
+        for t in (j2t1, j2t2):
+            for phase in t.phases.single_phases:
+                current_phases(t, phase).add(phase, PhaseDirection.BOTH)
+
+        assert network.terminals_with_phase(SinglePhaseKind.B, SinglePhaseKind.NONE) == [j2t1, j2t2]
+        assert network.terminals_with_phase(SinglePhaseKind.B, SinglePhaseKind.B) == [j1t1, j1t2]
+        assert network.terminals_with_phase(SinglePhaseKind.N, SinglePhaseKind.N, current=True) == [j2t1, j2t2]
+
+        store = network.phase_statuses
+        normal, current = store.export()
+        assert len(normal) == len(current) == 16
+        assert store.core_values(SinglePhaseKind.A) == bytes([0b01, 0b01, 0, 0])
+
+        network.reset_phases(current=False)
+        assert network.terminals_with_phase(SinglePhaseKind.A, SinglePhaseKind.A) == []
+        assert current_phases(j2t1, SinglePhaseKind.A).direction() == PhaseDirection.BOTH
+
+        store.load(normal, current)
+        assert normal_phases(j1t2, SinglePhaseKind.C).phase() == SinglePhaseKind.C
+
+
+NOMINAL_PHASES = [SinglePhaseKind.A, SinglePhaseKind.B, SinglePhaseKind.C, SinglePhaseKind.N]
+
+
+def _reference_phase(status, nominal_phase):
+    # The shift and map lookup used before the decode tables.
+    return PHASE_DIR_MAP.get((status >> (nominal_phase.mask_index * 8)) & 0xff, SinglePhaseKind.NONE)
+
+
+def _reference_direction(status, nominal_phase):
+    shift = 2 * max(_reference_phase(status, nominal_phase).value - 1, 0) + nominal_phase.mask_index * 8
+    return PhaseDirection((status >> shift) & 0b11)
+
+
+class TestPhaseCodec(object):
+
+    def test_tables_match_the_bit_layout(self):
+        for nominal_phase in NOMINAL_PHASES:
+            for core_val in range(256):
+                status = (core_val << (nominal_phase.mask_index * 8)) | 0x5a5a5a5a & ~(0xff << (nominal_phase.mask_index * 8))
+                assert phase(status, nominal_phase) is _reference_phase(status, nominal_phase)
+                assert direction(status, nominal_phase) is _reference_direction(status, nominal_phase)
+
+    def test_batch_decode(self):
+        statuses = array("I", [0, 0x01020408, 0x80402010, 0xc0c0c0c0, 0x03030303])
+        for nominal_phase in NOMINAL_PHASES:
+            assert decode_phases(statuses, nominal_phase) == [phase(s, nominal_phase) for s in statuses]
+            assert decode_directions(list(statuses), nominal_phase) == [direction(s, nominal_phase) for s in statuses]
+
+    def test_batch_encode(self):
+        statuses = array("I", [0, 0x01020408, 0xffffffff, 0x00000040])
+        phases = [SinglePhaseKind.A, SinglePhaseKind.C, SinglePhaseKind.N, SinglePhaseKind.B]
+        directions = [PhaseDirection.IN, PhaseDirection.BOTH, PhaseDirection.OUT, PhaseDirection.IN]
+
+        encoded = encode_phases(statuses, phases, directions, SinglePhaseKind.B)
+
+        assert list(encoded) == [setphs(s, p, d, SinglePhaseKind.B) for s, p, d in zip(statuses, phases, directions)]
+        assert decode_phases(encoded, SinglePhaseKind.B) == phases
+        assert decode_directions(encoded, SinglePhaseKind.B) == directions
+        assert statuses[2] == 0xffffffff
+
+        cleared = encode_phases(encoded, [SinglePhaseKind.NONE] * 4, [PhaseDirection.IN] * 4, SinglePhaseKind.B)
+        assert decode_phases(cleared, SinglePhaseKind.B) == [SinglePhaseKind.NONE] * 4
+        assert decode_phases(cleared, SinglePhaseKind.A) == decode_phases(statuses, SinglePhaseKind.A)
+
+    def test_batch_encode_errors(self):
+        with pytest.raises(ValueError):
+            encode_phases([0, 0], [SinglePhaseKind.A], [PhaseDirection.IN], SinglePhaseKind.A)
+        with pytest.raises(ValueError):
+            encode_phases([0], [SinglePhaseKind.X], [PhaseDirection.IN], SinglePhaseKind.A)
+        with pytest.raises(ValueError):
+            decode_phases([0], SinglePhaseKind.NONE)
+
+    def test_phase_direction_from_value(self):
+        assert [phasedirection_from_value(v) for v in range(4)] == [PhaseDirection.NONE, PhaseDirection.IN, PhaseDirection.OUT, PhaseDirection.BOTH]
+        assert PhaseDirection.IN + PhaseDirection.OUT is PhaseDirection.BOTH
+        assert PhaseDirection.BOTH - PhaseDirection.IN is PhaseDirection.OUT
+        with pytest.raises(ValueError):
+            phasedirection_from_value(4)
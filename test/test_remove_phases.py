@@ -0,0 +1,143 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pytest
+from zepben.evolve import RemovePhases, NetworkService, Breaker, Junction, Disconnector, EnergyConsumer, AcLineSegment, Terminal, SinglePhaseKind, \
+    PhaseDirection, normal_phases, current_phases
+
+from test.util import add_with_terminals, add_energy_source, connect_chain, phase_snapshot, create_feeders
+
+A = SinglePhaseKind.A
+
+
+def _create_radial():
+    """es - cb - j1 - sw - j2 - ec"""
+    network = NetworkService()
+    es = add_energy_source(network, "es")
+    equipment = [add_with_terminals(network, ce) for ce in (Breaker("cb"), Junction("j1"), Disconnector("sw"), Junction("j2"))]
+    ec = add_with_terminals(network, EnergyConsumer("ec"), 1)
+    connect_chain(network, es, *equipment, ec)
+    return network
+
+
+def _create_ring():
+    """
+    es - cb - j1 - l1 - j2 - ec
+               |         |
+               +-- l2 ---+
+    """
+    network = NetworkService()
+    es = add_energy_source(network, "es")
+    cb, j1, l1, l2, j2 = (add_with_terminals(network, ce) for ce in (Breaker("cb"), Junction("j1"), AcLineSegment("l1"), AcLineSegment("l2"),
+                                                                     Junction("j2")))
+    ec = add_with_terminals(network, EnergyConsumer("ec"), 1)
+    connect_chain(network, es, cb, j1, l1, j2, ec)
+    connect_chain(network, j1, l2, j2)
+    return network
+
+
+def _normal_statuses(network):
+    return {mrid: statuses[0] for mrid, statuses in phase_snapshot(network).items()}
+
+
+class TestRemovePhases(object):
+
+    @pytest.mark.asyncio
+    async def test_removes_phases_downstream_of_the_terminal(self):
+        network = _create_radial()
+        await network.set_phases()
+        remove_phases = RemovePhases()
+
+        await remove_phases.run(network.get("sw-t2", Terminal))
+
+        for removed in (remove_phases.normal_removed, remove_phases.current_removed):
+            assert [t.mrid for t in removed.terminals] == ["ec-t1", "j2-t1", "j2-t2", "sw-t2"]
+            assert [ce.mrid for ce in removed.equipment] == ["ec", "j2"]
+            assert removed.refed_terminals == []
+            assert removed.terminals_cleared == 4
+        assert normal_phases(network.get("sw-t1", Terminal), A).direction() == PhaseDirection.IN
+        assert current_phases(network.get("ec-t1", Terminal), A).phase() == SinglePhaseKind.NONE
+
+    @pytest.mark.asyncio
+    async def test_matches_phasing_with_the_switch_open(self):
+        network = _create_radial()
+        network.get("sw", Disconnector).set_normally_open(True)
+        await network.set_phases()
+        expected = _normal_statuses(network)
+
+        network = _create_radial()
+        await network.set_phases()
+        await RemovePhases().run(network.get("sw-t2", Terminal), current=False)
+
+        assert _normal_statuses(network) == expected
+
+    @pytest.mark.asyncio
+    async def test_keeps_phases_supplied_from_another_path(self):
+        network = create_feeders()
+        network.get("cb2", Breaker).set_normally_open(True)
+        await network.set_phases()
+        expected = _normal_statuses(network)
+
+        network = create_feeders()
+        await network.set_phases()
+        remove_phases = RemovePhases()
+        await remove_phases.run(network.get("cb2-t2", Terminal), current=False)
+
+        assert _normal_statuses(network) == expected
+        assert remove_phases.normal_removed.terminals == []
+        assert "f2ec-t1" in [t.mrid for t in remove_phases.normal_removed.refed_terminals]
+        assert normal_phases(network.get("cb2-t2", Terminal), A).direction() == PhaseDirection.IN
+        assert remove_phases.current_removed is None
+
+    @pytest.mark.asyncio
+    async def test_re_phases_loops_from_their_feed(self):
+        # With l1-t2 as the open point, l1 is only fed from j1 and l1-t2 only from l2, the same as a full run with l1-t2 disconnected other than
+        # l1-t2 itself.
+        network = _create_ring()
+        network.disconnect(network.get("l1-t2", Terminal))
+        await network.set_phases()
+        expected = phase_snapshot(network)
+        del expected["l1-t2"]
+
+        network = _create_ring()
+        await network.set_phases()
+        assert normal_phases(network.get("l1-t2", Terminal), A).direction() == PhaseDirection.BOTH
+        remove_phases = RemovePhases()
+        await remove_phases.run(network.get("l1-t2", Terminal))
+
+        after = phase_snapshot(network)
+        l1_t2 = network.get("l1-t2", Terminal)
+        assert normal_phases(l1_t2, A).direction() == current_phases(l1_t2, A).direction() == PhaseDirection.IN
+        del after["l1-t2"]
+        assert after == expected
+        for removed in (remove_phases.normal_removed, remove_phases.current_removed):
+            assert removed.terminals == []
+            assert "ec-t1" in [t.mrid for t in removed.refed_terminals]
+
+    @pytest.mark.asyncio
+    async def test_only_touches_the_requested_state(self):
+        network = _create_radial()
+        await network.set_phases()
+        before = phase_snapshot(network)
+
+        await RemovePhases().run(network.get("j1-t2", Terminal), normal=False)
+
+        after = phase_snapshot(network)
+        assert {mrid: s[0] for mrid, s in after.items()} == {mrid: s[0] for mrid, s in before.items()}
+        assert current_phases(network.get("ec-t1", Terminal), A).phase() == SinglePhaseKind.NONE
+
+    @pytest.mark.asyncio
+    async def test_ignores_terminals_without_outgoing_phases(self):
+        network = _create_radial()
+        await network.set_phases()
+        before = phase_snapshot(network)
+        remove_phases = RemovePhases()
+
+        await remove_phases.run(network.get("ec-t1", Terminal))
+
+        assert phase_snapshot(network) == before
+        assert remove_phases.normal_removed.terminals == []
+        assert remove_phases.normal_removed.terminals_cleared == 0
@@ -4,9 +4,18 @@
 #  License, v. 2.0. If a copy of the MPL was not distributed with this
 #  file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
 import pytest
-from zepben.evolve import SetPhases, phase_log, PhaseDirection, SinglePhaseKind
-from test.util import get_terminal, check_phases
+from zepben.evolve.services.network.tracing.phases import phasing
+from zepben.evolve import SetPhases, phase_log, PhaseDirection, SinglePhaseKind, NetworkService, Breaker, Junction, Disconnector, EnergyConsumer, Terminal, \
+    normal_phases, current_phases, Substation, normally_open, DelayedFeederTrace, PhaseCode, PhaseConflict
+from zepben.evolve.exceptions import PhaseException
+from zepben.evolve.services.network.network import connect
+from test.util import get_terminal, check_phases, add_with_terminals, add_energy_source, connect_chain, phase_snapshot, full_phasing_snapshot, \
+    create_feeders
 
 A = SinglePhaseKind.A
 B = SinglePhaseKind.B
@@ -72,3 +81,345 @@ class TestSetPhase(object):
         check_phases(get_terminal(network2, "junc7", 0), [B], [IN])
 
 
+def _create_looped_feeder():
+    """
+    es - cb - j1 - sw1 - j2 - ec1
+                          |
+                         sw2 - j3 - ec2
+                                |
+          j1 ----- tie ---------+
+    The tie is normally open.
+    """
+    network = NetworkService()
+    es = add_energy_source(network, "es")
+    cb, j1, sw1, j3, sw2, tie = (add_with_terminals(network, ce) for ce in (Breaker("cb"), Junction("j1", ), Disconnector("sw1"), Junction("j3"),
+                                                                              Disconnector("sw2"), Disconnector("tie")))
+    j2 = add_with_terminals(network, Junction("j2"), 3)
+    ec1, ec2 = (add_with_terminals(network, EnergyConsumer(mrid), 1) for mrid in ("ec1", "ec2"))
+    j1.add_terminal(Terminal("j1-t3", conducting_equipment=j1, sequence_number=3))
+    network.add(j1.get_terminal_by_sn(3))
+    j3.add_terminal(Terminal("j3-t3", conducting_equipment=j3, sequence_number=3))
+    network.add(j3.get_terminal_by_sn(3))
+
+    connect_chain(network, es, cb)
+    network.connect_terminals(cb.get_terminal_by_sn(2), j1.get_terminal_by_sn(1))
+    network.connect_terminals(j1.get_terminal_by_sn(2), sw1.get_terminal_by_sn(1))
+    network.connect_terminals(sw1.get_terminal_by_sn(2), j2.get_terminal_by_sn(1))
+    network.connect_terminals(j2.get_terminal_by_sn(2), ec1.get_terminal_by_sn(1))
+    network.connect_terminals(j2.get_terminal_by_sn(3), sw2.get_terminal_by_sn(1))
+    network.connect_terminals(sw2.get_terminal_by_sn(2), j3.get_terminal_by_sn(1))
+    network.connect_terminals(j3.get_terminal_by_sn(2), ec2.get_terminal_by_sn(1))
+    network.connect_terminals(j1.get_terminal_by_sn(3), tie.get_terminal_by_sn(1))
+    network.connect_terminals(tie.get_terminal_by_sn(2), j3.get_terminal_by_sn(3))
+    tie.set_normally_open(True)
+    tie.set_open(True)
+    return network
+
+
+class TestIncrementalPhasing(object):
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("operations", [
+        [("sw1", True, True)],
+        [("sw2", False, True)],
+        [("sw1", True, False), ("tie", False, False)],
+        [("sw1", True, True), ("tie", False, False), ("sw1", False, False)],
+        [("tie", False, False), ("sw2", True, True), ("sw2", False, False)],
+    ])
+    async def test_matches_full_phasing(self, operations):
+        network = _create_looped_feeder()
+        await network.set_phases()
+        set_phases = SetPhases()
+
+        for mrid, normally_open, currently_open in operations:
+            sw = network.get(mrid, Disconnector)
+            sw.set_normally_open(normally_open)
+            sw.set_open(currently_open)
+            await set_phases.run_switches([sw])
+            incremental = phase_snapshot(network)
+
+            assert incremental == await full_phasing_snapshot(network), f"after operating {mrid}"
+
+    @pytest.mark.asyncio
+    async def test_only_changes_the_requested_state(self):
+        network = _create_looped_feeder()
+        await network.set_phases()
+        sw1 = network.get("sw1", Disconnector)
+        sw1.set_normally_open(True)
+        sw1.set_open(True)
+
+        await SetPhases().run_switches([sw1], current=False)
+
+        ec1 = network.get("ec1-t1", Terminal)
+        assert normal_phases(ec1, A).phase() == SPK_NONE
+        assert current_phases(ec1, A).phase() == A
+        assert normal_phases(network.get("j1-t2", Terminal), A).phase() == A
+
+
+class TestParallelPhasing(object):
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("tie_open", [True, False])
+    async def test_matches_serial_phasing(self, tie_open):
+        network = _create_looped_feeder()
+        network.get("tie", Disconnector).set_open(tie_open)
+        serial = await full_phasing_snapshot(network)
+        network.reset_phases()
+
+        await network.set_phases(parallel=True)
+
+        assert phase_snapshot(network) == serial
+        assert current_phases(network.get("j3-t3", Terminal), A).direction() == (OUT if tie_open else BOTH)
+        assert normal_phases(network.get("j3-t3", Terminal), A).direction() == OUT
+
+    @pytest.mark.asyncio
+    async def test_falls_back_to_serial_phasing_without_fork(self, monkeypatch):
+        network = _create_looped_feeder()
+        serial = await full_phasing_snapshot(network)
+        network.reset_phases()
+        monkeypatch.setattr(phasing, "_fork_context", lambda: None)
+
+        await network.set_phases(parallel=True)
+
+        assert phase_snapshot(network) == serial
+
+    @pytest.mark.asyncio
+    async def test_phases_terminals_not_in_the_network(self, monkeypatch):
+        network = _create_looped_feeder()
+        ec = EnergyConsumer("ec3")
+        terminal = Terminal("ec3-t1", conducting_equipment=ec, sequence_number=1)
+        ec.add_terminal(terminal)
+        connect(terminal, network.get("j2-t3", Terminal).connectivity_node)
+
+        monkeypatch.setattr(phasing, "ProcessPoolExecutor", None)
+        await network.set_phases(parallel=True)
+
+        # The terminal isn't bound to the network's store, so the run falls back to serial phasing rather than losing its phases.
+        assert terminal.traced_phases.store is None
+        assert normal_phases(terminal, A).direction() == IN
+        assert current_phases(terminal, A).direction() == IN
+
+    @pytest.mark.asyncio
+    async def test_concurrent_runs_use_their_own_workers(self, monkeypatch, caplog):
+        looped, feeders = _create_looped_feeder(), create_feeders()
+        looped_serial, feeders_serial = await full_phasing_snapshot(looped), await full_phasing_snapshot(feeders)
+        looped.reset_phases()
+        feeders.reset_phases()
+
+        worker_stores = []
+
+        class RecordingExecutor(ProcessPoolExecutor):
+            def __init__(self, *args, **kwargs):
+                worker_stores.append(kwargs["initargs"][0][2])
+                super().__init__(*args, **kwargs)
+
+        monkeypatch.setattr(phasing, "ProcessPoolExecutor", RecordingExecutor)
+
+        await asyncio.gather(looped.set_phases(parallel=True), feeders.set_phases(parallel=True))
+
+        assert phase_snapshot(looped) == looped_serial
+        assert phase_snapshot(feeders) == feeders_serial
+        assert "phasing serially" not in caplog.text
+        # Each run's workers are given the phases of its own network, rather than sharing state in this process.
+        assert sorted(map(id, worker_stores)) == sorted(map(id, (looped.phase_statuses, feeders.phase_statuses)))
+        assert phasing._worker_phasing is None
+
+
+class TestPerFeederPhasing(object):
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("tie12_open", [True, False])
+    @pytest.mark.parametrize("max_workers", [None, 1, 2])
+    async def test_matches_serial_phasing(self, tie12_open, max_workers):
+        network = create_feeders()
+        network.get("tie12", Disconnector).set_open(tie12_open)
+        serial = await full_phasing_snapshot(network)
+        network.reset_phases()
+
+        await network.set_phases(per_feeder=True, max_workers=max_workers)
+
+        assert phase_snapshot(network) == serial
+        assert normal_phases(network.get("f3ec-t1", Terminal), A).direction() == IN
+        assert current_phases(network.get("tie12-t2", Terminal), A).direction() == (IN if tie12_open else BOTH)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_runs_use_their_own_workers(self, monkeypatch):
+        networks = [create_feeders(), create_feeders()]
+        networks[1].get("tie12", Disconnector).set_open(False)
+        serial = [await full_phasing_snapshot(network) for network in networks]
+        for network in networks:
+            network.reset_phases()
+
+        worker_stores = []
+
+        class RecordingExecutor(ProcessPoolExecutor):
+            def __init__(self, *args, **kwargs):
+                worker_stores.append(kwargs["initargs"][0])
+                super().__init__(*args, **kwargs)
+
+        monkeypatch.setattr(phasing, "ProcessPoolExecutor", RecordingExecutor)
+
+        await asyncio.gather(*(network.set_phases(per_feeder=True, max_workers=2) for network in networks))
+
+        assert [phase_snapshot(network) for network in networks] == serial
+        # Each run forks a single pool, shared by every round of both states.
+        assert sorted(map(id, worker_stores)) == sorted(id(network.phase_statuses) for network in networks)
+        assert phasing._worker_phasing is None
+
+    def test_groups_feeders_joined_by_closed_switches(self):
+        network = create_feeders()
+        traces = [DelayedFeederTrace(network.get(f"cb{i}-t2", Terminal), {A, B, C}) for i in (1, 2, 3)]
+
+        groups = phasing._group_feeder_traces(traces, normally_open)
+
+        assert [[trace.out_terminal.mrid for trace in group] for group, _ in groups] == [["cb1-t2"], ["cb2-t2", "cb3-t2"]]
+        assert [len(terminals) for _, terminals in groups] == [6, 13]
+
+
+class TestFeederCbWorklist(object):
+
+    @pytest.mark.asyncio
+    async def test_processes_every_feeder_cb(self):
+        network = create_feeders()
+        set_phases = SetPhases()
+
+        await set_phases.run(network)
+
+        for stats in (set_phases.normal_feeder_cb_stats, set_phases.current_feeder_cb_stats):
+            assert stats.rounds == 1
+            assert stats.breakers_processed == 3
+            assert stats.breakers_requeued == 0
+            assert stats.delayed_traces == 3
+            assert stats.incomplete == []
+        for i in (1, 2, 3):
+            assert normal_phases(network.get(f"f{i}ec-t1", Terminal), A).direction() in (IN, BOTH)
+
+    @pytest.mark.asyncio
+    async def test_feeders_joined_by_closed_switches_feed_each_other(self):
+        network = create_feeders()
+
+        await network.set_phases()
+
+        for mrid in ("cb2-t2", "f2j-t1", "tie23-t1", "f3j-t3", "cb3-t2"):
+            assert normal_phases(network.get(mrid, Terminal), A).direction() == BOTH
+        assert normal_phases(network.get("cb1-t2", Terminal), A).direction() == OUT
+
+    @pytest.mark.asyncio
+    async def test_reports_feeder_cbs_phases_never_flow_through(self):
+        network = create_feeders()
+        cb4 = add_with_terminals(network, Breaker("cb4"))
+        cb4.add_container(network.get("zs", Substation))
+        network.get("cb3", Breaker).set_normally_open(True)
+        set_phases = SetPhases()
+
+        await set_phases.run(network)
+
+        assert set_phases.normal_feeder_cb_stats.incomplete == ["cb4"]
+        assert set_phases.normal_feeder_cb_stats.delayed_traces == 2
+        assert set_phases.current_feeder_cb_stats.incomplete == ["cb4"]
+        assert set_phases.current_feeder_cb_stats.delayed_traces == 3
+
+
+def _create_crossed_phases(sw_open: Optional[bool] = None):
+    """
+    es - j1 - left (AB) - lv (XY)
+          |               |
+          +-- right (BC) -+
+    left maps A and B onto X and Y, while right maps B and C onto them, so the phases traced around the loop cross.
+    `sw_open` If set, right is connected to j1 through a switch, which is open if True.
+    """
+    network = NetworkService()
+    es = add_energy_source(network, "es")
+    j1 = add_with_terminals(network, Junction("j1"), 3)
+    left = add_with_terminals(network, Junction("left"), 2, PhaseCode.AB)
+    right = add_with_terminals(network, Junction("right"), 2, PhaseCode.BC)
+    lv = add_with_terminals(network, Junction("lv"), 2, PhaseCode.XY)
+    network.connect_terminals(es.get_terminal_by_sn(1), j1.get_terminal_by_sn(1))
+    network.connect_terminals(j1.get_terminal_by_sn(2), left.get_terminal_by_sn(1))
+    if sw_open is None:
+        network.connect_terminals(j1.get_terminal_by_sn(3), right.get_terminal_by_sn(1))
+    else:
+        sw = add_with_terminals(network, Disconnector("sw"), 2, PhaseCode.BC)
+        sw.set_normally_open(sw_open)
+        sw.set_open(sw_open)
+        connect_chain(network, j1, sw, right)
+    network.connect_terminals(left.get_terminal_by_sn(2), lv.get_terminal_by_sn(1))
+    network.connect_terminals(right.get_terminal_by_sn(2), lv.get_terminal_by_sn(2))
+    return network
+
+
+class TestPhaseConflicts(object):
+
+    @pytest.mark.asyncio
+    async def test_raises_on_the_first_conflict_by_default(self):
+        with pytest.raises(PhaseException):
+            await _create_crossed_phases().set_phases()
+
+    @pytest.mark.asyncio
+    async def test_collects_conflicts_and_keeps_tracing(self):
+        network = _create_crossed_phases()
+
+        conflicts = await network.set_phases(collect_conflicts=True)
+
+        assert conflicts
+        assert {(c.terminal, c.equipment, c.from_equipment) for c in conflicts} == {("right-t1", "right", "right"), ("right-t2", "right", "right")}
+        assert {c.current for c in conflicts} == {False, True}
+        assert PhaseConflict(terminal="right-t2", equipment="right", nominal_phase=B, existing_phase=A, attempted_phase=B, from_terminal="right-t1",
+                             from_equipment="right", current=False, path=["es-t1", "j1-t1", "j1-t3", "right-t1"]) in conflicts
+        for c in conflicts:
+            assert c.path[0] == "es-t1" and c.path[-1] == c.from_terminal
+            assert c.existing_phase != c.attempted_phase
+            assert normal_phases(network.get(c.terminal, Terminal), c.nominal_phase).phase() == c.existing_phase
+
+        # The phases that don't conflict are still traced through the rest of the network.
+        assert normal_phases(network.get("lv-t1", Terminal), SinglePhaseKind.X).phase() == A
+        assert normal_phases(network.get("left-t2", Terminal), B).phase() == B
+
+    @pytest.mark.asyncio
+    async def test_keeps_the_conflicts_of_the_last_run(self):
+        set_phases = SetPhases()
+        conflicts = await set_phases.run(_create_crossed_phases(), collect_conflicts=True)
+        assert set_phases.conflicts is conflicts
+
+        await set_phases.run(create_feeders(), collect_conflicts=True)
+        assert set_phases.conflicts == []
+
+    @pytest.mark.asyncio
+    async def test_collects_conflicts_when_re_phasing_incrementally(self):
+        expected = await _create_crossed_phases(sw_open=False).set_phases(collect_conflicts=True)
+        network = _create_crossed_phases(sw_open=True)
+        assert await network.set_phases(collect_conflicts=True) == []
+        sw = network.get("sw", Disconnector)
+        sw.set_normally_open(False)
+        sw.set_open(False)
+        set_phases = SetPhases()
+
+        conflicts = await set_phases.run_switches([sw], collect_conflicts=True)
+
+        assert conflicts and set_phases.conflicts is conflicts
+        assert sorted(map(repr, conflicts)) == sorted(map(repr, expected))
+
+    @pytest.mark.asyncio
+    async def test_collects_conflicts_from_workers(self):
+        serial = await _create_crossed_phases().set_phases(collect_conflicts=True)
+
+        parallel = await _create_crossed_phases().set_phases(parallel=True, collect_conflicts=True)
+
+        assert sorted(map(repr, parallel)) == sorted(map(repr, serial))
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("options", [{}, {"parallel": True}, {"per_feeder": True, "max_workers": 2}])
+    async def test_concurrent_runs_keep_their_own_conflicts(self, options):
+        expected = await _create_crossed_phases().set_phases(collect_conflicts=True)
+
+        crossed, feeders = await asyncio.gather(_create_crossed_phases().set_phases(collect_conflicts=True, **options),
+                                                create_feeders().set_phases(collect_conflicts=True, **options))
+        assert sorted(map(repr, crossed)) == sorted(map(repr, expected))
+        assert feeders == []
+
+        # A run that isn't collecting still raises on its own conflicts, and doesn't stop a concurrent run from collecting.
+        collecting, raising = await asyncio.gather(_create_crossed_phases().set_phases(collect_conflicts=True, **options),
+                                                   _create_crossed_phases().set_phases(**options),
+                                                   return_exceptions=True)
+        assert sorted(map(repr, collecting)) == sorted(map(repr, expected))
+        assert isinstance(raising, PhaseException)
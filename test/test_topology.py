@@ -0,0 +1,139 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pytest
+from zepben.evolve import NetworkService, Breaker, Junction, AcLineSegment, EnergyConsumer, Disconnector, PhaseCode, SinglePhaseKind, \
+    PerLengthSequenceImpedance, ConductingEquipment, shortest_path, shortest_paths, length_weight, impedance_weight, hop_weight, currently_open, \
+    ignore_open
+
+from test.util import add_with_terminals, add_energy_source, connect_chain
+
+
+def _create_meshed_network():
+    """
+    es - cb - j1 - la (100) ------------------- j2 - ld (10) - ec
+              |                                 |  \\
+              lb (30) - sw - lc (30) -----------+   lp (5, A) - eca (A)
+    """
+    network = NetworkService()
+    es = add_energy_source(network, "es")
+    cb, sw = add_with_terminals(network, Breaker("cb")), add_with_terminals(network, Disconnector("sw"))
+    j1, j2 = add_with_terminals(network, Junction("j1"), 3), add_with_terminals(network, Junction("j2"), 4)
+    lines = {}
+    for mrid, length in (("la", 100.0), ("lb", 30.0), ("lc", 30.0), ("ld", 10.0)):
+        lines[mrid] = add_with_terminals(network, AcLineSegment(mrid, length=length))
+    lp = add_with_terminals(network, AcLineSegment("lp", length=5.0), phases=PhaseCode.A)
+    ec = add_with_terminals(network, EnergyConsumer("ec"), 1)
+    eca = add_with_terminals(network, EnergyConsumer("eca"), 1, PhaseCode.A)
+
+    connect_chain(network, es, cb, j1)
+    network.connect_terminals(j1.get_terminal_by_sn(2), lines["la"].get_terminal_by_sn(1))
+    network.connect_terminals(lines["la"].get_terminal_by_sn(2), j2.get_terminal_by_sn(1))
+    network.connect_terminals(j1.get_terminal_by_sn(3), lines["lb"].get_terminal_by_sn(1))
+    connect_chain(network, lines["lb"], sw, lines["lc"])
+    network.connect_terminals(lines["lc"].get_terminal_by_sn(2), j2.get_terminal_by_sn(2))
+    network.connect_terminals(j2.get_terminal_by_sn(3), lines["ld"].get_terminal_by_sn(1))
+    connect_chain(network, lines["ld"], ec)
+    network.connect_terminals(j2.get_terminal_by_sn(4), lp.get_terminal_by_sn(1))
+    connect_chain(network, lp, eca)
+    return network
+
+
+def _mrids(path):
+    return [ce.mrid for ce in path.equipment]
+
+
+class TestShortestPath(object):
+
+    def test_finds_the_shortest_path_by_length(self):
+        network = _create_meshed_network()
+
+        path = shortest_path(network["es"], network["ec"])
+        assert path.distance == 70.0
+        assert _mrids(path) == ["es", "cb", "j1", "lb", "sw", "lc", "j2", "ld", "ec"]
+        assert _mrids(shortest_path(network["ec"], network["es"])) == list(reversed(_mrids(path)))
+
+    def test_uses_the_weight_function(self):
+        network = _create_meshed_network()
+        plsi = PerLengthSequenceImpedance("plsi", r=3.0, x=4.0)
+        network["la"].per_length_sequence_impedance = plsi
+        network["ld"].per_length_sequence_impedance = plsi
+
+        hops = shortest_path(network["es"], network["ec"], weight=hop_weight)
+        assert hops.distance == 7.0
+        assert _mrids(hops) == ["es", "cb", "j1", "la", "j2", "ld", "ec"]
+
+        impedance = shortest_path(network["es"], network["ec"], weight=impedance_weight)
+        assert impedance.distance == 50.0
+        assert _mrids(impedance) == ["es", "cb", "j1", "lb", "sw", "lc", "j2", "ld", "ec"]
+
+    def test_does_not_pass_through_open_switches(self):
+        network = _create_meshed_network()
+        network["sw"].set_open(True)
+
+        assert shortest_path(network["es"], network["ec"]).distance == 70.0
+        path = shortest_path(network["es"], network["ec"], open_test=currently_open)
+        assert path.distance == 110.0
+        assert _mrids(path) == ["es", "cb", "j1", "la", "j2", "ld", "ec"]
+        assert shortest_path(network["es"], network["sw"], open_test=currently_open).distance == 30.0
+        assert shortest_path(network["es"], network["ec"], open_test=ignore_open).distance == 70.0
+
+        network["cb"].set_open(True)
+        assert shortest_path(network["es"], network["ec"], open_test=currently_open) is None
+
+    def test_only_follows_the_phases_requested(self):
+        network = _create_meshed_network()
+
+        assert shortest_path(network["es"], network["eca"]).distance == 65.0
+        assert shortest_path(network["es"], network["eca"], phases={SinglePhaseKind.A}).distance == 65.0
+        assert shortest_path(network["es"], network["eca"], phases=PhaseCode.B) is None
+        assert shortest_path(network["es"], network["ec"], phases=PhaseCode.B).distance == 70.0
+
+    def test_matches_the_unidirectional_search(self):
+        network = _create_meshed_network()
+        network["sw"].set_open(True)
+        equipment = sorted(network.objects(ConductingEquipment), key=lambda it: it.mrid)
+
+        for from_ in equipment:
+            for to in equipment:
+                for weight in (length_weight, hop_weight):
+                    bidirectional = shortest_path(from_, to, weight, currently_open)
+                    unidirectional = shortest_path(from_, to, weight, currently_open, bidirectional=False)
+                    assert (bidirectional and bidirectional.distance) == (unidirectional and unidirectional.distance), f"{from_.mrid} -> {to.mrid}"
+
+    def test_rejects_negative_weights(self):
+        network = _create_meshed_network()
+        with pytest.raises(ValueError):
+            shortest_path(network["es"], network["ec"], weight=lambda ce: -1.0)
+
+
+class TestShortestPaths(object):
+
+    def test_finds_the_distance_to_everything_in_one_run(self):
+        network = _create_meshed_network()
+
+        paths = shortest_paths(network["es"])
+        assert paths.distance(network["ec"]) == 70.0
+        assert paths.distance(network["eca"]) == 65.0
+        assert paths.distance(network["la"]) == 100.0
+        assert _mrids(paths.path(network["eca"])) == ["es", "cb", "j1", "lb", "sw", "lc", "j2", "lp", "eca"]
+        assert len(paths.distances) == len(list(network.objects(ConductingEquipment)))
+
+    def test_uses_the_nearest_source(self):
+        network = _create_meshed_network()
+
+        paths = shortest_paths([network["es"], network["eca"]], weight=hop_weight)
+        assert paths.distance(network["ec"]) == 5.0
+        assert _mrids(paths.path(network["ec"])) == ["eca", "lp", "j2", "ld", "ec"]
+        assert paths.distance(network["cb"]) == 2.0
+
+    def test_stops_once_the_targets_are_found(self):
+        network = _create_meshed_network()
+
+        paths = shortest_paths(network["es"], targets=[network["j1"]])
+        assert paths.distance(network["j1"]) == 0.0
+        assert paths.distance(network["ec"]) is None
+        assert paths.path(network["ec"]) is None
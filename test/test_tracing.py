@@ -4,10 +4,20 @@
 #  License, v. 2.0. If a copy of the MPL was not distributed with this
 #  file, You can obtain one at https://mozilla.org/MPL/2.0/.
 
+import asyncio
+import copy
+import pickle
+
 import pytest
-from zepben.evolve import BranchRecursiveTraversal, Traversal, FifoQueue, LifoQueue
+from zepben.evolve import BranchRecursiveTraversal, Traversal, FifoQueue, LifoQueue, TraversalStats, STOP_CONDITIONS, STEP_ACTIONS, QUEUE_NEXT, QUEUE, TRACKER, \
+    NetworkService, Junction, queue_next_terminal, trace_events, enable_trace_events, disable_trace_events, PhaseCode, SinglePhaseKind, phase_mask, \
+    phases_from_mask, ordered_phases_from_mask, Breaker, EnergyConsumer, PhaseStep, normal_downstream_trace, NominalPhasePath
+from zepben.evolve.services.network.tracing.connectivity import get_connectivity, ConnectivityResult
+from zepben.evolve.exceptions import TracingException
 from typing import List, Optional, Set
 
+from test.util import add_with_terminals, add_energy_source, connect_chain
+
 
 async def validate_run(t: Traversal, visit_order: List[int], expected_order: List[int], can_stop_on_start=True, check_visited=True):
     # clean slate each run
@@ -164,3 +174,439 @@ class TestBranchRecursiveTraversal(object):
         t = BranchRecursiveTraversal(start_item=0, queue_next=queue_next_br, process_queue=LifoQueue(), branch_queue=FifoQueue(), step_actions=[action],
                                      stop_conditions=[cond1, cond2])
         await _validate_can_stop(t, visited, [0, 1, 2, 3, 3, 2, 1], check_visited=False)
+
+
+class TestTraversalStats(object):
+
+    @pytest.mark.asyncio
+    async def test_stats_disabled_by_default(self):
+        async def cond(i):
+            return i >= 6
+
+        t = Traversal(queue_next=queue_next, start_item=1, process_queue=FifoQueue(), stop_conditions=[cond])
+        await t.trace()
+        assert t.stats is None
+
+    @pytest.mark.asyncio
+    async def test_collects_traversal_stats(self):
+        async def cond(i):
+            return i >= 6
+
+        async def action(i, s):
+            pass
+
+        published = []
+        t = Traversal(queue_next=queue_next, start_item=1, process_queue=FifoQueue(), stop_conditions=[cond], step_actions=[action],
+                      stats=TraversalStats(), stats_hook=published.append)
+        await t.trace()
+
+        stats = t.stats
+        assert stats.items_visited == 7
+        assert stats.items_dequeued == stats.items_visited - 1 + stats.revisits_rejected
+        assert stats.revisits_rejected > 0
+        assert stats.queue_high_water_mark > 0
+        assert stats.branches_created == 0
+        for category in (STOP_CONDITIONS, STEP_ACTIONS, QUEUE_NEXT, QUEUE, TRACKER):
+            assert stats.time_in(category) > 0.0
+        assert published == [stats]
+
+        t.reset()
+        assert stats.items_visited == 0
+        assert not stats.callback_time
+
+    @pytest.mark.asyncio
+    async def test_branches_share_stats(self):
+        visited = list()
+
+        async def action(i, s):
+            visited.append(i)
+
+        t = BranchRecursiveTraversal(start_item=0, queue_next=queue_next_br, process_queue=LifoQueue(), branch_queue=FifoQueue(), step_actions=[action],
+                                     stats=TraversalStats())
+        await t.trace()
+
+        assert t.stats.branches_created == 2
+        assert t.stats.items_visited == len(visited)
+
+
+class TestIterate(object):
+
+    @staticmethod
+    def _create_traversal(visit_order: List[int]):
+        async def cond(i):
+            return i >= 6
+
+        async def action(i, s):
+            visit_order.append(i)
+
+        return Traversal(queue_next=queue_next, start_item=1, process_queue=FifoQueue(), stop_conditions=[cond], step_actions=[action])
+
+    @pytest.mark.asyncio
+    async def test_yields_visited_items_with_stopping_state(self):
+        visit_order = []
+        t = self._create_traversal(visit_order)
+
+        steps = [step async for step in t.iterate()]
+
+        assert [item for item, _ in steps] == visit_order == [1, 2, 3, 4, 5, 6, 7]
+        assert [item for item, stopping in steps if stopping] == [6, 7]
+
+    @pytest.mark.asyncio
+    async def test_can_stop_iterating_early(self):
+        visit_order = []
+        t = self._create_traversal(visit_order)
+
+        steps = t.iterate()
+        async for item, _ in steps:
+            if item == 3:
+                break
+        await steps.aclose()
+
+        assert visit_order == [1, 2, 3]
+        t.reset()
+        await t.trace()
+        assert visit_order == [1, 2, 3, 1, 2, 3, 4, 5, 6, 7]
+
+    def test_iterate_sync(self):
+        visit_order = []
+        t = self._create_traversal(visit_order)
+
+        assert [item for item, _ in t.iterate_sync()] == [1, 2, 3, 4, 5, 6, 7]
+
+    @pytest.mark.asyncio
+    async def test_iterates_branches(self):
+        visited = list()
+
+        async def action(i, s):
+            visited.append(i)
+
+        t = BranchRecursiveTraversal(start_item=0, queue_next=queue_next_br, process_queue=LifoQueue(), branch_queue=FifoQueue(), step_actions=[action])
+
+        assert [item async for item, _ in t.iterate()] == visited == [0, 1, 2, 3, 3, 2, 1]
+
+    @pytest.mark.asyncio
+    async def test_trace_does_not_use_the_generators(self, monkeypatch):
+        visited = list()
+
+        async def action(i, s):
+            visited.append(i)
+
+        def fail(*args):
+            raise AssertionError("trace shouldn't pass its steps through a generator")
+
+        monkeypatch.setattr(Traversal, "_traverse", fail)
+        monkeypatch.setattr(BranchRecursiveTraversal, "_traverse", fail)
+        monkeypatch.setattr(BranchRecursiveTraversal, "_iterate_branches", fail)
+
+        t = BranchRecursiveTraversal(start_item=0, queue_next=queue_next_br, process_queue=LifoQueue(), branch_queue=FifoQueue(), step_actions=[action])
+        await t.trace()
+        assert visited == [0, 1, 2, 3, 3, 2, 1]
+
+        visit_order = []
+        await self._create_traversal(visit_order).trace()
+        assert visit_order == [1, 2, 3, 4, 5, 6, 7]
+
+
+class TestConcurrentStepActions(object):
+
+    @pytest.mark.asyncio
+    async def test_step_actions_run_concurrently_up_to_limit(self):
+        started = []
+        finished = []
+        in_flight = [0, 0]
+
+        async def cond(i):
+            return i >= 6
+
+        async def io_action(i, s):
+            started.append(i)
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight[1], in_flight[0])
+            await asyncio.sleep(0.01 if i % 2 else 0.001)
+            in_flight[0] -= 1
+            finished.append(i)
+
+        t = Traversal(queue_next=queue_next, start_item=1, process_queue=FifoQueue(), stop_conditions=[cond], step_actions=[io_action],
+                      step_action_concurrency=3)
+        steps = [item async for item, _ in t.iterate()]
+
+        assert started == steps == [1, 2, 3, 4, 5, 6, 7]
+        assert sorted(finished) == steps
+        assert in_flight[1] == 3
+
+    @pytest.mark.asyncio
+    async def test_step_action_errors_are_raised(self):
+        async def cond(i):
+            return i >= 6
+
+        async def failing_action(i, s):
+            await asyncio.sleep(0)
+            if i == 4:
+                raise ValueError(i)
+
+        t = Traversal(queue_next=queue_next, start_item=1, process_queue=FifoQueue(), stop_conditions=[cond], step_actions=[failing_action],
+                      step_action_concurrency=2)
+        with pytest.raises(ValueError):
+            await t.trace()
+
+
+class TestBatchStepActions(object):
+
+    @staticmethod
+    async def _cond(i):
+        return i >= 6
+
+    @pytest.mark.asyncio
+    async def test_batches_by_size(self):
+        batches = []
+        visit_order = []
+
+        async def action(i, s):
+            visit_order.append(i)
+
+        async def batch_action(batch):
+            batches.append(batch)
+
+        t = Traversal(queue_next=queue_next, start_item=1, process_queue=FifoQueue(), stop_conditions=[self._cond], step_actions=[action])
+        t.add_batch_step_action(batch_action, batch_size=3)
+        await t.trace()
+
+        assert visit_order == [1, 2, 3, 4, 5, 6, 7]
+        assert batches == [[(1, False), (2, False), (3, False)], [(4, False), (5, False), (6, True)], [(7, True)]]
+
+    @pytest.mark.asyncio
+    async def test_batches_per_level(self):
+        batches = []
+
+        async def batch_action(batch):
+            batches.append([i for i, _ in batch])
+
+        t = Traversal(queue_next=queue_next, start_item=1, process_queue=FifoQueue(), stop_conditions=[self._cond])
+        t.add_batch_step_action(batch_action, per_level=True)
+        await t.trace()
+        assert batches == [[1], [2, 3], [4, 5], [6, 7]]
+
+        # The size limit still applies within a level.
+        batches.clear()
+        t.reset()
+        t.clear_step_actions()
+        t.add_batch_step_action(batch_action, batch_size=1, per_level=True)
+        await t.trace()
+        assert batches == [[1], [2], [3], [4], [5], [6], [7]]
+
+    @pytest.mark.asyncio
+    async def test_per_level_requires_fifo_queue(self):
+        async def batch_action(batch):
+            pass
+
+        t = Traversal(queue_next=queue_next, start_item=1, process_queue=LifoQueue(), stop_conditions=[self._cond])
+        t.add_batch_step_action(batch_action, per_level=True)
+        with pytest.raises(TracingException):
+            await t.trace()
+
+    @pytest.mark.asyncio
+    async def test_branches_flush_their_own_batches(self):
+        batches = []
+
+        async def batch_action(batch):
+            batches.append([i for i, _ in batch])
+
+        def queue_next_branching(item, traversal, visited):
+            if item < 3:
+                traversal.process_queue.put(item + 1)
+            elif item == 3:
+                for start in (10, 20):
+                    branch = traversal.create_branch()
+                    branch.start_item = start
+                    traversal.branch_queue.put(branch)
+
+        t = BranchRecursiveTraversal(queue_next=queue_next_branching, start_item=1, process_queue=FifoQueue(), branch_queue=FifoQueue())
+        t.add_batch_step_action(batch_action)
+        await t.trace()
+
+        assert sorted(batches) == [[1, 2, 3], [10], [20]]
+
+    @pytest.mark.asyncio
+    async def test_batches_wait_for_concurrent_step_actions(self):
+        finished = []
+        finished_at_batch = []
+
+        async def slow_action(i, s):
+            # Earlier items take longer, so later items would finish first if batches didn't wait for them.
+            await asyncio.sleep(0.001 * (8 - i))
+            finished.append(i)
+
+        async def batch_action(batch):
+            finished_at_batch.append(([i for i, _ in batch], sorted(finished)))
+
+        t = Traversal(queue_next=queue_next, start_item=1, process_queue=FifoQueue(), stop_conditions=[self._cond], step_actions=[slow_action],
+                      step_action_concurrency=3)
+        t.add_batch_step_action(batch_action, batch_size=2)
+        await t.trace()
+
+        assert [batch for batch, _ in finished_at_batch] == [[1, 2], [3, 4], [5, 6], [7]]
+        for batch, done in finished_at_batch:
+            assert set(batch) <= set(done)
+        assert sorted(finished) == [1, 2, 3, 4, 5, 6, 7]
+
+
+class TestTraceEvents(object):
+
+    @pytest.mark.asyncio
+    async def test_queue_events_are_only_emitted_when_enabled(self):
+        network = NetworkService()
+        j1, j2, j3 = (add_with_terminals(network, Junction(mrid)) for mrid in ("j1", "j2", "j3"))
+        network.connect_terminals(j1.get_terminal_by_sn(2), j2.get_terminal_by_sn(1))
+        network.connect_terminals(j2.get_terminal_by_sn(2), j3.get_terminal_by_sn(1))
+
+        events = []
+
+        def sink(name, event, fields):
+            events.append((name, event, fields))
+
+        def trace():
+            return Traversal(queue_next=queue_next_terminal, start_item=j1.get_terminal_by_sn(1), process_queue=FifoQueue()).trace()
+
+        source = trace_events("queue_next")
+        assert not source.enabled
+        await trace()
+        assert not events
+
+        enable_trace_events("queue_next", sink=sink)
+        try:
+            await trace()
+        finally:
+            disable_trace_events("queue_next")
+
+        assert ("queue_next", "queued", {"source": "j1-t1", "queued": ["j2-t1"]}) in events
+        assert ("queue_next", "queued", {"source": "j2-t1", "queued": ["j3-t1"]}) in events
+
+        events.clear()
+        await trace()
+        assert not source.enabled
+        assert not events
+
+
+class TestPhaseMasks(object):
+
+    def test_phase_codes_have_precomputed_sets_and_masks(self):
+        for code in PhaseCode:
+            assert code.phase_set == frozenset(code.single_phases)
+            assert code.phase_mask == phase_mask(code.single_phases)
+            assert phases_from_mask(code.phase_mask) == code.phase_set
+            assert ordered_phases_from_mask(code.phase_mask) == tuple(sorted(code.single_phases, key=lambda p: p.value))
+
+    def test_phase_bits_are_distinct(self):
+        bits = [phs.phase_bit for phs in SinglePhaseKind]
+        assert len(set(bits)) == len(bits)
+        assert SinglePhaseKind.X.bit_mask == SinglePhaseKind.A.bit_mask
+        assert PhaseCode.X.phase_mask & PhaseCode.ABC.phase_mask == 0
+
+
+class TestConnectivity(object):
+
+    def test_phases_as_set_or_mask(self):
+        network = NetworkService()
+        j1 = add_with_terminals(network, Junction("j1"), phases=PhaseCode.ABCN)
+        j2 = add_with_terminals(network, Junction("j2"), phases=PhaseCode.ABN)
+        j3 = add_with_terminals(network, Junction("j3"), phases=PhaseCode.C)
+        network.connect_terminals(j1.get_terminal_by_sn(2), j2.get_terminal_by_sn(1))
+        network.connect_terminals(j1.get_terminal_by_sn(2), j3.get_terminal_by_sn(1))
+        t = j1.get_terminal_by_sn(2)
+
+        def paths(crs):
+            return {cr.to_terminal.mrid: [(p.from_phase, p.to_phase) for p in cr.nominal_phase_paths] for cr in crs}
+
+        A, B, C, N = SinglePhaseKind.A, SinglePhaseKind.B, SinglePhaseKind.C, SinglePhaseKind.N
+        assert paths(get_connectivity(t)) == {"j2-t1": [(A, A), (B, B), (N, N)], "j3-t1": [(C, C)]}
+        assert paths(get_connectivity(t, {B, C})) == paths(get_connectivity(t, PhaseCode.BC.phase_mask)) == {"j2-t1": [(B, B)], "j3-t1": [(C, C)]}
+        assert paths(get_connectivity(t, {SinglePhaseKind.X})) == {}
+        assert paths(get_connectivity(t, exclude={j3.get_terminal_by_sn(1)})) == {"j2-t1": [(A, A), (B, B), (N, N)]}
+
+    def test_unknown_phases_connect_by_position(self):
+        network = NetworkService()
+        j1 = add_with_terminals(network, Junction("j1"), phases=PhaseCode.XN)
+        j2 = add_with_terminals(network, Junction("j2"), phases=PhaseCode.BN)
+        network.connect_terminals(j1.get_terminal_by_sn(2), j2.get_terminal_by_sn(1))
+
+        crs = get_connectivity(j1.get_terminal_by_sn(2), {SinglePhaseKind.X})
+        assert [(p.from_phase, p.to_phase) for cr in crs for p in cr.nominal_phase_paths] == [(SinglePhaseKind.X, SinglePhaseKind.B)]
+
+        crs = get_connectivity(j2.get_terminal_by_sn(1), {SinglePhaseKind.B})
+        assert [(p.from_phase, p.to_phase) for cr in crs for p in cr.nominal_phase_paths] == [(SinglePhaseKind.B, SinglePhaseKind.X)]
+
+    def test_caches_results_until_the_node_changes(self):
+        network = NetworkService()
+        j1 = add_with_terminals(network, Junction("j1"))
+        j2 = add_with_terminals(network, Junction("j2"))
+        j3 = add_with_terminals(network, Junction("j3"), phases=PhaseCode.AB)
+        t = j1.get_terminal_by_sn(2)
+        network.connect_terminals(t, j2.get_terminal_by_sn(1))
+
+        crs = get_connectivity(t)
+        assert get_connectivity(t) is not crs
+        assert get_connectivity(t)[0] is crs[0]
+        assert get_connectivity(t, {SinglePhaseKind.A})[0] is not crs[0]
+        assert get_connectivity(t, exclude={j2.get_terminal_by_sn(1)}) == []
+
+        network.connect_terminals(t, j3.get_terminal_by_sn(1))
+        assert [cr.to_terminal.mrid for cr in get_connectivity(t)] == ["j2-t1", "j3-t1"]
+
+        j3.get_terminal_by_sn(1).phases = PhaseCode.A
+        assert [cr.to_nominal_phases for cr in get_connectivity(t)] == [[SinglePhaseKind.A, SinglePhaseKind.B, SinglePhaseKind.C], [SinglePhaseKind.A]]
+
+        network.disconnect(j2.get_terminal_by_sn(1))
+        assert [cr.to_terminal.mrid for cr in get_connectivity(t)] == ["j3-t1"]
+
+        network.disconnect_by_mrid(t.connectivity_node.mrid)
+        assert get_connectivity(t) == []
+
+    def test_nominal_phase_paths_are_interned(self):
+        A, B, X = SinglePhaseKind.A, SinglePhaseKind.B, SinglePhaseKind.X
+        path = NominalPhasePath(X, A)
+        assert NominalPhasePath(from_phase=X, to_phase=A) is path
+        assert (path.from_phase, path.to_phase) == (X, A)
+        assert NominalPhasePath(A, X) is not path
+        assert pickle.loads(pickle.dumps(path)) is path
+        assert copy.deepcopy(path) is path
+        with pytest.raises(AttributeError):
+            path.to_phase = B
+
+    def test_connectivity_results_are_ordered_and_hashable(self):
+        network = NetworkService()
+        j1 = add_with_terminals(network, Junction("j1"))
+        j2 = add_with_terminals(network, Junction("j2"))
+        t1, t2 = j1.get_terminal_by_sn(2), j2.get_terminal_by_sn(1)
+        A, B, C, X, Y = SinglePhaseKind.A, SinglePhaseKind.B, SinglePhaseKind.C, SinglePhaseKind.X, SinglePhaseKind.Y
+
+        cr = ConnectivityResult(from_terminal=t1, to_terminal=t2, nominal_phase_paths=[NominalPhasePath(C, Y), NominalPhasePath(A, X)])
+        same = ConnectivityResult(t1, t2, (NominalPhasePath(A, X), NominalPhasePath(C, Y)))
+
+        assert cr.nominal_phase_paths == (NominalPhasePath(A, X), NominalPhasePath(C, Y))
+        assert cr.from_nominal_phases == [A, C]
+        assert cr.to_nominal_phases == [X, Y]
+        assert cr.from_phases_mask == phase_mask({A, C})
+        assert cr.to_phases_mask == phase_mask({X, Y})
+        assert cr == same and hash(cr) == hash(same)
+        assert cr != ConnectivityResult(t2, t1, cr.nominal_phase_paths)
+        assert len({cr, same, ConnectivityResult(t1, t2, [NominalPhasePath(B, B)])}) == 2
+
+    @pytest.mark.asyncio
+    async def test_downstream_trace_steps_carry_the_phases_flowing_out(self):
+        network = NetworkService()
+        es = add_energy_source(network, "es")
+        cb = add_with_terminals(network, Breaker("cb"))
+        ec = add_with_terminals(network, EnergyConsumer("ec"), 1, PhaseCode.AB)
+        connect_chain(network, es, cb, ec)
+        await network.set_phases()
+
+        steps = []
+
+        async def collect(step, _):
+            steps.append(step)
+
+        trace = normal_downstream_trace()
+        trace.add_step_action(collect)
+        await trace.trace(PhaseStep(cb, PhaseCode.ABC.phase_set))
+
+        assert [(step.conducting_equipment.mrid, step.phases) for step in steps] == [("cb", PhaseCode.ABC.phase_set), ("ec", PhaseCode.ABC.phase_set)]
@@ -0,0 +1,79 @@
+#  Copyright 2020 Zeppelin Bend Pty Ltd
+#
+#  This Source Code Form is subject to the terms of the Mozilla Public
+#  License, v. 2.0. If a copy of the MPL was not distributed with this
+#  file, You can obtain one at https://mozilla.org/MPL/2.0/.
+
+import pytest
+from zepben.evolve import NetworkService, Breaker, Junction, Fuse, Disconnector, EnergyConsumer, Terminal, Recloser
+
+from test.util import add_with_terminals, add_energy_source, connect_chain, create_feeders
+
+
+async def _create_radial():
+    """es - cb - j1 - rc - fuse - sw - ec"""
+    network = NetworkService()
+    es = add_energy_source(network, "es")
+    equipment = [add_with_terminals(network, ce) for ce in (Breaker("cb"), Junction("j1"), Recloser("rc"), Fuse("fuse"), Disconnector("sw"))]
+    ec = add_with_terminals(network, EnergyConsumer("ec"), 1)
+    connect_chain(network, es, *equipment, ec)
+    await network.set_phases()
+    return network
+
+
+def _mrids(items):
+    return [it.mrid for it in items]
+
+
+class TestUpstreamIndex(object):
+
+    @pytest.mark.asyncio
+    async def test_path_to_source(self):
+        network = await _create_radial()
+        index = network.upstream_index()
+
+        assert _mrids(index.path_to_source(network["ec"])) == ["ec-t1", "sw-t2", "sw-t1", "fuse-t2", "fuse-t1", "rc-t2", "rc-t1", "j1-t2", "j1-t1",
+                                                               "cb-t2", "cb-t1", "es-t1"]
+        assert _mrids(index.equipment_path_to_source(network["fuse"])) == ["fuse", "rc", "j1", "cb", "es"]
+        assert index.upstream_terminal(network.get("j1-t1", Terminal)).mrid == "cb-t2"
+        assert index.upstream_terminal(network.get("es-t1", Terminal)) is None
+        assert index.source(network.get("sw-t2", Terminal)).mrid == "es"
+
+    @pytest.mark.asyncio
+    async def test_upstream_protection_device(self):
+        network = await _create_radial()
+        index = network.upstream_index()
+
+        assert index.upstream_protection_device(network["ec"]).mrid == "fuse"
+        assert index.upstream_protection_device(network["fuse"]).mrid == "rc"
+        assert index.upstream_protection_device(network["rc"]).mrid == "cb"
+        assert index.upstream_protection_device(network["ec"], (Breaker,)).mrid == "cb"
+        assert index.upstream_protection_device(network["cb"]) is None
+
+    @pytest.mark.asyncio
+    async def test_rebuilds_after_re_phasing(self):
+        network = await _create_radial()
+        index = network.upstream_index(current=True)
+        assert index.is_energised(network["ec"])
+
+        network["sw"].set_open(True)
+        network.reset_phases()
+        await network.set_phases()
+
+        assert index.is_stale
+        assert not index.is_energised(network["ec"])
+        assert index.path_to_source(network["ec"]) == []
+        assert _mrids(index.equipment_path_to_source(network["sw"])) == ["sw", "fuse", "rc", "j1", "cb", "es"]
+        assert network.upstream_index().is_energised(network["ec"])
+
+    @pytest.mark.asyncio
+    async def test_follows_the_phases_of_each_state_through_ties(self):
+        network = create_feeders()
+        network["tie23"].set_open(True)
+        await network.set_phases()
+
+        assert _mrids(network.upstream_index().equipment_path_to_source(network["f3ec"])) == ["f3ec", "f3j", "cb3", "bus", "es"]
+        assert _mrids(network.upstream_index(current=True).equipment_path_to_source(network["f3ec"])) == ["f3ec", "f3j", "cb3", "bus", "es"]
+        assert _mrids(network.upstream_index().equipment_path_to_source(network["tie23"])) == ["tie23", "f2j", "cb2", "bus", "es"]
+        assert _mrids(network.upstream_index(current=True).equipment_path_to_source(network.get("tie23-t2", Terminal))) == \
+            ["tie23", "f3j", "cb3", "bus", "es"]
@@ -7,13 +7,50 @@
 from __future__ import annotations
 from typing import List
 
-from zepben.evolve import current_phases, normal_phases
+from zepben.evolve import current_phases, normal_phases, Terminal, PhaseCode, EnergySource, EnergySourcePhase, SetPhases, NetworkService, Substation, \
+    Junction, Breaker, EnergyConsumer, Disconnector, AcLineSegment, UsagePoint
 
 
 def get_terminal(network, mrid, term_num):
     return network[mrid].terminals[term_num]
 
 
+def add_with_terminals(network, ce, num_terminals: int = 2, phases: PhaseCode = PhaseCode.ABC):
+    """Add `ce` to `network` along with `num_terminals` terminals with mRIDs of the form `<ce.mrid>-t<sequence_number>`."""
+    network.add(ce)
+    for sn in range(1, num_terminals + 1):
+        t = Terminal(f"{ce.mrid}-t{sn}", conducting_equipment=ce, sequence_number=sn, phases=phases)
+        ce.add_terminal(t)
+        network.add(t)
+    return ce
+
+
+def add_energy_source(network, mrid: str, phases: PhaseCode = PhaseCode.ABC) -> EnergySource:
+    """Add a single terminal `EnergySource` to `network` with an `EnergySourcePhase` for each of `phases`."""
+    es = add_with_terminals(network, EnergySource(mrid), 1, phases)
+    for phase in phases.single_phases:
+        es.add_phase(EnergySourcePhase(f"{mrid}-{phase.short_name}", energy_source=es, phase=phase))
+    return es
+
+
+def connect_chain(network, *equipment):
+    """Connect the last terminal of each piece of equipment to the first terminal of the next."""
+    for ce1, ce2 in zip(equipment, equipment[1:]):
+        network.connect_terminals(ce1.get_terminal_by_sn(ce1.num_terminals()), ce2.get_terminal_by_sn(1))
+
+
+def phase_snapshot(network):
+    """The normal and current status of every terminal in `network`, keyed by mRID."""
+    return {t.mrid: (t.traced_phases.normal_status, t.traced_phases.current_status) for t in network.objects(Terminal)}
+
+
+async def full_phasing_snapshot(network):
+    """Clear and re-run phasing for the whole of `network`, returning the `phase_snapshot`."""
+    network.reset_phases()
+    await SetPhases().run(network)
+    return phase_snapshot(network)
+
+
 def check_phases(t: Terminal, expected_spks: List[SinglePhaseKind], expected_directions: List[PhaseDirection]):
     check_expected_phases(t, expected_spks, expected_directions, current_phases)
     check_expected_phases(t, expected_spks, expected_directions, normal_phases)
@@ -36,3 +73,73 @@ def check_expected_phases(t: Terminal, expected_spks: List[SinglePhaseKind], exp
         ps = phase_selector(t, spk)
         assert spk == ps.phase(), f"expected: {spk} got: {ps.phase()}"
         assert d == ps.direction(), f"expected: {d} got: {ps.direction()}"
+
+
+def create_feeders():
+    """
+    es - bus - cb1 - f1j - f1ec
+          |           |
+          |          tie12 (normally open)
+          |           |
+          +--- cb2 - f2j - f2ec
+          |           |
+          |          tie23
+          |           |
+          +--- cb3 - f3j - f3ec
+    cb1, cb2 and cb3 are feeder circuit breakers.
+    """
+    network = NetworkService()
+    zone_substation = Substation("zs")
+    network.add(zone_substation)
+    es = add_energy_source(network, "es")
+    bus = add_with_terminals(network, Junction("bus"), 4)
+    network.connect_terminals(es.get_terminal_by_sn(1), bus.get_terminal_by_sn(1))
+    for i in (1, 2, 3):
+        cb = add_with_terminals(network, Breaker(f"cb{i}"))
+        cb.add_container(zone_substation)
+        j = add_with_terminals(network, Junction(f"f{i}j"), 3)
+        ec = add_with_terminals(network, EnergyConsumer(f"f{i}ec"), 1)
+        network.connect_terminals(bus.get_terminal_by_sn(i + 1), cb.get_terminal_by_sn(1))
+        connect_chain(network, cb, j)
+        network.connect_terminals(j.get_terminal_by_sn(2), ec.get_terminal_by_sn(1))
+
+    tie12 = add_with_terminals(network, Disconnector("tie12"))
+    tie12.set_normally_open(True)
+    network.connect_terminals(network.get("f1j-t3", Terminal), tie12.get_terminal_by_sn(1))
+    network.connect_terminals(tie12.get_terminal_by_sn(2), network.get("f2ec-t1", Terminal))
+    tie23 = add_with_terminals(network, Disconnector("tie23"))
+    network.connect_terminals(network.get("f2j-t3", Terminal), tie23.get_terminal_by_sn(1))
+    network.connect_terminals(tie23.get_terminal_by_sn(2), network.get("f3j-t3", Terminal))
+    return network
+
+
+async def create_branched_network():
+    """
+    es - cb - j1 - l1 - ec1
+              |
+              l2 - j2 - ec2
+                   |
+                   sw - ec3
+    with usage points on each of the consumers and l2.
+    """
+    network = NetworkService()
+    es = add_energy_source(network, "es")
+    cb, l1, l2, sw = (add_with_terminals(network, ce) for ce in (Breaker("cb"), AcLineSegment("l1"), AcLineSegment("l2"), Disconnector("sw")))
+    j1, j2 = (add_with_terminals(network, Junction(mrid), 3) for mrid in ("j1", "j2"))
+    ec1, ec2, ec3 = (add_with_terminals(network, EnergyConsumer(mrid), 1) for mrid in ("ec1", "ec2", "ec3"))
+    connect_chain(network, es, cb, j1)
+    network.connect_terminals(j1.get_terminal_by_sn(2), l1.get_terminal_by_sn(1))
+    connect_chain(network, l1, ec1)
+    network.connect_terminals(j1.get_terminal_by_sn(3), l2.get_terminal_by_sn(1))
+    network.connect_terminals(l2.get_terminal_by_sn(2), j2.get_terminal_by_sn(1))
+    network.connect_terminals(j2.get_terminal_by_sn(2), ec2.get_terminal_by_sn(1))
+    network.connect_terminals(j2.get_terminal_by_sn(3), sw.get_terminal_by_sn(1))
+    connect_chain(network, sw, ec3)
+
+    for ce in (ec1, ec2, ec3, l2):
+        up = UsagePoint(f"{ce.mrid}-up")
+        ce.add_usage_point(up)
+        network.add(up)
+
+    await network.set_phases()
+    return network